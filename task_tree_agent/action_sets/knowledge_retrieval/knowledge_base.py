@@ -0,0 +1,279 @@
+"""
+Knowledge bases for the knowledge retrieval action set.
+
+SuperpoweredKnowledgeBase is the action set object. It sends each search to a backend and keeps the results in a QueryCache, since agents often repeat a search (or make one that differs only in case, spacing or punctuation) across iterations, and each one sent to the Superpowered API runs a retrieval, a rerank and an LLM summarization.
+
+Backends:
+- SuperpoweredBackend: the Superpowered AI API (pip install superpowered-sdk). The knowledge base handle is looked up once per knowledge base and shared, rather than once per search
+- LocalKnowledgeBackend: searches a list of passages in memory by word overlap, for tests and offline benchmarks
+
+A backend's query() returns a dict with the "summary" of the results (which is what the agent sees) and the "ranked_results", each a dict with the passage's "content".
+
+Several searches can be made at once with SuperpoweredKnowledgeBase.query_many(), which the superpowered_kb_search action uses when the agent requests several searches in a row. The searches are sent to the backend together (concurrently, or as one request if the backend supports it), and a passage that's in the results of more than one search is only shown once. A search that fails doesn't fail the others: its exception is returned in place of its results, and only the results of the searches that succeeded are cached.
+"""
+
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUERY_CACHE_MAX_ENTRIES = 256
+QUERY_CACHE_TTL_SECONDS = 3600 # knowledge bases change rarely, but they do change
+MAX_PARALLEL_SEARCHES = 8
+NO_RESULTS_MESSAGE = "No relevant results found."
+
+
+def normalize_query(query):
+    # queries that differ only in case, spacing or surrounding punctuation get the same results
+    return " ".join(query.casefold().split()).strip(" .,;:!?\"'")
+
+
+class QueryCache:
+    """
+    In-memory LRU cache of search results, keyed on the normalized query and the search parameters. Entries expire after ttl_seconds (None means never). Safe to use from multiple threads.
+    """
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES, ttl_seconds: float = QUERY_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict() # key -> (time added, results), least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_key(self, query, *parameters):
+        return (normalize_query(query),) + parameters
+
+    def get(self, key):
+        """
+        Returns the cached results for key, or None if there aren't any.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, results):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), results)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        num_lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / num_lookups if num_lookups else 0.0, "entries": len(self.entries)}
+
+
+class KnowledgeBackend:
+    """
+    Base class for knowledge base backends. Subclasses must implement query(), and can override query_many() to send several queries as one request (if that request fails, query_many() can raise, and every query in it fails).
+
+    summarizes_results is True for backends whose summary is written from the results (e.g. by an LLM), rather than being the text of the results, which format_summary() produces.
+    """
+    summarizes_results = False
+
+    def query(self, query, retriever_top_k, reranker_top_k):
+        """
+        Returns {"summary": str, "ranked_results": [{"content": str, ...}, ...]}.
+        """
+        raise NotImplementedError
+
+    def query_many(self, queries, retriever_top_k, reranker_top_k):
+        """
+        Returns the results of each query, in order, with the exception in place of the results of a query that failed. By default the queries are sent concurrently.
+        """
+        def get_results(query):
+            try:
+                return self.query(query, retriever_top_k, reranker_top_k)
+            except Exception as e:
+                return e
+
+        if len(queries) <= 1:
+            return [get_results(query) for query in queries]
+        with ThreadPoolExecutor(max_workers=min(len(queries), MAX_PARALLEL_SEARCHES)) as executor:
+            return list(executor.map(get_results, queries))
+
+    def format_summary(self, ranked_results):
+        # the text of the results, each labelled with its source if it has one
+        summary = "\n\n".join(f"[{result['source']}]\n{result['content']}" if result.get("source") else result["content"] for result in ranked_results)
+        return summary or NO_RESULTS_MESSAGE
+
+
+# knowledge base handles from the Superpowered SDK, shared by every SuperpoweredBackend in the process
+_knowledge_base_handles = {}
+_knowledge_base_handles_lock = threading.Lock()
+
+
+def get_knowledge_base_handle(kb_title):
+    with _knowledge_base_handles_lock:
+        handle = _knowledge_base_handles.get(kb_title)
+        if handle is None:
+            from superpowered import get_knowledge_base # pip install superpowered-sdk
+            handle = get_knowledge_base(kb_title)
+            _knowledge_base_handles[kb_title] = handle
+        return handle
+
+
+class SuperpoweredBackend(KnowledgeBackend):
+    summarizes_results = True
+
+    def __init__(self, kb_title):
+        self.kb_title = kb_title
+
+    def query(self, query, retriever_top_k, reranker_top_k):
+        kb = get_knowledge_base_handle(self.kb_title)
+        return kb.query(query, retriever_top_k=retriever_top_k, reranker_top_k=reranker_top_k, extract_and_summarize=True)
+
+
+class LocalKnowledgeBackend(KnowledgeBackend):
+    """
+    Ranks passages by how many of the query's words they contain, and "summarizes" them by joining the top ones. Not a substitute for a real retriever, but enough to test and benchmark the knowledge retrieval actions offline.
+    - passages: list of strings
+    - latency: seconds each query takes, to simulate the round trip to an API
+    """
+    def __init__(self, passages, latency: float = 0.0):
+        self.passages = list(passages)
+        self.latency = latency
+        self.passage_words = [Counter(re.findall(r"\w+", passage.casefold())) for passage in self.passages]
+
+    def query(self, query, retriever_top_k, reranker_top_k):
+        if self.latency:
+            time.sleep(self.latency)
+        query_words = set(re.findall(r"\w+", query.casefold()))
+        scores = [(sum(words[word] for word in query_words), i) for i, words in enumerate(self.passage_words)]
+        ranked = sorted((score for score in scores if score[0] > 0), key=lambda score: (-score[0], score[1]))[:min(retriever_top_k, reranker_top_k)]
+        ranked_results = [{"content": self.passages[i], "score": score} for score, i in ranked]
+        return {"summary": self.format_summary(ranked_results), "ranked_results": ranked_results}
+
+
+class SuperpoweredKnowledgeBase:
+    """
+    The knowledge base the agent searches with the superpowered_kb_search action.
+    - kb_title: title of the Superpowered AI knowledge base
+    - backend: a KnowledgeBackend to search instead of the Superpowered API (e.g. a LocalKnowledgeBackend)
+    - cache_max_entries, cache_ttl_seconds: limits for the cache of search results (see QueryCache)
+
+    The cache isn't saved with the agent.
+    """
+    def __init__(self, kb_title, backend: KnowledgeBackend = None, cache_max_entries: int = QUERY_CACHE_MAX_ENTRIES, cache_ttl_seconds: float = QUERY_CACHE_TTL_SECONDS):
+        self.kb_title = kb_title
+        self.retriever_top_k = 100
+        self.reranker_top_k = 5
+        self.backend = backend if backend is not None else SuperpoweredBackend(kb_title)
+        self.cache_max_entries = cache_max_entries
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.query_cache = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["query_cache"] = None
+        return state
+
+    def get_backend(self):
+        # knowledge bases pickled before backends existed won't have one
+        backend = getattr(self, "backend", None)
+        if backend is None:
+            backend = self.backend = SuperpoweredBackend(self.kb_title)
+        return backend
+
+    def get_query_cache(self):
+        if getattr(self, "query_cache", None) is None:
+            self.query_cache = QueryCache(getattr(self, "cache_max_entries", QUERY_CACHE_MAX_ENTRIES), getattr(self, "cache_ttl_seconds", QUERY_CACHE_TTL_SECONDS))
+        return self.query_cache
+
+    def search(self, query):
+        """
+        Returns the backend's results for query (see KnowledgeBackend.query()), from the cache if the same search was made recently.
+        """
+        query_cache = self.get_query_cache()
+        key = query_cache.get_key(query, self.retriever_top_k, self.reranker_top_k)
+        results = query_cache.get(key)
+        if results is None:
+            results = self.get_backend().query(query, retriever_top_k=self.retriever_top_k, reranker_top_k=self.reranker_top_k)
+            query_cache.put(key, results)
+        return results
+
+    def query(self, query):
+        return self.search(query)["summary"]
+
+    def search_many(self, queries):
+        """
+        Returns the results for each of queries, like search(). The ones that aren't cached are sent to the backend together, and queries that are the same once normalized are only sent once.
+
+        A search that fails has the exception in place of its results, and isn't cached.
+        """
+        query_cache = self.get_query_cache()
+        keys = [query_cache.get_key(query, self.retriever_top_k, self.reranker_top_k) for query in queries]
+        results_by_key = {}
+        queries_to_send = {} # key -> query, for the keys that aren't cached
+        for key, query in zip(keys, queries):
+            if key in results_by_key or key in queries_to_send:
+                continue
+            results = query_cache.get(key)
+            if results is None:
+                queries_to_send[key] = query
+            else:
+                results_by_key[key] = results
+
+        if queries_to_send:
+            try:
+                backend_results = self.get_backend().query_many(list(queries_to_send.values()), retriever_top_k=self.retriever_top_k, reranker_top_k=self.reranker_top_k)
+            except Exception as e:
+                # backends that send the queries as one request fail them together
+                backend_results = [e] * len(queries_to_send)
+            for key, results in zip(queries_to_send, backend_results):
+                if not isinstance(results, Exception):
+                    query_cache.put(key, results)
+                results_by_key[key] = results
+        return [results_by_key[key] for key in keys]
+
+    def query_many(self, queries):
+        """
+        Returns the summary of the results for each of queries, or the exception for a search that failed. If the summaries are the text of the results, a passage that was already in the results for an earlier query is left out, with a note saying so.
+        """
+        all_results = self.search_many(queries)
+        backend = self.get_backend()
+        if backend.summarizes_results:
+            return [results if isinstance(results, Exception) else results["summary"] for results in all_results]
+
+        summaries = []
+        first_query_with_passage = {} # passage -> number of the first query whose results had it
+        for query_number, results in enumerate(all_results, start=1):
+            if isinstance(results, Exception):
+                summaries.append(results)
+                continue
+            new_results = []
+            repeated_in = set()
+            for result in results["ranked_results"]:
+                first_query = first_query_with_passage.setdefault(result["content"], query_number)
+                if first_query == query_number:
+                    new_results.append(result)
+                else:
+                    repeated_in.add(first_query)
+            summary = backend.format_summary(new_results) if new_results or not repeated_in else ""
+            if repeated_in:
+                note = f"({len(results['ranked_results']) - len(new_results)} more result(s) already shown for search {', '.join(str(number) for number in sorted(repeated_in))} of this batch.)"
+                summary = f"{summary}\n\n{note}" if summary else note
+            summaries.append(summary)
+        return summaries
+
+    def format_search_results(self, queries):
+        """
+        Searches for each of queries (see query_many()), and returns the results as one string, with a heading for each search. A search that failed has the error in place of its results. If every search failed, the first error is raised.
+        """
+        summaries = self.query_many(queries)
+        if summaries and all(isinstance(summary, Exception) for summary in summaries):
+            raise summaries[0]
+        return "\n\n".join(f"Search {number}: {query}\n{f'Error: {summary}' if isinstance(summary, Exception) else summary}" for number, (query, summary) in enumerate(zip(queries, summaries), start=1))
@@ -0,0 +1,368 @@
+"""
+A local vector index, for searching documents on disk without a network round trip.
+
+Documents are split into overlapping chunks of words, and each chunk is embedded as a vector. The vectors are saved as a float32 matrix in embeddings.npy, which is memory-mapped when the index is loaded, so opening an index is fast however big it is and only the pages a search touches are read. Chunk texts are saved in chunks.jsonl and the settings in index.json.
+
+A search has up to three stages:
+1. Prefilter (optional): for large indexes, only the prefilter_k chunks with the highest BM25 (lexical) scores are compared with the query
+2. Retrieve: the retriever_top_k chunks whose vectors are most similar to the query's (cosine similarity, one matrix-vector product)
+3. Rerank: the retrieved chunks are rescored by the reranker, and the best reranker_top_k are returned
+
+The default embedder, HashingEmbedder, needs no model: it hashes words and word pairs into a fixed number of dimensions. Any object with a dimensions attribute and an embed(texts) method that returns an array of unit vectors can be used instead, e.g. to wrap an embedding model; pass the same embedder when loading the index.
+
+LocalVectorBackend makes an index usable as the backend of a SuperpoweredKnowledgeBase (see knowledge_base.py).
+
+Usage:
+python vector_index.py build index_directory file_or_directory [...]
+python vector_index.py search index_directory "query"
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import threading
+import zlib
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np # pip install numpy
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "task_tree_agent"))
+
+from action_sets.knowledge_retrieval.knowledge_base import KnowledgeBackend
+
+INDEX_FORMAT = "task_tree_agent_vector_index_v1"
+CHUNK_SIZE = 200 # words
+CHUNK_OVERLAP = 40
+EMBEDDING_DIMENSIONS = 1024
+EMBEDDING_BATCH_SIZE = 256
+PREFILTER_K = 2000 # indexes with more chunks than this are prefiltered with BM25 before the vector search
+DOCUMENT_EXTENSIONS = (".txt", ".md")
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return WORD_PATTERN.findall(text.casefold())
+
+
+def chunk_text(text, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Splits text into chunks of chunk_size words, each starting chunk_overlap words before the end of the last. The chunks are slices of the original text, so their formatting is kept.
+    """
+    word_spans = [match.span() for match in re.finditer(r"\S+", text)]
+    step = max(1, chunk_size - chunk_overlap)
+    chunks = []
+    for start in range(0, len(word_spans), step):
+        end = min(start + chunk_size, len(word_spans))
+        chunks.append(text[word_spans[start][0]:word_spans[end - 1][1]])
+        if end == len(word_spans):
+            break
+    return chunks
+
+
+@lru_cache(maxsize=1 << 16)
+def hash_feature(feature):
+    # stable across processes, unlike hash()
+    return zlib.crc32(feature.encode("utf-8"))
+
+
+class HashingEmbedder:
+    """
+    Embeds text by hashing its words (and, if use_bigrams is set, pairs of adjacent words) into a vector of the given size, weighting each by 1 + log(count), then normalizing it to unit length.
+    """
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS, use_bigrams: bool = True):
+        self.dimensions = dimensions
+        self.use_bigrams = use_bigrams
+
+    def get_config(self):
+        return {"type": "hashing", "dimensions": self.dimensions, "use_bigrams": self.use_bigrams}
+
+    def embed(self, texts):
+        text_hashes = []
+        for text in texts:
+            tokens = tokenize(text)
+            if self.use_bigrams:
+                tokens += [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            text_hashes.append(np.fromiter(map(hash_feature, tokens), dtype=np.int64, count=len(tokens)))
+        if not texts:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+
+        # count each feature in each text, by its hash, for all the texts at once
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), [len(hashes) for hashes in text_hashes])
+        keys, counts = np.unique((rows << 32) | np.concatenate(text_hashes), return_counts=True)
+        rows = keys >> 32
+        hashes = keys & 0xFFFFFFFF
+        # the top bit of the hash picks the sign, so collisions tend to cancel out rather than add up
+        weights = np.where(hashes & (1 << 31), -1.0, 1.0) * (1.0 + np.log(counts))
+        matrix = np.bincount(rows * self.dimensions + hashes % self.dimensions, weights=weights, minlength=len(texts) * self.dimensions)
+        matrix = matrix.astype(np.float32).reshape(len(texts), self.dimensions)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+
+def create_embedder(config):
+    if config.get("type") != "hashing":
+        raise ValueError(f"The index was built with a custom embedder ({config}); pass the same embedder to load it.")
+    return HashingEmbedder(dimensions=config["dimensions"], use_bigrams=config["use_bigrams"])
+
+
+class BM25Index:
+    """
+    Okapi BM25 scores for a fixed list of texts. score() returns the score of every text for a query, as a NumPy array.
+    """
+    def __init__(self, texts, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.num_texts = len(texts)
+        self.text_lengths = np.zeros(self.num_texts, dtype=np.float32)
+        postings = {} # term -> ([text index, ...], [term frequency, ...])
+        for i, text in enumerate(texts):
+            tokens = tokenize(text)
+            self.text_lengths[i] = len(tokens)
+            for term, count in Counter(tokens).items():
+                posting = postings.setdefault(term, ([], []))
+                posting[0].append(i)
+                posting[1].append(count)
+        self.postings = {term: (np.array(indices, dtype=np.int32), np.array(counts, dtype=np.float32)) for term, (indices, counts) in postings.items()}
+        self.average_length = float(self.text_lengths.mean()) if self.num_texts else 0.0
+
+    def score(self, query):
+        scores = np.zeros(self.num_texts, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            indices, counts = posting
+            idf = math.log(1 + (self.num_texts - len(indices) + 0.5) / (len(indices) + 0.5))
+            length_norm = self.k1 * (1 - self.b + self.b * self.text_lengths[indices] / max(self.average_length, 1e-12))
+            scores[indices] += idf * counts * (self.k1 + 1) / (counts + length_norm)
+        return scores
+
+
+def rerank_by_term_coverage(query, chunks, similarities):
+    """
+    The default reranker. Scores each retrieved chunk by its similarity to the query plus the fraction of the query's distinct words it contains, so chunks that cover the whole query beat ones that repeat part of it.
+    """
+    query_terms = set(tokenize(query))
+    if not query_terms:
+        return similarities
+    coverage = np.array([len(query_terms.intersection(tokenize(chunk["content"]))) / len(query_terms) for chunk in chunks], dtype=np.float32)
+    return similarities + coverage
+
+
+def top_k_indices(scores, k):
+    # indices of the k highest scores, highest first
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class VectorIndex:
+    """
+    A vector index saved in a directory. Build one with VectorIndex.build(), and open an existing one with VectorIndex(directory).
+    - embedder: needed only if the index was built with a custom embedder
+    - reranker: function (query, chunks, similarities) -> array of scores; see rerank_by_term_coverage()
+    """
+    def __init__(self, directory, embedder=None, reranker=rerank_by_term_coverage):
+        self.directory = directory
+        with open(os.path.join(directory, "index.json"), "r", encoding="utf-8") as f:
+            self.metadata = json.load(f)
+        if self.metadata.get("format") != INDEX_FORMAT:
+            raise ValueError(f"{directory} isn't a vector index.")
+        self.embedder = embedder if embedder is not None else create_embedder(self.metadata["embedder"])
+        self.reranker = reranker
+        self.embeddings = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r" if self.metadata["num_chunks"] else None)
+        with open(os.path.join(directory, "chunks.jsonl"), "r", encoding="utf-8") as f:
+            self.chunks = [json.loads(line) for line in f if line.strip()]
+        self.bm25_index = None # built the first time a search is prefiltered
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @classmethod
+    def build(cls, directory, documents, embedder=None, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP, verbose: bool = False):
+        """
+        Builds an index of documents, an iterable of (source, text) pairs (see read_documents()), in directory, replacing any index already there, and returns it.
+        """
+        embedder = embedder if embedder is not None else HashingEmbedder()
+        os.makedirs(directory, exist_ok=True)
+        index_path = os.path.join(directory, "index.json")
+        if os.path.exists(index_path):
+            os.remove(index_path) # the index is incomplete until index.json is written again
+
+        # every file is written to a temporary file and then renamed over the old one, since other processes may have the old embeddings memory-mapped
+        chunks_path = os.path.join(directory, "chunks.jsonl")
+        chunks = []
+        with open(chunks_path + ".tmp", "w", encoding="utf-8") as f:
+            for source, text in documents:
+                for content in chunk_text(text, chunk_size, chunk_overlap):
+                    chunk = {"source": source, "content": content}
+                    chunks.append(chunk)
+                    f.write(json.dumps(chunk) + "\n")
+        if verbose: print(f"Embedding {len(chunks)} chunks")
+
+        embeddings_path = os.path.join(directory, "embeddings.npy")
+        if chunks:
+            embeddings = np.lib.format.open_memmap(embeddings_path + ".tmp", mode="w+", dtype=np.float32, shape=(len(chunks), embedder.dimensions))
+            for start in range(0, len(chunks), EMBEDDING_BATCH_SIZE):
+                batch = chunks[start:start + EMBEDDING_BATCH_SIZE]
+                embeddings[start:start + len(batch)] = embedder.embed([chunk["content"] for chunk in batch])
+            embeddings.flush()
+            del embeddings
+        else:
+            with open(embeddings_path + ".tmp", "wb") as f:
+                np.save(f, np.zeros((0, embedder.dimensions), dtype=np.float32)) # an empty file can't be memory-mapped
+        os.replace(chunks_path + ".tmp", chunks_path)
+        os.replace(embeddings_path + ".tmp", embeddings_path)
+
+        embedder_config = embedder.get_config() if hasattr(embedder, "get_config") else {"type": type(embedder).__name__, "dimensions": embedder.dimensions}
+        metadata = {"format": INDEX_FORMAT, "num_chunks": len(chunks), "chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "embedder": embedder_config}
+        with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=1)
+        os.replace(index_path + ".tmp", index_path)
+        return cls(directory, embedder=embedder)
+
+    def get_bm25_index(self):
+        with self.lock:
+            if self.bm25_index is None:
+                self.bm25_index = BM25Index([chunk["content"] for chunk in self.chunks])
+            return self.bm25_index
+
+    def search(self, query, retriever_top_k: int = 100, reranker_top_k: int = 5, prefilter_k: int = PREFILTER_K):
+        """
+        Returns the reranker_top_k best chunks for query, best first, as dicts with the chunk's "content" and "source", its "similarity" to the query and its rerank "score". prefilter_k=None turns off the BM25 prefilter.
+        """
+        return self.search_many([query], retriever_top_k, reranker_top_k, prefilter_k)[0]
+
+    def search_many(self, queries, retriever_top_k: int = 100, reranker_top_k: int = 5, prefilter_k: int = PREFILTER_K):
+        """
+        Returns the results of search() for each of queries. The queries are embedded together, and the ones that aren't prefiltered are compared with every chunk in one pass over the matrix.
+        """
+        if not self.chunks:
+            return [[] for _ in queries]
+        query_vectors = self.embedder.embed(list(queries))
+
+        candidates = [None] * len(queries)
+        if prefilter_k is not None and len(self.chunks) > prefilter_k:
+            bm25_index = self.get_bm25_index()
+            for i, query in enumerate(queries):
+                bm25_scores = bm25_index.score(query)
+                if bm25_scores.max() > 0: # if none of the query's words are in the index, fall back to comparing every vector
+                    query_candidates = top_k_indices(bm25_scores, prefilter_k)
+                    # sorted, so the memory-mapped rows are read in file order
+                    candidates[i] = np.sort(query_candidates[bm25_scores[query_candidates] > 0])
+
+        full_scan_columns = {i: column for column, i in enumerate(i for i in range(len(queries)) if candidates[i] is None)}
+        if full_scan_columns:
+            full_scan_similarities = np.asarray(self.embeddings @ query_vectors[list(full_scan_columns)].T)
+
+        all_results = []
+        for i, query in enumerate(queries):
+            if candidates[i] is None:
+                similarities = full_scan_similarities[:, full_scan_columns[i]]
+                retrieved = top_k_indices(similarities, retriever_top_k)
+                retrieved_similarities = similarities[retrieved]
+            else:
+                similarities = np.asarray(self.embeddings[candidates[i]] @ query_vectors[i])
+                order = top_k_indices(similarities, retriever_top_k)
+                retrieved = candidates[i][order]
+                retrieved_similarities = similarities[order]
+            all_results.append(self.rerank(query, retrieved, retrieved_similarities, reranker_top_k))
+        return all_results
+
+    def rerank(self, query, retrieved, retrieved_similarities, reranker_top_k):
+        retrieved_chunks = [self.chunks[i] for i in retrieved]
+        scores = self.reranker(query, retrieved_chunks, retrieved_similarities) if self.reranker is not None else retrieved_similarities
+        return [
+            {"content": retrieved_chunks[i]["content"], "source": retrieved_chunks[i]["source"], "similarity": float(retrieved_similarities[i]), "score": float(scores[i])}
+            for i in top_k_indices(np.asarray(scores, dtype=np.float32), reranker_top_k)
+        ]
+
+
+# loaded indexes, shared by every LocalVectorBackend in the process, keyed on (directory, time the index was built)
+_loaded_indexes = {}
+_loaded_indexes_lock = threading.Lock()
+
+
+def load_vector_index(directory, embedder=None):
+    directory = os.path.abspath(directory)
+    key = (directory, os.path.getmtime(os.path.join(directory, "index.json")))
+    with _loaded_indexes_lock:
+        index = _loaded_indexes.get(key)
+        if index is None:
+            index = _loaded_indexes[key] = VectorIndex(directory, embedder=embedder)
+        return index
+
+
+class LocalVectorBackend(KnowledgeBackend):
+    """
+    Searches a VectorIndex built in index_directory, e.g. SuperpoweredKnowledgeBase(kb_title="Investment Advisers Act of 1940", backend=LocalVectorBackend("indexes/investment_advisers_act")). The summary the agent sees is the text of the top chunks, each labelled with its source.
+
+    The index is loaded on the first search, and isn't saved with the agent.
+    """
+    def __init__(self, index_directory, prefilter_k: int = PREFILTER_K, embedder=None):
+        self.index_directory = index_directory
+        self.prefilter_k = prefilter_k
+        self.embedder = embedder
+
+    def get_index(self):
+        return load_vector_index(self.index_directory, embedder=self.embedder)
+
+    def query(self, query, retriever_top_k, reranker_top_k):
+        return self.query_many([query], retriever_top_k, reranker_top_k)[0]
+
+    def query_many(self, queries, retriever_top_k, reranker_top_k):
+        # one batched search, rather than one search per query
+        all_ranked_results = self.get_index().search_many(queries, retriever_top_k=retriever_top_k, reranker_top_k=reranker_top_k, prefilter_k=self.prefilter_k)
+        return [{"summary": self.format_summary(ranked_results), "ranked_results": ranked_results} for ranked_results in all_ranked_results]
+
+
+def read_documents(paths):
+    """
+    Yields (source, text) for each file in paths, and for each .txt and .md file under the directories in paths.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, file_names in sorted(os.walk(path)):
+                for file_name in sorted(file_names):
+                    if file_name.lower().endswith(DOCUMENT_EXTENSIONS):
+                        file_path = os.path.join(directory, file_name)
+                        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+                            yield os.path.relpath(file_path, path), f.read()
+        else:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                yield os.path.basename(path), f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or search a local vector index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="index text and markdown files")
+    build_parser.add_argument("index_directory")
+    build_parser.add_argument("paths", nargs="+", help="files, or directories to search for .txt and .md files")
+    build_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help=f"words per chunk (default: {CHUNK_SIZE})")
+    build_parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP, help=f"words shared by consecutive chunks (default: {CHUNK_OVERLAP})")
+    build_parser.add_argument("--dimensions", type=int, default=EMBEDDING_DIMENSIONS, help=f"embedding dimensions (default: {EMBEDDING_DIMENSIONS})")
+    search_parser = subparsers.add_parser("search", help="search an index")
+    search_parser.add_argument("index_directory")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = VectorIndex.build(args.index_directory, read_documents(args.paths), embedder=HashingEmbedder(dimensions=args.dimensions), chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, verbose=True)
+        print(f"Built an index of {len(index)} chunks in {args.index_directory}")
+    else:
+        for result in VectorIndex(args.index_directory).search(args.query, reranker_top_k=args.top_k):
+            print(f"\n[{result['source']}] score {result['score']:.3f}\n{result['content']}")
+
+
+if __name__ == "__main__":
+    main()
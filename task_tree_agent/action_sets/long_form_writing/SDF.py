@@ -4,23 +4,135 @@ The following module contains the classes for the SDF document format, which is
 This is an example of creating an action set that itself uses an agent w/ tools framework, which is why we import the ActionInterface class.
 """
 
+import asyncio
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 # add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually. It's in ../../task_tree_agent
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "task_tree_agent"))
 
-from agent.utils import openai_api_call
+from agent.checkpoint import Journaled, get_state_slot_names
+from agent.llm_client import get_default_llm_client
 from agent.action_interface import ActionInterface, RESPONSE_FORMATTING_INSTRUCTIONS
+from agent.prompt_builder import PrefixTracker, PromptBuilder, PromptSection
+from agent.token_counter import get_context_window, get_token_counter
+from action_sets.long_form_writing.document_index import MAX_RESULTS, DocumentIndex
 from action_sets.long_form_writing.edit_section_action_set import edit_section_action_set
-from action_sets.long_form_writing.SDF_prompt_template import EDIT_SECTION, READ_AND_ANALYZE
+from action_sets.long_form_writing.piece_table import PieceTable
+from action_sets.long_form_writing.summary_cache import ExtractiveSummarizer, SummaryCache
+from action_sets.long_form_writing.SDF_prompt_template import PROMPT_TEMPLATES
+
+EDIT_SECTION_MAX_TOKENS = 2000 # max tokens in the response to an edit_section() prompt
+READ_AND_ANALYZE_MAX_TOKENS = 500
+MAX_PARALLEL_SECTION_CALLS = 8 # default number of LLM calls in flight at once in edit_sections() and read_and_analyze_sections()
+CURRENT_SECTION_CONTEXT_FRACTION = 0.375 # of the model's context window; a longer current section has its earlier elements summarized in prompts
+NEIGHBORING_SECTIONS_CONTEXT_FRACTION = 0.075 # of the model's context window, for the summaries of the sections before and after the current one
+
+
+def split_into_batches(section_requests):
+    """
+    Splits a list of (section_index, instructions) into consecutive batches in which no section appears twice, so a section's later requests see the results of its earlier ones.
+    """
+    batches = []
+    batch_section_indices = None
+    for section_request in section_requests:
+        if batch_section_indices is None or section_request[0] in batch_section_indices:
+            batches.append([])
+            batch_section_indices = set()
+        batches[-1].append(section_request)
+        batch_section_indices.add(section_request[0])
+    return batches
+
+
+def count_text_stats(text, token_counter):
+    # (words, characters, tokens)
+    return (len(text.split()), len(text), token_counter.count(text))
+
+
+def count_inserted_text_stats(text, char_before, char_after):
+    """
+    Returns the change in (words, characters) from inserting text between char_before and char_after (either can be "" at the ends of the text). Only the characters on either side matter: the inserted text can join onto the word before or after it, or split a word in two. Tokens can merge across the boundaries in ways that depend on more than one character, so they aren't counted here (see TokenCounter.count_change()).
+    """
+    word_change = len((char_before + text + char_after).split()) - len((char_before + char_after).split())
+    return (word_change, len(text))
+
+
+def add_stats(stats, added_stats=(0, 0, 0), removed_stats=(0, 0, 0)):
+    return tuple(value + added - removed for value, added, removed in zip(stats, added_stats, removed_stats))
+
+
+# Elements and Sections use __slots__ rather than a __dict__, since a long document can have tens of thousands of them
+class Element(Journaled):
+    """
+    A block of text in a Section. The text is a plain string, or a PieceTable after text has been inserted into or deleted from it, so those edits don't copy the rest of the text (see piece_table.py). Reading content joins the pieces back into one string, once, until the next such edit.
+    """
+    __slots__ = ("_text",)
 
-class Element:
     def __init__(self, content):
         self.content = content
 
+    @property
+    def content(self):
+        text = getattr(self, "_text", "")
+        if not isinstance(text, str):
+            # same text, so this isn't a change
+            text = str(text)
+            object.__setattr__(self, "_text", text)
+        return text
+
+    @content.setter
+    def content(self, content):
+        object.__setattr__(self, "_text", content)
+
+    def __getstate__(self):
+        # saved as a plain string, as it was before piece tables were used
+        text = getattr(self, "_text", "")
+        return {"content": text if isinstance(text, str) else self.content}
+
+    def get_length(self):
+        return len(getattr(self, "_text", ""))
+
+    def get_text_key(self):
+        # a new object whenever the text changes, since strings and piece tables are never modified in place (see document_index.py)
+        return getattr(self, "_text", "")
+
+    def iter_chunks(self):
+        """
+        Yields the text in pieces, without joining it into one string first (e.g. for writing it to a file).
+        """
+        text = getattr(self, "_text", "")
+        if isinstance(text, str):
+            yield text
+        else:
+            yield from text.iter_chunks()
+
+    def get_piece_table(self):
+        text = getattr(self, "_text", "")
+        return text if isinstance(text, PieceTable) else PieceTable.from_text(text)
+
+    def insert_text(self, position, text):
+        self.content = self.get_piece_table().insert(position, text)
+
+    def delete_text(self, start, end):
+        self.content = self.get_piece_table().delete(start, end)
+
+    def get_stats(self, token_counter):
+        # (words, characters, tokens). Not cached, since that would add to the size of every element; sections cache their totals instead
+        return count_text_stats(self.content, token_counter)
+
+
+class Section(Journaled):
+    """
+    A section of a Document, made up of Elements.
+
+    Elements should only be changed through the Section's methods, so the section's version is bumped when its content changes. The section also reports every change to the Document that contains it (_document), which uses this to know when its cached prompt context is stale.
+
+    The section's word, character and token counts (_stats) are kept up to date as elements are added, edited and deleted, by counting only the elements that changed (and for insert_text() and delete_text(), only the words and characters that were added or removed), so the section never has to be recounted as a whole. The same changes are passed on to the Document's totals.
+    """
+    __slots__ = ("section_identifier", "title", "summary", "outline", "elements", "_document", "_stats")
+    _derived_attributes = ("_document", "_stats")
 
-class Section:
     def __init__(self, section_identifier='', title='', summary=''):
         self.section_identifier = section_identifier # e.g., "Chapter 1"
         self.title = title
@@ -28,29 +140,116 @@ class Section:
         self.outline = ""
         self.elements = []
 
+    def __setstate__(self, state):
+        # sections pickled before __slots__ were used: update_section_summary() and update_section_outline() set section_summary and section_outline, and any other attribute that isn't a slot any more is dropped
+        state = dict(state)
+        for old_name, name in (("section_summary", "summary"), ("section_outline", "outline")):
+            if old_name in state:
+                state[name] = state.pop(old_name)
+        slot_names = get_state_slot_names(type(self))
+        super().__setstate__({name: value for name, value in state.items() if name in slot_names})
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name == "elements":
+            # the elements were replaced wholesale (e.g. by split_section()), so the counts have to be redone
+            object.__setattr__(self, "_stats", None)
+            document = getattr(self, "_document", None)
+            if document is not None:
+                document.invalidate_stats()
+
+    def mark_changed(self):
+        super().mark_changed()
+        document = getattr(self, "_document", None)
+        if document is not None:
+            document.mark_section_changed()
+
+    def get_token_counter(self):
+        document = getattr(self, "_document", None)
+        return get_token_counter(getattr(document, "model_name", None) or "gpt-4")
+
     # add new element to the section
     def add_element(self, index, content):
         element = Element(content)
         self.elements.insert(index, element)
+        self.update_stats(added_stats=element.get_stats(self.get_token_counter()))
+        self.mark_changed()
 
     # edit an existing element
     def edit_element(self, index, content):
-        self.elements[index].content = content
+        element = self.elements[index]
+        token_counter = self.get_token_counter()
+        removed_stats = element.get_stats(token_counter)
+        element.content = content
+        self.update_stats(added_stats=element.get_stats(token_counter), removed_stats=removed_stats)
+        self.mark_changed()
 
     # delete an element
     def delete_element(self, index):
+        removed_stats = self.elements[index].get_stats(self.get_token_counter())
         del self.elements[index]
+        self.update_stats(removed_stats=removed_stats)
+        self.mark_changed()
+
+    # insert text into an element at a character position, without copying the rest of its text
+    def insert_text(self, element_index, position, text):
+        element = self.elements[element_index]
+        piece_table = element.get_piece_table()
+        piece_table.check_position(position)
+        word_change, char_change = count_inserted_text_stats(text, piece_table.get_char(position - 1), piece_table.get_char(position))
+        element.insert_text(position, text)
+        self.update_text_edit_stats(element, piece_table, position, position, position + len(text), word_change, char_change)
+        self.mark_changed()
+
+    # add text to the end of an element
+    def append_text(self, element_index, text):
+        self.insert_text(element_index, self.elements[element_index].get_length(), text)
+
+    # delete the text from start up to (but not including) end from an element
+    def delete_text(self, element_index, start, end):
+        element = self.elements[element_index]
+        piece_table = element.get_piece_table()
+        removed_text = piece_table.get_text(start, end)
+        word_change, char_change = count_inserted_text_stats(removed_text, piece_table.get_char(start - 1), piece_table.get_char(end))
+        element.delete_text(start, end)
+        self.update_text_edit_stats(element, piece_table, start, end, start, -word_change, -char_change)
+        self.mark_changed()
 
     # re-order elements, given a list of indices
     def reorder_elements(self, indices):
         self.elements = [self.elements[i] for i in indices]
 
-    # get the word count of the section
+    def update_text_edit_stats(self, element, old_piece_table, start, old_end, new_end, word_change, char_change):
+        # old_piece_table[start:old_end] was replaced with the element's text[start:new_end]. The token counter recounts only the text around the edit (see TokenCounter.count_change()), so the edit doesn't cost time proportional to the length of the element
+        token_change = self.get_token_counter().count_change(old_piece_table, element.get_piece_table(), start, old_end, new_end)
+        self.update_stats(added_stats=(word_change, char_change, token_change))
+
+    def update_stats(self, added_stats=(0, 0, 0), removed_stats=(0, 0, 0)):
+        # applies the change in the counts from one element being added, edited or deleted
+        token_counter = self.get_token_counter()
+        stats = getattr(self, "_stats", None)
+        if stats is not None and stats[0] is token_counter:
+            object.__setattr__(self, "_stats", (token_counter, add_stats(stats[1], added_stats, removed_stats)))
+        document = getattr(self, "_document", None)
+        if document is not None:
+            document.update_stats(token_counter, added_stats, removed_stats)
+
+    def get_stats(self):
+        """
+        Returns (words, characters, tokens) for the text of this section's elements.
+        """
+        token_counter = self.get_token_counter()
+        stats = getattr(self, "_stats", None)
+        if stats is None or stats[0] is not token_counter:
+            totals = (0, 0, 0)
+            for element in self.elements:
+                totals = add_stats(totals, element.get_stats(token_counter))
+            stats = (token_counter, totals)
+            object.__setattr__(self, "_stats", stats)
+        return stats[1]
+
     def get_word_count(self):
-        count = 0
-        for element in self.elements:
-            count += len(element.content.split())
-        return count
+        return self.get_stats()[0]
 
     # display the section
     def display(self):
@@ -59,8 +258,21 @@ class Section:
             print(f"\nElement {i}\n{element.content}")
 
 
-class Document:
-    def __init__(self, title, human_notes="", section_type='Section', model_name="gpt-4"):
+class Document(Journaled):
+    """
+    A long-form document, made up of Sections.
+
+    format_prompt_context() is called on every agent iteration, so its output is cached. The cache is keyed on the document's own version and on _sections_version, a counter that every Section in the document bumps when it changes, so checking whether the cache is fresh doesn't depend on the size of the document.
+
+    The edit_section() and read_and_analyze_section() prompts are kept within the model's context window by truncating the document context first, and then the section text (see agent/prompt_builder.py). The token usage of the last one built is saved in last_prompt_usage. edit_sections() and read_and_analyze_sections() make the LLM calls for many sections in parallel. With prompt_layout="stable_prefix", the document context comes before the section-specific parts of those prompts, so calls on different sections share a prefix that the backend's prompt caching can reuse; prompt_prefix_tracker measures how much is shared.
+
+    Prompts about one section include summaries of the sections next to it, and if the section itself is too long to include in full, summaries of its earlier elements. Sections that don't have a summary written by the agent get one made from their text at the end of the document context, within GENERATED_SUMMARIES_MAX_TOKENS in total. These summaries are kept in a SummaryCache, which only remakes the summaries of the elements that changed (see summary_cache.py). They're made by summarizer, an ExtractiveSummarizer by default.
+
+    search() finds the passages anywhere in the document that best match a query, using a keyword index of the elements that's updated incrementally as they change (see document_index.py).
+    """
+    _derived_attributes = ("_sections_version", "_prompt_context_cache", "last_prompt_usage", "prompt_prefix_tracker", "_stats", "_search_index", "_summary_cache", "_scheduler_llm_client")
+
+    def __init__(self, title, human_notes="", section_type='Section', model_name="gpt-4", llm_client=None, prompt_layout="default", summarizer=None):
         self.title = title
         self.human_notes = human_notes
         self.section_type = section_type
@@ -72,6 +284,81 @@ class Document:
         self.themes = {}
         self.action_interface = ActionInterface([edit_section_action_set])
         self.model_name = model_name # e.g., "gpt-4", the model used to generate text in edit_section()
+        self.llm_client = llm_client # if None, the default LLMClient is used
+        if prompt_layout not in PROMPT_TEMPLATES:
+            raise ValueError(f"Unknown prompt layout {prompt_layout!r}. Choose from: {', '.join(PROMPT_TEMPLATES)}")
+        self.prompt_layout = prompt_layout
+        self.summarizer = summarizer # if None, an ExtractiveSummarizer is used
+
+    def get_llm_client(self):
+        # documents pickled before llm_client existed won't have the attribute. _scheduler_llm_client is only set while an AgentScheduler is running the agent that uses this document
+        return getattr(self, "_scheduler_llm_client", None) or getattr(self, "llm_client", None) or get_default_llm_client()
+
+    def get_summary_cache(self):
+        token_counter = get_token_counter(self.model_name)
+        summary_cache = self.__dict__.get("_summary_cache")
+        if summary_cache is None or summary_cache.token_counter is not token_counter:
+            # documents pickled before summarizer existed won't have the attribute
+            summarizer = getattr(self, "summarizer", None) or ExtractiveSummarizer()
+            summary_cache = SummaryCache(self, summarizer, token_counter)
+            object.__setattr__(self, "_summary_cache", summary_cache)
+        return summary_cache
+
+    def get_summary(self):
+        """
+        Returns a summary of the whole document, made from the summaries of its sections (see summary_cache.py).
+        """
+        return self.get_summary_cache().get_document_summary()
+
+    def mark_section_changed(self):
+        object.__setattr__(self, "_sections_version", getattr(self, "_sections_version", 0) + 1)
+
+    def get_prompt_context_version(self):
+        """
+        Returns a value that changes whenever the output of format_prompt_context() might change.
+        """
+        return (self.get_version(), getattr(self, "_sections_version", 0))
+
+    def attach_sections(self):
+        # make sure every section reports its changes to this document; sections can be added, split or loaded without going through add_section()
+        for section in self.sections:
+            if getattr(section, "_document", None) is not self:
+                object.__setattr__(section, "_document", self)
+                object.__setattr__(section, "_stats", None) # may have been counted with a different token counter
+                self.invalidate_stats()
+
+    def invalidate_stats(self):
+        object.__setattr__(self, "_stats", None)
+
+    def update_stats(self, token_counter, added_stats=(0, 0, 0), removed_stats=(0, 0, 0)):
+        # called by a section when one of its elements is added, edited or deleted
+        stats = self.__dict__.get("_stats")
+        if stats is not None and stats[0] == self.get_version() and stats[1] is token_counter:
+            object.__setattr__(self, "_stats", (stats[0], token_counter, add_stats(stats[2], added_stats, removed_stats)))
+
+    def get_stats(self):
+        """
+        Returns (words, characters, tokens) for the text of the whole document.
+
+        The totals are kept up to date by the sections as their elements change, so this doesn't depend on the size of the document. They're recomputed from the sections' own totals after the document's structure changes (e.g. a section is added or merged), which is tracked by the document's version.
+        """
+        token_counter = get_token_counter(self.model_name)
+        stats = self.__dict__.get("_stats")
+        if stats is None or stats[0] != self.get_version() or stats[1] is not token_counter:
+            self.attach_sections()
+            totals = (0, 0, 0)
+            for section in self.sections:
+                totals = add_stats(totals, section.get_stats())
+            stats = (self.get_version(), token_counter, totals)
+            object.__setattr__(self, "_stats", stats)
+        return stats[2]
+
+    def get_stats_by_section(self):
+        """
+        Returns a list of (section identifier, title, words, characters, tokens), one for each section.
+        """
+        self.attach_sections()
+        return [(section.section_identifier, section.title) + section.get_stats() for section in self.sections]
 
     def edit_title(self, title):
         self.title = title
@@ -82,38 +369,47 @@ class Document:
     # Character descriptions methods
     def add_character_description(self, name, description):
         self.character_descriptions[name] = description
+        self.mark_changed()
 
     def update_character_description(self, name, description):
         if name in self.character_descriptions:
             self.character_descriptions[name] = description
+            self.mark_changed()
 
     def remove_character_description(self, name):
         if name in self.character_descriptions:
             del self.character_descriptions[name]
+            self.mark_changed()
 
     # Locations methods
     def add_location(self, name, description):
         self.locations[name] = description
+        self.mark_changed()
 
     def update_location(self, name, description):
         if name in self.locations:
             self.locations[name] = description
+            self.mark_changed()
 
     def remove_location(self, name):
         if name in self.locations:
             del self.locations[name]
+            self.mark_changed()
 
     # Themes methods
     def add_theme(self, name, description):
         self.themes[name] = description
+        self.mark_changed()
 
     def update_theme(self, name, description):
         if name in self.themes:
             self.themes[name] = description
+            self.mark_changed()
 
     def remove_theme(self, name):
         if name in self.themes:
             del self.themes[name]
+            self.mark_changed()
 
     # Sections methods
     def add_section(self, index, title='', summary=''):
@@ -124,7 +420,9 @@ class Document:
         # create new section
         section_identifier = f"{self.section_type} {index + 1}"
         section = Section(section_identifier, title, summary)
+        object.__setattr__(section, "_document", self)
         self.sections.insert(index, section)
+        self.mark_changed()
         
         # update section identifiers
         for i in range(len(self.sections)):
@@ -143,6 +441,7 @@ class Document:
     def move_section(self, index, direction):
         if 0 <= index < len(self.sections) and 0 <= index + direction < len(self.sections):
             self.sections[index], self.sections[index + direction] = self.sections[index + direction], self.sections[index]
+            self.mark_changed()
             
             # update section identifiers
             for i in range(len(self.sections)):
@@ -154,8 +453,9 @@ class Document:
         if 0 <= index < len(self.sections) - 1:
             self.sections[index].title += f" - {self.sections[index + 1].title}"
             self.sections[index].elements += self.sections[index + 1].elements
-            self.sections[index].subsections += self.sections[index + 1].subsections
+            object.__setattr__(self.sections[index + 1], "_document", None)
             del self.sections[index + 1]
+            self.mark_changed()
             
             # update section identifiers
             for i in range(len(self.sections)):
@@ -170,9 +470,11 @@ class Document:
         """
         if 0 <= index < len(self.sections):
             new_section = Section(new_title)
+            object.__setattr__(new_section, "_document", self)
             new_section.elements = self.sections[index].elements[split_index:]
             self.sections[index].elements = self.sections[index].elements[:split_index]
             self.sections.insert(index + 1, new_section)
+            self.mark_changed()
 
             # update section identifiers
             for i in range(len(self.sections)):
@@ -181,49 +483,71 @@ class Document:
             self.update_toc() # update table of contents
 
     def get_word_count(self):
-        count = 0
-        for section in self.sections:
-            count += section.get_word_count()
-        return count
+        return self.get_stats()[0]
 
     def update_toc(self):
         self.table_of_contents = [section.title for section in self.sections]
 
-    # create a context string to be used in the prompt
+    def get_search_index(self):
+        search_index = self.__dict__.get("_search_index")
+        if search_index is None:
+            search_index = DocumentIndex(self)
+            object.__setattr__(self, "_search_index", search_index)
+        return search_index
+
+    def search(self, query, max_results: int = MAX_RESULTS):
+        """
+        Returns the passages of the document that best match query, as a string (see document_index.py). The search index is brought up to date with the document's changes first.
+        """
+        return self.get_search_index().format_search_results(query, max_results)
+
+    # create a context string to be used in the prompt (cached until the document or one of its sections changes)
     def format_prompt_context(self):
+        cache = self.__dict__.get("_prompt_context_cache")
+        if cache is not None and cache[0] == self.get_prompt_context_version():
+            return cache[1]
 
+        self.attach_sections()
+        context_str = self.render_prompt_context()
+        object.__setattr__(self, "_prompt_context_cache", (self.get_prompt_context_version(), context_str))
+        return context_str
+
+    def render_prompt_context(self):
         # Generate the prompt, starting with the human notes
-        context_str = f"The following are some human-written notes about the document you're writing. You should pay careful attention to these notes and stick closely to any ideas conveyed in them.\n\nHuman Notes:\n{self.human_notes}\n\n"
+        parts = [f"The following are some human-written notes about the document you're writing. You should pay careful attention to these notes and stick closely to any ideas conveyed in them.\n\nHuman Notes:\n{self.human_notes}\n\n"]
 
-        context_str += "Document Overview:\n"
+        parts.append("Document Overview:\n")
 
         # add title
-        context_str += f"Title: {self.title}\n\n"
+        parts.append(f"Title: {self.title}\n\n")
 
         # add outline
-        context_str += "Outline:\n"
-        context_str += self.outline + "\n"
+        parts.append("Outline:\n")
+        parts.append(self.outline + "\n")
 
         # add word count
-        context_str += f"\nWord Count: {self.get_word_count()}\n"
+        parts.append(f"\nWord Count: {self.get_word_count()}\n")
 
-        context_str += "\nSection Summaries:\n"
+        parts.append("\nSection Summaries:\n")
         for section in self.sections:
-            context_str += f"{section.section_identifier} - {section.title}:\n{section.summary}\n\n"
+            parts.append(f"{section.section_identifier} - {section.title}:\n{section.summary}\n\n")
 
-        context_str += "\nCharacter Descriptions:\n"
+        parts.append("\nCharacter Descriptions:\n")
         for name, description in self.character_descriptions.items():
-            context_str += f"{name}: {description}\n"
+            parts.append(f"{name}: {description}\n")
 
-        context_str += "\nLocations:\n"
+        parts.append("\nLocations:\n")
         for name, description in self.locations.items():
-            context_str += f"{name}: {description}\n"
+            parts.append(f"{name}: {description}\n")
 
-        context_str += "\nThemes:\n"
+        parts.append("\nThemes:\n")
         for name, description in self.themes.items():
-            context_str += f"{name}: {description}\n"
+            parts.append(f"{name}: {description}\n")
 
-        return context_str
+        # last, so it's the first thing cut if the context has to be truncated
+        parts.append(self.get_summary_cache().format_generated_section_summaries([section for section in self.sections if not section.summary]))
+
+        return "".join(parts)
 
     def format_section_for_prompt(self, section_index):
         if section_index != None:
@@ -234,16 +558,25 @@ class Document:
         if current_section is None:
             return None
 
-        # put all the information needed about the current section into a string
-        context_str = f"\nCurrent Section: {current_section.section_identifier} - {current_section.title}\n\n"
-        context_str += f"Section Summary:\n{current_section.summary}\n\n"
-        context_str += f"Section Outline:\n{current_section.outline}\n\n"
-        context_str += f"Section Word Count: {current_section.get_word_count()}\n\n"
-        context_str += "Section Full Text:\n"
-        for i,element in enumerate(current_section.elements):
-            context_str += f"Element: {i}\n{element.content}\n\n"
-        
-        return context_str
+        # put all the information needed about the current section into a string, with summaries of the sections around it
+        summary_cache = self.get_summary_cache()
+        context_window = get_context_window(self.model_name)
+        parts = []
+        neighboring_sections = summary_cache.format_neighboring_sections(section_index, int(context_window * NEIGHBORING_SECTIONS_CONTEXT_FRACTION))
+        if neighboring_sections:
+            parts.append(f"\nSurrounding Sections (summarized from their text):\n{neighboring_sections}")
+        parts.append(f"\nCurrent Section: {current_section.section_identifier} - {current_section.title}\n\n")
+        parts.append(f"Section Summary:\n{current_section.summary}\n\n")
+        parts.append(f"Section Outline:\n{current_section.outline}\n\n")
+        parts.append(f"Section Word Count: {current_section.get_word_count()}\n\n")
+        section_text, num_summarized = summary_cache.format_section_elements(current_section, int(context_window * CURRENT_SECTION_CONTEXT_FRACTION))
+        if num_summarized:
+            parts.append(f"Section Text (elements 0 to {num_summarized - 1} are summarized to fit the context window; the rest are in full):\n")
+        else:
+            parts.append("Section Full Text:\n")
+        parts.append(section_text)
+
+        return "".join(parts)
 
     def create_edit_section_prompt(self, section_index, editing_instructions):
         document_context = self.format_prompt_context() # Create the document context string
@@ -253,13 +586,26 @@ class Document:
 
         available_actions = self.action_interface.get_available_actions_for_prompt()
 
-        return EDIT_SECTION.format(
-            document_context=document_context,
-            editing_instructions=editing_instructions,
-            current_section_context=current_section_context,
-            available_actions=available_actions,
-            response_formatting_instructions=RESPONSE_FORMATTING_INSTRUCTIONS,
-        )
+        # the document context is truncated first, then the section text
+        return self.build_prompt("edit_section", EDIT_SECTION_MAX_TOKENS, [
+            PromptSection("document_context", document_context, priority=1, min_tokens=500),
+            PromptSection("editing_instructions", editing_instructions, required=True),
+            PromptSection("current_section_context", current_section_context, priority=2),
+            PromptSection("available_actions", available_actions, required=True),
+            PromptSection("response_formatting_instructions", RESPONSE_FORMATTING_INSTRUCTIONS, required=True),
+        ])
+
+    def build_prompt(self, kind, max_response_tokens, sections):
+        # kind: "edit_section" or "read_and_analyze_section"
+        edit_section_template, read_and_analyze_template = PROMPT_TEMPLATES[getattr(self, "prompt_layout", "default")]
+        template = edit_section_template if kind == "edit_section" else read_and_analyze_template
+        prompt_builder = PromptBuilder(template, model_name=self.model_name, max_response_tokens=max_response_tokens)
+        prompt, usage = prompt_builder.build(sections)
+        if getattr(self, "prompt_prefix_tracker", None) is None:
+            object.__setattr__(self, "prompt_prefix_tracker", PrefixTracker())
+        self.prompt_prefix_tracker.record_usage(kind, prompt, usage, prompt_builder.token_counter)
+        object.__setattr__(self, "last_prompt_usage", usage)
+        return prompt
     
     def edit_section(self, section_index: str, editing_instructions: str, verbose: bool = False):
         """
@@ -268,14 +614,96 @@ class Document:
         The editing instructions is a natural language string that describes the edit we want the LLM to make.
         """
         prompt = self.create_edit_section_prompt(section_index, editing_instructions)
-        self.action_interface.update_action_set_object("edit_section_action_set", self.sections[section_index])
-        response = openai_api_call(prompt, model_name=self.model_name, max_tokens=2000)
+        section = self.sections[section_index]
+        response = self.get_llm_client().complete(prompt, model_name=self.model_name, max_tokens=EDIT_SECTION_MAX_TOKENS)
+
+        if verbose:
+            print(f"Full prompt:\n{prompt}\n\n{self.last_prompt_usage.format()}")
+            print(f"Raw LLM response:\n{response}")
+
+        self.apply_section_edits(section, response)
+
+    async def aedit_section(self, section_index: str, editing_instructions: str, verbose: bool = False):
+        """
+        Async version of edit_section().
+        """
+        prompt = self.create_edit_section_prompt(section_index, editing_instructions)
+        section = self.sections[section_index]
+        response = await self.get_llm_client().acomplete(prompt, model_name=self.model_name, max_tokens=EDIT_SECTION_MAX_TOKENS)
 
         if verbose:
-            print(f"Full prompt:\n{prompt}")
+            print(f"Full prompt:\n{prompt}\n\n{self.last_prompt_usage.format()}")
             print(f"Raw LLM response:\n{response}")
 
-        self.action_interface.parse_response_and_perform_actions(response)
+        self.apply_section_edits(section, response)
+
+    def create_section_action_interface(self, section):
+        """
+        Returns an action interface whose edit actions apply to section. Every edit gets its own, so edits to different sections don't have to take turns re-pointing a shared action interface. They all log to this document's action log.
+        """
+        return ActionInterface([edit_section_action_set.copy(section)], action_log=self.action_interface.agent_action_log)
+
+    def apply_section_edits(self, section, response):
+        # performs the edits requested in the LLM's response to an edit_section() prompt
+        self.create_section_action_interface(section).parse_response_and_perform_actions(response)
+
+    def edit_sections(self, section_edits, max_workers: int = MAX_PARALLEL_SECTION_CALLS, verbose: bool = False):
+        """
+        Edits several sections at once. section_edits is a list of (section_index, editing_instructions).
+
+        The LLM calls are made in parallel by up to max_workers threads, so this takes about as long as the slowest edit. The edits are applied in the order they were given, once every call has returned, so the result doesn't depend on which call finished first. A section that appears more than once is edited again only after its earlier edits have been applied (see split_into_batches()).
+
+        If some LLM calls fail, the other edits are still applied, and then an exception listing the failures is raised.
+        """
+        errors = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch in split_into_batches(section_edits):
+                # prompts are built one at a time, since building one updates last_prompt_usage
+                prompts = [self.create_edit_section_prompt(section_index, editing_instructions) for section_index, editing_instructions in batch]
+                sections = [self.sections[section_index] for section_index, _ in batch]
+                futures = [executor.submit(self.get_llm_client().complete, prompt, model_name=self.model_name, max_tokens=EDIT_SECTION_MAX_TOKENS) for prompt in prompts]
+
+                for (section_index, _), section, prompt, future in zip(batch, sections, prompts, futures):
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        errors.append(f"section {section_index}: {e}")
+                        continue
+                    if verbose:
+                        print(f"Full prompt:\n{prompt}")
+                        print(f"Raw LLM response:\n{response}")
+                    self.apply_section_edits(section, response)
+
+        if errors:
+            raise RuntimeError(f"Some sections couldn't be edited: {'; '.join(errors)}")
+
+    async def aedit_sections(self, section_edits, max_workers: int = MAX_PARALLEL_SECTION_CALLS, verbose: bool = False):
+        """
+        Async version of edit_sections(). Up to max_workers LLM calls are awaited at once.
+        """
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def complete(prompt):
+            async with semaphore:
+                return await self.get_llm_client().acomplete(prompt, model_name=self.model_name, max_tokens=EDIT_SECTION_MAX_TOKENS)
+
+        errors = []
+        for batch in split_into_batches(section_edits):
+            prompts = [self.create_edit_section_prompt(section_index, editing_instructions) for section_index, editing_instructions in batch]
+            sections = [self.sections[section_index] for section_index, _ in batch]
+            responses = await asyncio.gather(*[complete(prompt) for prompt in prompts], return_exceptions=True)
+
+            for (section_index, _), section, prompt, response in zip(batch, sections, prompts, responses):
+                if isinstance(response, Exception):
+                    errors.append(f"section {section_index}: {response}")
+                    continue
+                if verbose:
+                    print(f"Full prompt:\n{prompt}")
+                    print(f"Raw LLM response:\n{response}")
+                self.apply_section_edits(section, response)
+
+        if errors:
+            raise RuntimeError(f"Some sections couldn't be edited: {'; '.join(errors)}")
 
     def create_read_and_analyze_prompt(self, section_index, analysis_instructions):
         document_context = self.format_prompt_context()
@@ -283,22 +711,86 @@ class Document:
             return None
         current_section_context = self.format_section_for_prompt(section_index)
         
-        return READ_AND_ANALYZE.format(
-            document_context=document_context,
-            analysis_instructions=analysis_instructions,
-            current_section_context=current_section_context,
-        )
+        return self.build_prompt("read_and_analyze_section", READ_AND_ANALYZE_MAX_TOKENS, [
+            PromptSection("document_context", document_context, priority=1, min_tokens=500),
+            PromptSection("analysis_instructions", analysis_instructions, required=True),
+            PromptSection("current_section_context", current_section_context, priority=2),
+        ])
 
     def read_and_analyze_section(self, section_index: str, analysis_instructions: str, verbose: bool = False):
         prompt = self.create_read_and_analyze_prompt(section_index, analysis_instructions)
-        analysis = openai_api_call(prompt, model_name=self.model_name, max_tokens=500)
+        analysis = self.get_llm_client().complete_cached(prompt, model_name=self.model_name, max_tokens=READ_AND_ANALYZE_MAX_TOKENS)
 
         if verbose:
-            print(f"Full prompt:\n{prompt}")
+            print(f"Full prompt:\n{prompt}\n\n{self.last_prompt_usage.format()}")
             print(f"Raw LLM response:\n{analysis}")
         
         return analysis.strip()
 
+    async def aread_and_analyze_section(self, section_index: str, analysis_instructions: str, verbose: bool = False):
+        """
+        Async version of read_and_analyze_section().
+        """
+        prompt = self.create_read_and_analyze_prompt(section_index, analysis_instructions)
+        analysis = await self.get_llm_client().acomplete_cached(prompt, model_name=self.model_name, max_tokens=READ_AND_ANALYZE_MAX_TOKENS)
+
+        if verbose:
+            print(f"Full prompt:\n{prompt}\n\n{self.last_prompt_usage.format()}")
+            print(f"Raw LLM response:\n{analysis}")
+
+        return analysis.strip()
+
+    def read_and_analyze_sections(self, section_analyses, max_workers: int = MAX_PARALLEL_SECTION_CALLS, verbose: bool = False):
+        """
+        Analyzes several sections at once. section_analyses is a list of (section_index, analysis_instructions). The LLM calls are made in parallel by up to max_workers threads.
+
+        Returns the list of analyses, in the order they were requested. If some LLM calls fail, the other analyses are still returned, with the exception in place of each one that failed. If they all fail, an exception listing the failures is raised.
+        """
+        prompts = [self.create_read_and_analyze_prompt(section_index, analysis_instructions) for section_index, analysis_instructions in section_analyses]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self.get_llm_client().complete_cached, prompt, model_name=self.model_name, max_tokens=READ_AND_ANALYZE_MAX_TOKENS) for prompt in prompts]
+            analyses = []
+            for future in futures:
+                try:
+                    analyses.append(future.result())
+                except Exception as e:
+                    analyses.append(e)
+
+        return self.collect_section_analyses(section_analyses, prompts, analyses, verbose)
+
+    async def aread_and_analyze_sections(self, section_analyses, max_workers: int = MAX_PARALLEL_SECTION_CALLS, verbose: bool = False):
+        """
+        Async version of read_and_analyze_sections().
+        """
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def complete(prompt):
+            async with semaphore:
+                return await self.get_llm_client().acomplete_cached(prompt, model_name=self.model_name, max_tokens=READ_AND_ANALYZE_MAX_TOKENS)
+
+        prompts = [self.create_read_and_analyze_prompt(section_index, analysis_instructions) for section_index, analysis_instructions in section_analyses]
+        analyses = await asyncio.gather(*[complete(prompt) for prompt in prompts], return_exceptions=True)
+
+        return self.collect_section_analyses(section_analyses, prompts, analyses, verbose)
+
+    def collect_section_analyses(self, section_analyses, prompts, analyses, verbose):
+        # analyses holds the LLM's response, or the exception raised by the call, for each of section_analyses
+        results = []
+        errors = []
+        for (section_index, _), prompt, analysis in zip(section_analyses, prompts, analyses):
+            if isinstance(analysis, Exception):
+                errors.append(f"section {section_index}: {analysis}")
+                results.append(analysis)
+                continue
+            if verbose:
+                print(f"Full prompt:\n{prompt}")
+                print(f"Raw LLM response:\n{analysis}")
+            results.append(analysis.strip())
+
+        if errors and len(errors) == len(results):
+            raise RuntimeError(f"No sections could be analyzed: {'; '.join(errors)}")
+        return results
+
     def display(self):
         print(f"Title: {self.title}")
         print("\nTable of Contents:")
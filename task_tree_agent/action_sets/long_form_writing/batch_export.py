@@ -0,0 +1,198 @@
+"""
+Batch export of the documents of many saved agents.
+
+export_directory() finds every agent checkpoint under an input directory and exports each one's document to one or more formats (see export_document.py), mirroring the input directory's layout in the output directory. Checkpoints are loaded and exported in a process pool, so a large batch is spread over all the machine's cores.
+
+A manifest in the output directory records a hash of each checkpoint's contents (its snapshot and journal files) as of its last export. Checkpoints whose contents haven't changed since then, and whose exported files are all still there, are skipped, so a nightly job only does the work for the agents that ran that day. The hashing is done in the worker processes too.
+
+Checkpoints are read without modifying them, so agents that are still running can be exported. Exported files are written to a temporary file and then renamed, so an interrupted export never leaves a partial file behind.
+
+Usage: python batch_export.py input_directory output_directory [--formats md docx] [--workers 8] [--force]
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually. It's in ../../task_tree_agent
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "task_tree_agent"))
+
+from agent.checkpoint import load_checkpoint
+from action_sets.long_form_writing.export_document import WRITERS, export_document, get_document
+
+MANIFEST_FILE_NAME = "export_manifest.json"
+EXPORT_FORMAT_VERSION = 1 # bump when the exporters' output changes, so everything is exported again
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def find_checkpoints(input_directory, pattern="*.pkl"):
+    """
+    Returns the paths of the checkpoints under input_directory, relative to it, in sorted order.
+    """
+    relative_paths = []
+    for directory, _, file_names in os.walk(input_directory):
+        for file_name in file_names:
+            if fnmatch.fnmatch(file_name, pattern):
+                relative_paths.append(os.path.relpath(os.path.join(directory, file_name), input_directory))
+    return sorted(relative_paths)
+
+
+def hash_checkpoint(checkpoint_path):
+    """
+    Returns a hash of the checkpoint's snapshot and journal files, and their total size in bytes.
+    """
+    checkpoint_hash = hashlib.sha256(f"v{EXPORT_FORMAT_VERSION}".encode())
+    num_bytes = 0
+    for path in [checkpoint_path, checkpoint_path + ".journal"]:
+        if not os.path.exists(path):
+            continue
+        checkpoint_hash.update(b"\0" + os.path.basename(path).encode() + b"\0")
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(HASH_BLOCK_SIZE)
+                if not block:
+                    break
+                checkpoint_hash.update(block)
+                num_bytes += len(block)
+    return checkpoint_hash.hexdigest(), num_bytes
+
+
+def get_output_paths(relative_path, output_directory, formats):
+    base_path = os.path.join(output_directory, os.path.splitext(relative_path)[0])
+    return {format: f"{base_path}.{format}" for format in formats}
+
+
+def export_checkpoint(task):
+    """
+    Exports one checkpoint. Runs in a worker process.
+
+    task is (checkpoint path, {format: output path}, hash recorded at the last export or None). Returns a dict with the checkpoint's hash and size, its status ("exported", "unchanged" or "failed"), and the error if it failed.
+    """
+    checkpoint_path, output_paths, previous_hash = task
+    result = {"hash": None, "bytes_read": 0, "bytes_written": 0, "status": "failed", "error": None}
+    try:
+        result["hash"], result["bytes_read"] = hash_checkpoint(checkpoint_path)
+        if result["hash"] == previous_hash and all(os.path.exists(path) for path in output_paths.values()):
+            result["status"] = "unchanged"
+            return result
+
+        document = get_document(load_checkpoint(checkpoint_path, read_only=True))
+        for format, output_path in output_paths.items():
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            temp_path = output_path + ".tmp"
+            try:
+                export_document(document, temp_path, format=format)
+                os.replace(temp_path, output_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            result["bytes_written"] += os.path.getsize(output_path)
+        result["status"] = "exported"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def load_manifest(output_directory):
+    manifest_path = os.path.join(output_directory, MANIFEST_FILE_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {} # a damaged manifest just means everything is exported again
+
+
+def save_manifest(output_directory, manifest):
+    manifest_path = os.path.join(output_directory, MANIFEST_FILE_NAME)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def export_directory(input_directory, output_directory, formats=("md",), max_workers=None, force=False, pattern="*.pkl", verbose=False):
+    """
+    Exports the document of every checkpoint under input_directory to each of formats (keys of export_document.WRITERS), skipping checkpoints that haven't changed since they were last exported, unless force is set.
+    - max_workers: number of worker processes (default: one per CPU)
+
+    Returns a report dict: counts of checkpoints exported, unchanged and failed, the errors ({checkpoint: error}), bytes read and written, elapsed seconds, and throughput.
+    """
+    for format in formats:
+        if format not in WRITERS:
+            raise ValueError(f"Unknown export format: {format!r}. Expected one of {list(WRITERS)}.")
+    os.makedirs(output_directory, exist_ok=True)
+    start_time = time.perf_counter()
+
+    manifest = load_manifest(output_directory)
+    relative_paths = find_checkpoints(input_directory, pattern)
+    tasks = []
+    for relative_path in relative_paths:
+        entry = manifest.get(relative_path)
+        previous_hash = None
+        if entry is not None and not force and sorted(entry.get("formats", [])) == sorted(formats):
+            previous_hash = entry.get("hash")
+        tasks.append((os.path.join(input_directory, relative_path), get_output_paths(relative_path, output_directory, formats), previous_hash))
+
+    report = {"checkpoints": len(tasks), "exported": 0, "unchanged": 0, "failed": 0, "errors": {}, "bytes_read": 0, "bytes_written": 0}
+    max_workers = max_workers or os.cpu_count() or 1
+    # each worker takes checkpoints in chunks, so thousands of small ones don't each cost a round trip to the pool
+    chunksize = max(1, min(16, len(tasks) // (max_workers * 4)))
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for relative_path, result in zip(relative_paths, executor.map(export_checkpoint, tasks, chunksize=chunksize)):
+                report[result["status"]] += 1
+                report["bytes_read"] += result["bytes_read"]
+                report["bytes_written"] += result["bytes_written"]
+                if result["status"] == "failed":
+                    report["errors"][relative_path] = result["error"]
+                    manifest.pop(relative_path, None)
+                else:
+                    manifest[relative_path] = {"hash": result["hash"], "formats": sorted(formats)}
+                if verbose: print(f"{result['status']:>9}  {relative_path}" + (f"  ({result['error']})" if result["error"] else ""))
+    finally:
+        # saved even if the batch is interrupted, so the checkpoints that were exported aren't exported again
+        for relative_path in set(manifest) - set(relative_paths):
+            del manifest[relative_path] # the checkpoint was deleted
+        save_manifest(output_directory, manifest)
+
+    elapsed = time.perf_counter() - start_time
+    report["elapsed_seconds"] = elapsed
+    report["checkpoints_per_second"] = len(tasks) / elapsed if elapsed else 0.0
+    report["megabytes_read_per_second"] = report["bytes_read"] / 1e6 / elapsed if elapsed else 0.0
+    return report
+
+
+def format_report(report):
+    lines = [
+        f"{report['checkpoints']} checkpoints: {report['exported']} exported, {report['unchanged']} unchanged, {report['failed']} failed",
+        f"{report['elapsed_seconds']:.2f}s, {report['checkpoints_per_second']:.1f} checkpoints/s, {report['megabytes_read_per_second']:.1f}MB/s read, {report['bytes_written'] / 1e6:.1f}MB written",
+    ]
+    for relative_path, error in report["errors"].items():
+        lines.append(f"Failed: {relative_path}: {error}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the documents of every saved agent in a directory.")
+    parser.add_argument("input_directory", help="directory containing agent checkpoints (searched recursively)")
+    parser.add_argument("output_directory", help="directory to write the exported documents and the manifest to")
+    parser.add_argument("--formats", nargs="+", default=["md"], choices=list(WRITERS), help="formats to export to (default: md)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: one per CPU)")
+    parser.add_argument("--pattern", default="*.pkl", help="file name pattern of the checkpoints (default: *.pkl)")
+    parser.add_argument("--force", action="store_true", help="export every checkpoint, even if it hasn't changed")
+    parser.add_argument("--verbose", action="store_true", help="print the status of each checkpoint")
+    args = parser.parse_args()
+
+    report = export_directory(args.input_directory, args.output_directory, formats=args.formats, max_workers=args.workers, force=args.force, pattern=args.pattern, verbose=args.verbose)
+    print(format_report(report))
+    sys.exit(1 if report["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+A keyword search index over the text of an SDF Document, so the agent can find what it has already written anywhere in the document (e.g. every mention of a character) without reading whole sections with read_and_analyze_section().
+
+DocumentIndex ranks the document's elements with Okapi BM25. It's kept up to date incrementally: each time it's searched, it checks each section's version, and only re-reads the sections that changed since the last search. In those, only the elements whose text changed are tokenized again, since element text is never modified in place (it's replaced with a new string or PieceTable, see piece_table.py). Elements that move between sections (e.g. in merge_sections() or split_section()) keep their index entries. So a search after a few edits costs about as much as tokenizing the edited elements, not the whole document.
+
+The index is derived from the document, so it isn't saved with it, and is rebuilt on the first search after the document is loaded.
+"""
+
+import heapq
+import math
+import re
+from collections import Counter
+
+WORD_PATTERN = re.compile(r"\w+")
+MAX_RESULTS = 5
+MAX_PASSAGE_WORDS = 150 # longer elements are trimmed to the part that best matches the query
+
+
+def tokenize(text):
+    return WORD_PATTERN.findall(text.casefold())
+
+
+def find_best_window(text, query_terms, max_words=MAX_PASSAGE_WORDS):
+    """
+    Returns the slice of text, at most max_words words long, that contains the most occurrences of query_terms, with "..." where it was trimmed.
+    """
+    word_spans = [match.span() for match in re.finditer(r"\S+", text)]
+    if len(word_spans) <= max_words:
+        return text
+    is_match = [any(term in query_terms for term in tokenize(text[start:end])) for start, end in word_spans]
+    best_start = 0
+    best_count = count = sum(is_match[:max_words])
+    for start in range(1, len(word_spans) - max_words + 1):
+        count += is_match[start + max_words - 1] - is_match[start - 1]
+        if count > best_count:
+            best_start, best_count = start, count
+    best_end = best_start + max_words
+    passage = text[word_spans[best_start][0]:word_spans[best_end - 1][1]]
+    return ("..." if best_start > 0 else "") + passage + ("..." if best_end < len(word_spans) else "")
+
+
+class DocumentIndex:
+    """
+    BM25 index of the elements of document (see the module docstring). Call search() to update it and search it.
+    """
+    def __init__(self, document, k1: float = 1.5, b: float = 0.75):
+        self.document = document
+        self.k1 = k1
+        self.b = b
+        self.section_versions = {} # section -> its version when it was last indexed
+        self.section_elements = {} # section -> the set of its elements when it was last indexed
+        self.element_entries = {} # element -> (text key, term counts, number of tokens, section)
+        self.postings = {} # term -> {element: term frequency}
+        self.total_length = 0
+        self.elements_tokenized = 0 # for benchmarks and tests
+
+    def add_element(self, element, section):
+        term_counts = Counter(tokenize(element.content))
+        text_key = element.get_text_key() # after reading the content, which can replace a piece table with a string
+        length = sum(term_counts.values())
+        for term, count in term_counts.items():
+            self.postings.setdefault(term, {})[element] = count
+        self.element_entries[element] = (text_key, term_counts, length, section)
+        self.total_length += length
+        self.elements_tokenized += 1
+
+    def remove_element(self, element):
+        _, term_counts, length, _ = self.element_entries.pop(element)
+        for term in term_counts:
+            posting = self.postings[term]
+            del posting[element]
+            if not posting:
+                del self.postings[term]
+        self.total_length -= length
+
+    def update_section(self, section):
+        """
+        Re-indexes the elements of section whose text changed, and returns the elements that were removed from it.
+        """
+        for element in section.elements:
+            entry = self.element_entries.get(element)
+            if entry is not None and entry[0] is element.get_text_key():
+                if entry[3] is not section:
+                    self.element_entries[element] = entry[:3] + (section,) # moved here from another section
+                continue
+            if entry is not None:
+                self.remove_element(element)
+            self.add_element(element, section)
+        elements = set(section.elements)
+        removed_elements = self.section_elements.get(section, set()) - elements
+        self.section_versions[section] = section.get_version()
+        self.section_elements[section] = elements
+        return removed_elements
+
+    def update(self):
+        """
+        Brings the index up to date with the document, re-reading only the sections that changed since the last update.
+        """
+        sections = self.document.sections
+        removed_elements = set()
+        for section in sections:
+            if self.section_versions.get(section) != section.get_version():
+                removed_elements |= self.update_section(section)
+
+        current_sections = set(sections)
+        for section in [section for section in self.section_versions if section not in current_sections]:
+            removed_elements.update(self.section_elements.pop(section))
+            del self.section_versions[section]
+
+        for element in removed_elements:
+            entry = self.element_entries.get(element)
+            # an element that was moved to another section is still indexed there
+            if entry is not None and (entry[3] not in current_sections or element not in self.section_elements.get(entry[3], ())):
+                self.remove_element(element)
+
+    def search(self, query, max_results: int = MAX_RESULTS):
+        """
+        Returns the max_results elements that best match query, as a list of (score, section index, element index, element), best first.
+        """
+        self.update()
+        num_elements = len(self.element_entries)
+        if not num_elements:
+            return []
+        average_length = max(self.total_length / num_elements, 1e-12)
+        scores = Counter()
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            idf = math.log(1 + (num_elements - len(posting) + 0.5) / (len(posting) + 0.5))
+            for element, count in posting.items():
+                length_norm = self.k1 * (1 - self.b + self.b * self.element_entries[element][2] / average_length)
+                scores[element] += idf * count * (self.k1 + 1) / (count + length_norm)
+
+        section_indices = {section: i for i, section in enumerate(self.document.sections)}
+        results = []
+        for element, score in heapq.nlargest(max_results, scores.items(), key=lambda item: item[1]):
+            section = self.element_entries[element][3]
+            results.append((score, section_indices[section], section.elements.index(element), element))
+        return results
+
+    def format_search_results(self, query, max_results: int = MAX_RESULTS):
+        """
+        Searches for query, and returns the matching passages as a string, each headed with where it is in the document.
+        """
+        results = self.search(query, max_results)
+        if not results:
+            return f"No passages in the document match the query: {query}"
+        query_terms = set(tokenize(query))
+        passages = []
+        for _, section_index, element_index, element in results:
+            section = self.document.sections[section_index]
+            passages.append(f"Section {section_index} ({section.section_identifier} - {section.title}), element {element_index}:\n{find_best_window(element.content, query_terms)}")
+        return "\n\n".join(passages)
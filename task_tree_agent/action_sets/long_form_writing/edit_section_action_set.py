@@ -25,6 +25,15 @@ def add_element(action_set_object, element_index: int, content: str):
 def edit_element(action_set_object, element_index: int, content: str):
     action_set_object.edit_element(element_index, content)
 
+def append_to_element(action_set_object, element_index: int, content: str):
+    if not isinstance(content, str):
+        raise TypeError("The content must be a string.")
+    if not content:
+        raise ValueError("The content cannot be empty.")
+    # new text starts a new paragraph
+    separator = "\n\n" if action_set_object.elements[element_index].get_length() else ""
+    action_set_object.append_text(element_index, separator + content)
+
 def delete_element(action_set_object, element_index: int):
     action_set_object.delete_element(element_index)
 
@@ -32,10 +41,10 @@ def update_section_title(action_set_object, new_title: str):
     action_set_object.title = new_title
 
 def update_section_summary(action_set_object, new_section_summary: str):
-    action_set_object.section_summary = new_section_summary
+    action_set_object.summary = new_section_summary
 
 def update_section_outline(action_set_object, new_section_outline: str):
-    action_set_object.section_outline = new_section_outline
+    action_set_object.outline = new_section_outline
 
 
 sdf_action_list = [
@@ -51,6 +60,12 @@ sdf_action_list = [
         arguments="Arguments:\n - element_index (int): This is the index of the element that you would like to edit.\n - content (str): This is the content that you would like to use for the element. This will replace the existing content.",
         action_function=edit_element,
     ),
+    Action(
+        name="append_to_element(element_index, content)",
+        when_to_use="Use this when you would like to add one or more paragraphs to the end of an existing element, without rewriting the text that's already there.",
+        arguments="Arguments:\n - element_index (int): This is the index of the element that you would like to add to.\n - content (str): This is the text to add. It will be added as a new paragraph after the existing content of the element.",
+        action_function=append_to_element,
+    ),
     Action(
         name="delete_element(element_index)",
         when_to_use="Use this function to delete an element from the action_set_object.",
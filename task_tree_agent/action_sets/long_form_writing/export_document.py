@@ -1,94 +1,286 @@
-from docx import Document as DocxDocument # pip install python-docx
+"""
+Exporters for SDF documents.
 
-def format_txt(document):
-    formatted = f"Title: {document.title}\n\nTable of Contents:\n"
-    for index, title in enumerate(document.table_of_contents):
-        formatted += f"{index + 1}. {title}\n"
-    formatted += "\n"
+Each format has a DocumentWriter, which writes a document to a file-like object one section at a time, and writes the text of each element piece by piece (see Element.iter_chunks()), so the whole document is never built up in memory as one string. This keeps memory use bounded by the size of a section, however long the document is.
 
-    for section in document.sections:
-        formatted += format_section_txt(section)
+- TxtWriter: plain text
+- MarkdownWriter: markdown, with a linked table of contents
+- JsonWriter: a single JSON object; JsonlWriter: one JSON object per line, the document's title and table of contents first, then one line per section
+- DocxWriter: a Word document, written straight into the .docx zip archive, so python-docx isn't needed
 
-    return formatted
+format_txt(), format_markdown() and format_json() return the same output as a string, for small documents. export_document() writes a document to a file in the format given by its extension. To export the documents of many saved agents at once, see batch_export.py.
 
-def format_section_txt(section, level=1):
-    formatted = f"{'#' * level} {section.title}\n\n"
-    for element in section.elements:
-        formatted += f"{element.content}\n\n"
+Usage: python export_document.py [agent.pkl] [output file]
+"""
+
+import io
+import json
+import os
+import re
+import sys
+import zipfile
+from xml.sax.saxutils import escape
 
-    return formatted
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually. It's in ../../task_tree_agent
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "task_tree_agent"))
 
-def format_markdown(document):
-    formatted = f"# {document.title}\n\n## Table of Contents\n"
-    for index, title in enumerate(document.table_of_contents):
-        formatted += f"{index + 1}. [{title}](#{title.lower().replace(' ', '-')})\n"
-    formatted += "\n"
 
-    for section in document.sections:
-        formatted += format_section_markdown(section)
+class DocumentWriter:
+    """
+    Base class for the exporters. Subclasses implement write_section(), and usually write_header() and write_footer().
+    - output_file: a file-like object, opened in binary mode if the writer's binary attribute is set, and in text mode otherwise
+    """
+    binary = False
 
-    return formatted
+    def __init__(self, output_file):
+        self.output_file = output_file
 
-def format_section_markdown(section, level=1):
-    formatted = f"{'#' * (level + 1)} {section.title}\n\n"
-    for element in section.elements:
-        formatted += f"{element.content}\n\n"
+    def write_document(self, document):
+        self.write_header(document)
+        for section in document.sections:
+            self.write_section(section)
+        self.write_footer(document)
 
-    return formatted
+    def write_header(self, document):
+        pass
 
-def format_docx(document, output_file):
-    docx = DocxDocument()
-
-    # Add title and author
-    docx.add_heading(document.title, level=1)
-    docx.add_paragraph(f"Author: {document.author}")
-
-    # Add table of contents
-    docx.add_heading("Table of Contents", level=2)
-    for index, title in enumerate(document.table_of_contents):
-        docx.add_paragraph(f"{index + 1}. {title}")
-
-    # Add sections
-    for section in document.sections:
-        format_section_docx(docx, section)
-
-    # Save the docx file
-    docx.save(output_file)
-
-def format_section_docx(docx, section, level=2):
-    docx.add_heading(section.title, level=level)
-    for element in section.elements:
-        if element.element_type == 'text':
-            docx.add_paragraph(element.content)
-        elif element.element_type == 'image':
-            docx.add_paragraph(f"[Image: {element.content}]")
-        elif element.element_type == 'table':
-            docx.add_paragraph(f"[Table: {element.content}]")
-        elif element.element_type == 'list':
-            docx.add_paragraph(f"[List: {element.content}]")
-        elif element.element_type == 'code':
-            docx.add_paragraph(f"[Code: {element.content}]")
+    def write_section(self, section):
+        raise NotImplementedError
+
+    def write_footer(self, document):
+        pass
+
+    def write_element_text(self, element):
+        for chunk in element.iter_chunks():
+            self.output_file.write(chunk)
+
+
+class TxtWriter(DocumentWriter):
+    def write_header(self, document):
+        self.output_file.write(f"Title: {document.title}\n\nTable of Contents:\n")
+        for index, title in enumerate(document.table_of_contents):
+            self.output_file.write(f"{index + 1}. {title}\n")
+        self.output_file.write("\n")
+
+    def write_section(self, section, level=1):
+        self.output_file.write(f"{'#' * level} {section.title}\n\n")
+        for element in section.elements:
+            self.write_element_text(element)
+            self.output_file.write("\n\n")
+
+
+class MarkdownWriter(DocumentWriter):
+    def write_header(self, document):
+        self.output_file.write(f"# {document.title}\n\n## Table of Contents\n")
+        for index, title in enumerate(document.table_of_contents):
+            self.output_file.write(f"{index + 1}. [{title}](#{title.lower().replace(' ', '-')})\n")
+        self.output_file.write("\n")
+
+    def write_section(self, section, level=1):
+        self.output_file.write(f"{'#' * (level + 1)} {section.title}\n\n")
+        for element in section.elements:
+            self.write_element_text(element)
+            self.output_file.write("\n\n")
+
+
+class JsonWriter(DocumentWriter):
+    """
+    Writes {"title": ..., "table_of_contents": [...], "sections": [{"section_identifier": ..., "title": ..., "summary": ..., "elements": ["text", ...]}, ...]}, the same as json.dumps() would.
+    """
+    def __init__(self, output_file):
+        super().__init__(output_file)
+        self.num_sections_written = 0
+
+    def write_header(self, document):
+        self.output_file.write(json.dumps({"title": document.title, "table_of_contents": document.table_of_contents})[:-1])
+        self.output_file.write(', "sections": [')
+
+    def write_section(self, section):
+        if self.num_sections_written:
+            self.output_file.write(", ")
+        self.write_section_object(section)
+        self.num_sections_written += 1
+
+    def write_footer(self, document):
+        self.output_file.write("]}")
+
+    def write_section_object(self, section):
+        self.output_file.write(json.dumps({"section_identifier": section.section_identifier, "title": section.title, "summary": section.summary})[:-1])
+        self.output_file.write(', "elements": [')
+        for i, element in enumerate(section.elements):
+            if i:
+                self.output_file.write(", ")
+            self.output_file.write('"')
+            for chunk in element.iter_chunks():
+                # escaping is done character by character, so each piece can be escaped on its own
+                self.output_file.write(json.dumps(chunk)[1:-1])
+            self.output_file.write('"')
+        self.output_file.write("]}")
+
+
+class JsonlWriter(JsonWriter):
+    """
+    Writes the document's title and table of contents on the first line, then each section on a line of its own, in the same format as JsonWriter.
+    """
+    def write_header(self, document):
+        self.output_file.write(json.dumps({"title": document.title, "table_of_contents": document.table_of_contents}) + "\n")
+
+    def write_section(self, section):
+        self.write_section_object(section)
+        self.output_file.write("\n")
+
+    def write_footer(self, document):
+        pass
+
+
+# the parts of a minimal .docx package, other than the document itself
+DOCX_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"><Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/><Default Extension="xml" ContentType="application/xml"/><Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/><Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/></Types>"""
+
+DOCX_PACKAGE_RELATIONSHIPS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/></Relationships>"""
+
+DOCX_DOCUMENT_RELATIONSHIPS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/></Relationships>"""
+
+DOCX_STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:styles xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/><w:pPr><w:spacing w:after="160"/></w:pPr></w:style><w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/><w:basedOn w:val="Normal"/><w:next w:val="Normal"/><w:pPr><w:keepNext/><w:spacing w:before="480"/><w:outlineLvl w:val="0"/></w:pPr><w:rPr><w:b/><w:sz w:val="32"/></w:rPr></w:style><w:style w:type="paragraph" w:styleId="Heading2"><w:name w:val="heading 2"/><w:basedOn w:val="Normal"/><w:next w:val="Normal"/><w:pPr><w:keepNext/><w:spacing w:before="240"/><w:outlineLvl w:val="1"/></w:pPr><w:rPr><w:b/><w:sz w:val="26"/></w:rPr></w:style></w:styles>"""
+
+DOCX_DOCUMENT_START = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>"""
+
+DOCX_DOCUMENT_END = "<w:sectPr/></w:body></w:document>"
+
+# characters that aren't allowed in XML, even escaped
+INVALID_XML_CHARACTER_PATTERN = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+
+
+class DocxWriter(DocumentWriter):
+    """
+    Writes the document as a .docx file: the title and each section's title as headings, and each element as a paragraph, with line breaks where the element's text has newlines. word/document.xml is compressed into the zip archive as it's written.
+    """
+    binary = True
+
+    def __init__(self, output_file):
+        super().__init__(output_file)
+        self.archive = None
+        self.document_xml = None
+
+    def write_header(self, document):
+        self.archive = zipfile.ZipFile(self.output_file, "w", compression=zipfile.ZIP_DEFLATED)
+        self.archive.writestr("[Content_Types].xml", DOCX_CONTENT_TYPES)
+        self.archive.writestr("_rels/.rels", DOCX_PACKAGE_RELATIONSHIPS)
+        self.archive.writestr("word/_rels/document.xml.rels", DOCX_DOCUMENT_RELATIONSHIPS)
+        self.archive.writestr("word/styles.xml", DOCX_STYLES)
+        self.document_xml = io.TextIOWrapper(self.archive.open("word/document.xml", "w", force_zip64=True), encoding="utf-8")
+        self.document_xml.write(DOCX_DOCUMENT_START)
+
+        self.write_paragraph([document.title], style="Heading1")
+        if getattr(document, "author", None):
+            self.write_paragraph([f"Author: {document.author}"])
+        self.write_paragraph(["Table of Contents"], style="Heading2")
+        for index, title in enumerate(document.table_of_contents):
+            self.write_paragraph([f"{index + 1}. {title}"])
+
+    def write_section(self, section):
+        self.write_paragraph([section.title], style="Heading2")
+        for element in section.elements:
+            self.write_paragraph(element.iter_chunks())
+
+    def write_footer(self, document):
+        self.document_xml.write(DOCX_DOCUMENT_END)
+        self.document_xml.close()
+        self.archive.close()
+
+    def write_paragraph(self, chunks, style=None):
+        if style is None:
+            self.document_xml.write("<w:p><w:r><w:t xml:space=\"preserve\">")
         else:
-            docx.add_paragraph(f"[Unknown element type: {element.element_type}]")
+            self.document_xml.write(f"<w:p><w:pPr><w:pStyle w:val=\"{style}\"/></w:pPr><w:r><w:t xml:space=\"preserve\">")
+        for chunk in chunks:
+            text = escape(INVALID_XML_CHARACTER_PATTERN.sub("", chunk))
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+            self.document_xml.write(text.replace("\n", "</w:t><w:br/><w:t xml:space=\"preserve\">").replace("\t", "</w:t><w:tab/><w:t xml:space=\"preserve\">"))
+        self.document_xml.write("</w:t></w:r></w:p>")
 
-    for subsection in section.subsections:
-        format_section_docx(docx, subsection, level=level + 1)
 
+WRITERS = {
+    "txt": TxtWriter,
+    "md": MarkdownWriter,
+    "json": JsonWriter,
+    "jsonl": JsonlWriter,
+    "docx": DocxWriter,
+}
 
-import pickle
-import sys
-import os
 
-sys.path.append(os.path.join(os.path.dirname(__file__), "../elegant_infinite_agent"))
+def export_document(document, output_path, format=None):
+    """
+    Writes the document to output_path. format is one of the keys of WRITERS; by default it's taken from output_path's extension.
+    """
+    if format is None:
+        format = os.path.splitext(output_path)[1].lstrip(".").lower()
+    if format not in WRITERS:
+        raise ValueError(f"Unknown export format: {format!r}. Expected one of {list(WRITERS)}.")
+    writer_class = WRITERS[format]
+    if writer_class.binary:
+        with open(output_path, "wb") as f:
+            writer_class(f).write_document(document)
+    else:
+        with open(output_path, "w", encoding="utf-8", newline="") as f:
+            writer_class(f).write_document(document)
+
+
+def format_with_writer(writer_class, document):
+    output_file = io.StringIO()
+    writer_class(output_file).write_document(document)
+    return output_file.getvalue()
+
+
+def format_txt(document):
+    return format_with_writer(TxtWriter, document)
+
+def format_section_txt(section, level=1):
+    output_file = io.StringIO()
+    TxtWriter(output_file).write_section(section, level=level)
+    return output_file.getvalue()
+
+def format_markdown(document):
+    return format_with_writer(MarkdownWriter, document)
+
+def format_section_markdown(section, level=1):
+    output_file = io.StringIO()
+    MarkdownWriter(output_file).write_section(section, level=level)
+    return output_file.getvalue()
+
+def format_json(document):
+    return format_with_writer(JsonWriter, document)
+
+def format_docx(document, output_file):
+    # output_file: a path or a binary file-like object
+    if isinstance(output_file, str):
+        export_document(document, output_file, format="docx")
+    else:
+        DocxWriter(output_file).write_document(document)
+
+
+def get_document(agent):
+    """
+    Returns the SDF Document an agent was writing.
+    """
+    action_set = agent.action_interface.get_action_set("writing_action_set")
+    if action_set is None or action_set.action_set_object is None:
+        raise ValueError("The agent doesn't have a document (it has no writing_action_set).")
+    return action_set.action_set_object
+
 
-from elegant_infinite_agent import Agent
+def main():
+    from agent.agent_class import Agent
 
-with open("technology_and_society.pkl", "rb") as f:
-    agent = pickle.load(f)
+    agent_path = sys.argv[1] if len(sys.argv) > 1 else "technology_and_society.pkl"
+    output_path = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(agent_path)[0] + ".md"
+    export_document(get_document(Agent.load(agent_path)), output_path)
+    print(f"Saved {output_path}")
 
-document = agent.sdf_document
-md_document = format_markdown(document)
 
-# save the markdown file
-with open("technology_and_society.md", "w") as f:
-    f.write(md_document)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
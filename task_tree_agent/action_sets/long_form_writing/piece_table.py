@@ -0,0 +1,94 @@
+"""
+Piece table storage for element text.
+
+A PieceTable is an immutable sequence of pieces, each a (buffer, start, end) slice of a string. The strings themselves are never copied or modified: inserting text adds a piece for the new text and splits the piece it lands in into two slices of the same buffer, and deleting text just trims or drops pieces. Every edit returns a new PieceTable that shares its buffers with the old one, so keeping an earlier version around (e.g. a snapshot of the document) costs only its list of pieces.
+
+Edits to long elements, like appending a paragraph to a chapter-length element, therefore don't copy the existing text. The text is only joined into a single string when it's read as a whole (see Element.content in SDF.py).
+"""
+
+# once a table has this many pieces, edits join it back into a single string, so reads don't have to walk a long list of tiny pieces
+MAX_PIECES = 256
+
+
+class PieceTable:
+    __slots__ = ("pieces", "length")
+
+    def __init__(self, pieces=()):
+        self.pieces = tuple(piece for piece in pieces if piece[2] > piece[1])
+        self.length = sum(end - start for _, start, end in self.pieces)
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(((text, 0, len(text)),))
+
+    def __len__(self):
+        return self.length
+
+    def __str__(self):
+        return "".join(self.iter_chunks())
+
+    def __reduce__(self):
+        # pickled as plain text; the buffers of other versions aren't worth saving
+        return (PieceTable.from_text, (str(self),))
+
+    def iter_chunks(self):
+        """
+        Yields the text one piece at a time, without joining it.
+        """
+        for buffer, start, end in self.pieces:
+            # a slice covering a whole string is the string itself, so this doesn't copy in the common case
+            yield buffer if start == 0 and end == len(buffer) else buffer[start:end]
+
+    def check_position(self, position):
+        if not isinstance(position, int) or not 0 <= position <= self.length:
+            raise IndexError(f"Text position {position} is out of range (the text is {self.length} characters long).")
+
+    def split(self, position):
+        """
+        Returns (pieces before position, pieces after position).
+        """
+        self.check_position(position)
+        offset = 0
+        for i, (buffer, start, end) in enumerate(self.pieces):
+            if position <= offset + end - start:
+                split_point = start + position - offset
+                return self.pieces[:i] + ((buffer, start, split_point),), ((buffer, split_point, end),) + self.pieces[i + 1:]
+            offset += end - start
+        return self.pieces, ()
+
+    def get_char(self, position):
+        # the character at position, or "" if position is out of range
+        if not 0 <= position < self.length:
+            return ""
+        offset = 0
+        for buffer, start, end in self.pieces:
+            if position < offset + end - start:
+                return buffer[start + position - offset]
+            offset += end - start
+        return ""
+
+    def get_text(self, start, end):
+        return str(PieceTable(self.split(end)[0]).delete(0, start)) if start < end else ""
+
+    def insert(self, position, text):
+        if not text:
+            return self
+        before, after = self.split(position)
+        return PieceTable(before + ((text, 0, len(text)),) + after).compacted()
+
+    def append(self, text):
+        return self.insert(self.length, text)
+
+    def delete(self, start, end):
+        """
+        Returns a table without the text from start up to (but not including) end.
+        """
+        self.check_position(end)
+        if not 0 <= start <= end:
+            raise IndexError(f"Invalid text range {start}:{end}.")
+        return PieceTable(self.split(start)[0] + self.split(end)[1]).compacted()
+
+    def compacted(self):
+        if len(self.pieces) <= MAX_PIECES:
+            return self
+        return PieceTable.from_text(str(self))
@@ -0,0 +1,285 @@
+"""
+Summaries of an SDF Document at three levels, for prompts that need context from more of the document than fits in them verbatim.
+
+- Element summaries are made from the element's text.
+- Section summaries are made from the summaries of the section's elements.
+- The document summary is made from the summaries of its sections.
+
+SummaryCache keeps every summary it makes, along with what it was made from, so a summary is only remade when that changes. Editing an element remakes that element's summary, then its section's summary, then the document summary, and nothing else. Element text is never modified in place (it's replaced with a new string or PieceTable, see piece_table.py), so checking whether an element changed is an identity check.
+
+Summaries are made by a Summarizer:
+- ExtractiveSummarizer (the default) picks the sentences that best cover the text's most frequent words, so it needs no LLM calls
+- LLMSummarizer asks an LLM to summarize the text
+
+Text that's already within a summary's token limit is used as it is, without summarizing it.
+
+The cache is derived from the document, so it isn't saved with it. Summaries made with an LLMSummarizer use LLMClient.complete_cached(), so after a document is loaded they can come from the LLM client's cache, if it has one.
+"""
+
+import math
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from agent.llm_client import get_default_llm_client
+
+ELEMENT_SUMMARY_TOKENS = 60
+SECTION_SUMMARY_TOKENS = 250
+DOCUMENT_SUMMARY_TOKENS = 600
+GENERATED_SUMMARIES_MAX_TOKENS = 800 # for all the section summaries in the document context, see format_generated_section_summaries()
+MIN_GENERATED_SUMMARY_TOKENS = 20
+NUM_NEIGHBORING_SECTIONS = 1 # sections on each side of the current one whose summaries are included in its context
+MAX_PARALLEL_SUMMARIES = 8 # LLM calls in flight at once in LLMSummarizer.summarize_many()
+
+SENTENCE_PATTERN = re.compile(r"[^.!?\n]+(?:[.!?]+[\"')\]]*|\n|$)")
+WORD_PATTERN = re.compile(r"\w+")
+
+SUMMARIZE_PROMPT = """
+Summarize the following text from a long-form document in at most {max_words} words. Keep the names of characters, places and anything else that later parts of the document might refer back to, and what happens to them. Respond with the summary only.
+
+TEXT
+{text}
+""".strip()
+
+
+def split_into_sentences(text):
+    return [sentence.strip() for sentence in SENTENCE_PATTERN.findall(text) if sentence.strip()]
+
+
+class Summarizer:
+    """
+    Base class for summarizers. Subclasses must implement summarize().
+    """
+    def summarize(self, text, max_tokens, token_counter):
+        """
+        Returns a summary of text that's at most max_tokens long, as counted by token_counter.
+        """
+        raise NotImplementedError
+
+    def summarize_many(self, texts, max_tokens, token_counter):
+        """
+        Returns a summary of each of texts, in order.
+        """
+        return [self.summarize(text, max_tokens, token_counter) for text in texts]
+
+
+class ExtractiveSummarizer(Summarizer):
+    """
+    Summarizes text with its first sentence, plus the sentences that contain the most of its frequent words (other than very short ones), kept in their original order, up to max_tokens.
+    """
+    def summarize(self, text, max_tokens, token_counter):
+        if token_counter.count(text) <= max_tokens:
+            return text.strip()
+        sentences = split_into_sentences(text)
+        sentence_words = [[word for word in WORD_PATTERN.findall(sentence.casefold()) if len(word) > 3] for sentence in sentences]
+        word_counts = Counter(word for words in sentence_words for word in words)
+        # normalized by the square root of the length, so long sentences don't win just by being long
+        scores = [sum(word_counts[word] for word in set(words)) / math.sqrt(len(words) + 1) for words in sentence_words]
+        ranked = [0] + sorted(range(1, len(sentences)), key=lambda i: -scores[i])
+
+        chosen = []
+        tokens = 0
+        for i in ranked:
+            sentence_tokens = token_counter.count(sentences[i]) + 1
+            if tokens + sentence_tokens > max_tokens:
+                continue
+            chosen.append(i)
+            tokens += sentence_tokens
+        if not chosen:
+            # even the first sentence is too long
+            return token_counter.truncate(text.strip(), max_tokens)
+        return " ".join(sentences[i] for i in sorted(chosen))
+
+
+class LLMSummarizer(Summarizer):
+    """
+    Summarizes text with an LLM.
+    - llm_client: if None, the default LLMClient is used
+    - max_workers: number of LLM calls made at once by summarize_many()
+    """
+    def __init__(self, llm_client=None, model_name: str = "gpt-3.5-turbo", max_workers: int = MAX_PARALLEL_SUMMARIES):
+        self.llm_client = llm_client
+        self.model_name = model_name
+        self.max_workers = max_workers
+
+    def summarize(self, text, max_tokens, token_counter):
+        if token_counter.count(text) <= max_tokens:
+            return text.strip()
+        llm_client = self.llm_client or get_default_llm_client()
+        prompt = SUMMARIZE_PROMPT.format(max_words=max(1, max_tokens * 3 // 4), text=text)
+        summary = llm_client.complete_cached(prompt, model_name=self.model_name, temperature=0, max_tokens=max_tokens)
+        return token_counter.truncate(summary.strip(), max_tokens)
+
+    def summarize_many(self, texts, max_tokens, token_counter):
+        if len(texts) <= 1:
+            return super().summarize_many(texts, max_tokens, token_counter)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda text: self.summarize(text, max_tokens, token_counter), texts))
+
+
+class SummaryCache:
+    """
+    Element, section and document summaries of document (see the module docstring).
+    """
+    def __init__(self, document, summarizer: Summarizer, token_counter):
+        self.document = document
+        self.summarizer = summarizer
+        self.token_counter = token_counter
+        self.element_summaries = {} # element -> (text key, summary)
+        self.section_summaries = {} # section -> (element summaries, summary)
+        self.combined_summaries = {} # section -> (element summaries, summary) for its earliest elements, see format_section_elements()
+        self.document_summary = None # (section summaries, summary)
+        self.summaries_made = 0 # for benchmarks and tests
+
+    def summarize_many(self, texts, max_tokens):
+        self.summaries_made += len(texts)
+        return self.summarizer.summarize_many(texts, max_tokens, self.token_counter)
+
+    def is_element_summary_stale(self, element):
+        entry = self.element_summaries.get(element)
+        return entry is None or entry[0] is not element.get_text_key()
+
+    def update_element_summaries(self, elements):
+        # summarizes the elements whose summaries are missing or out of date, all at once, so an LLMSummarizer can make its calls in parallel
+        stale_elements = list({element: None for element in elements if self.is_element_summary_stale(element)})
+        contents = [element.content for element in stale_elements]
+        text_keys = [element.get_text_key() for element in stale_elements] # after reading the content, which can replace a piece table with a string
+        summaries = self.summarize_many(contents, ELEMENT_SUMMARY_TOKENS)
+        for element, text_key, summary in zip(stale_elements, text_keys, summaries):
+            self.element_summaries[element] = (text_key, summary)
+
+    def get_element_summary(self, element):
+        self.update_element_summaries([element])
+        return self.element_summaries[element][1]
+
+    def get_section_summaries(self, sections):
+        """
+        Returns the summary of each of sections, in order, remaking only the ones whose elements' summaries changed.
+        """
+        self.update_element_summaries([element for section in sections for element in section.elements])
+        element_summaries = [tuple(self.element_summaries[element][1] for element in section.elements) for section in sections]
+        stale_sections = {}
+        for section, summaries in zip(sections, element_summaries):
+            entry = self.section_summaries.get(section)
+            if entry is None or entry[0] != summaries:
+                stale_sections[section] = summaries
+        new_summaries = self.summarize_many([" ".join(summaries) for summaries in stale_sections.values()], SECTION_SUMMARY_TOKENS)
+        for (section, summaries), summary in zip(stale_sections.items(), new_summaries):
+            self.section_summaries[section] = (summaries, summary)
+        self.prune()
+        return [self.section_summaries[section][1] for section in sections]
+
+    def get_section_summary(self, section):
+        return self.get_section_summaries([section])[0]
+
+    def get_document_summary(self):
+        sections = self.document.sections
+        section_summaries = tuple(self.get_section_summaries(sections))
+        if self.document_summary is None or self.document_summary[0] != section_summaries:
+            text = "\n\n".join(f"{section.title}: {summary}" for section, summary in zip(sections, section_summaries))
+            self.document_summary = (section_summaries, self.summarize_many([text], DOCUMENT_SUMMARY_TOKENS)[0])
+        return self.document_summary[1]
+
+    def format_generated_section_summaries(self, sections, max_tokens=GENERATED_SUMMARIES_MAX_TOKENS):
+        """
+        Returns the summaries of sections (the ones without a summary written by the agent), for the document context. They share max_tokens: each is cut to an equal share of it, but not below MIN_GENERATED_SUMMARY_TOKENS, and the sections that don't fit in max_tokens are left out.
+        """
+        items = [(section, summary) for section, summary in zip(sections, self.get_section_summaries(sections)) if summary]
+        if not items:
+            return ""
+        summary_tokens = max(MIN_GENERATED_SUMMARY_TOKENS, max_tokens // len(items))
+        parts = ["\nSection Summaries Generated From The Text (for sections without a summary):\n"]
+        tokens = 0
+        for section, summary in items:
+            part = f"{section.section_identifier} - {section.title}:\n{self.token_counter.truncate(summary, summary_tokens)}\n\n"
+            tokens += self.token_counter.count(part)
+            if tokens > max_tokens:
+                break
+            parts.append(part)
+        return "".join(parts)
+
+    def prune(self):
+        # forget the summaries of elements and sections that have been deleted, once there are enough of them to be worth a pass over the document
+        num_elements = sum(len(section.elements) for section in self.document.sections)
+        if len(self.element_summaries) <= 2 * num_elements + 100:
+            return
+        elements = {element for section in self.document.sections for element in section.elements}
+        self.element_summaries = {element: entry for element, entry in self.element_summaries.items() if element in elements}
+        sections = set(self.document.sections)
+        self.section_summaries = {section: entry for section, entry in self.section_summaries.items() if section in sections}
+        self.combined_summaries = {section: entry for section, entry in self.combined_summaries.items() if section in sections}
+
+    def format_neighboring_sections(self, section_index, max_tokens):
+        """
+        Returns the summaries of the NUM_NEIGHBORING_SECTIONS sections on each side of the section at section_index, nearest first, for as many as fit in max_tokens.
+        """
+        sections = self.document.sections
+        neighbors = []
+        for distance in range(1, NUM_NEIGHBORING_SECTIONS + 1):
+            neighbors += [i for i in (section_index - distance, section_index + distance) if 0 <= i < len(sections)]
+
+        parts = {}
+        tokens = 0
+        summaries = self.get_section_summaries([sections[i] for i in neighbors])
+        for i, summary in zip(neighbors, summaries):
+            section = sections[i]
+            position = "Previous" if i < section_index else "Next"
+            part = f"{position} Section: {section.section_identifier} - {section.title}\n{summary or '(empty)'}\n\n"
+            part_tokens = self.token_counter.count(part)
+            if tokens + part_tokens > max_tokens:
+                break
+            parts[i] = part
+            tokens += part_tokens
+        return "".join(parts[i] for i in sorted(parts))
+
+    def get_combined_summary(self, section, elements):
+        # one summary of several of section's elements, made from their summaries
+        element_summaries = tuple(self.element_summaries[element][1] for element in elements)
+        entry = self.combined_summaries.get(section)
+        if entry is None or entry[0] != element_summaries:
+            entry = (element_summaries, self.summarize_many([" ".join(element_summaries)], SECTION_SUMMARY_TOKENS)[0])
+            self.combined_summaries[section] = entry
+        return entry[1]
+
+    def format_section_elements(self, section, max_tokens):
+        """
+        Returns the text of section's elements, labelled with their indices. If that's over max_tokens, the elements nearest the end of the section, where writing usually continues, are kept as they are, and the earlier ones are replaced with their summaries. If there are too many of those to fit, the earliest ones are summarized together.
+
+        Returns (text, number of elements that were summarized).
+        """
+        label_tokens = 8 # roughly, for "Element: 12\n" and the blank line after the element
+        contents = [element.content for element in section.elements]
+        if section.get_stats()[2] + label_tokens * len(contents) <= max_tokens:
+            return "".join(f"Element: {i}\n{content}\n\n" for i, content in enumerate(contents)), 0
+        element_tokens = [self.token_counter.count(content) for content in contents]
+        summary_tokens = ELEMENT_SUMMARY_TOKENS + label_tokens
+        combined_summary_tokens = SECTION_SUMMARY_TOKENS + label_tokens
+
+        # keep elements verbatim, from the end, as long as the ones before them still fit as summaries
+        num_summarized = len(contents)
+        tokens = 0
+        while num_summarized > 0:
+            verbatim_tokens = element_tokens[num_summarized - 1] + label_tokens
+            if tokens + verbatim_tokens + min((num_summarized - 1) * summary_tokens, combined_summary_tokens) > max_tokens:
+                break
+            tokens += verbatim_tokens
+            num_summarized -= 1
+
+        # the latest of the summarized elements get a summary each, and the ones before them share one
+        num_combined = 0
+        if num_summarized * summary_tokens > max_tokens - tokens:
+            num_combined = num_summarized - max(0, (max_tokens - tokens - combined_summary_tokens) // summary_tokens)
+
+        self.update_element_summaries(section.elements[:num_summarized])
+        parts = []
+        if num_combined:
+            parts.append(f"Elements: 0 to {num_combined - 1} (summarized together; the full text is longer)\n{self.get_combined_summary(section, section.elements[:num_combined])}\n\n")
+        for i, (element, content) in enumerate(zip(section.elements, contents)):
+            if i < num_combined:
+                continue
+            if i < num_summarized:
+                parts.append(f"Element: {i} (summarized; the full text is longer)\n{self.element_summaries[element][1]}\n\n")
+            else:
+                parts.append(f"Element: {i}\n{content}\n\n")
+        self.prune()
+        return "".join(parts), num_summarized
@@ -57,6 +57,40 @@ def edit_section(action_set_object, section_index, editing_instructions):
 def read_and_analyze_section(action_set_object, section_index, analysis_instructions):
     return action_set_object.read_and_analyze_section(section_index, analysis_instructions)
 
+def edit_sections(action_set_object, section_edits):
+    action_set_object.edit_sections([(edit["section_index"], edit["editing_instructions"]) for edit in section_edits])
+
+def read_and_analyze_sections(action_set_object, section_analyses):
+    section_analyses = [(analysis["section_index"], analysis["analysis_instructions"]) for analysis in section_analyses]
+    analyses = action_set_object.read_and_analyze_sections(section_analyses)
+    return format_section_analyses(section_analyses, analyses)
+
+def search_document(action_set_object, query):
+    return action_set_object.search(query)
+
+def format_section_analyses(section_analyses, analyses):
+    # an analysis that failed is an exception (see Document.read_and_analyze_sections)
+    return "\n\n".join(f"Section {section_index}:\n{f'Error: {analysis}' if isinstance(analysis, Exception) else analysis}" for (section_index, _), analysis in zip(section_analyses, analyses))
+
+# async versions of the actions that make their own LLM call, so they can run concurrently (see ActionInterface.aparse_response_and_perform_actions)
+async def aedit_section(action_set_object, section_index, editing_instructions):
+    await action_set_object.aedit_section(section_index, editing_instructions)
+
+async def aread_and_analyze_section(action_set_object, section_index, analysis_instructions):
+    return await action_set_object.aread_and_analyze_section(section_index, analysis_instructions)
+
+async def aedit_sections(action_set_object, section_edits):
+    await action_set_object.aedit_sections([(edit["section_index"], edit["editing_instructions"]) for edit in section_edits])
+
+async def aread_and_analyze_sections(action_set_object, section_analyses):
+    section_analyses = [(analysis["section_index"], analysis["analysis_instructions"]) for analysis in section_analyses]
+    analyses = await action_set_object.aread_and_analyze_sections(section_analyses)
+    return format_section_analyses(section_analyses, analyses)
+
+# the resource touched by a section-level action is the Section itself
+def get_section(action_set_object, section_index, **kwargs):
+    return action_set_object.sections[section_index]
+
 
 writing_actions_list = [
     Action(
@@ -153,13 +187,40 @@ writing_actions_list = [
         name="edit_section(section_index, editing_instructions)",
         when_to_use="Use this function to add to or edit the text for a specific section of the document. This function calls another LLM that's been fine-tuned for writing, and that has access to the full text of the section. When you call edit_section, you just need to provide editing instructions, so that this special-purpose LLM knows what to do. Note: you must create a section (by using the add_section function) before you can edit it.",
         arguments="Arguments:\n  - section_index: The index of the section to edit. Note: sections are zero-indexed, so the first section will be index 0, etc.\n  - editing_instructions: Natural language instructions describing the additions or edits to be made.",
-        action_function=edit_section
+        action_function=edit_section,
+        async_action_function=aedit_section,
+        resource_function=get_section,
     ),
     Action(
         name="read_and_analyze_section(section_index, analysis_instructions)",
         when_to_use="Use this function to read and analyze a specific section of the document. This function calls another LLM that's been fine-tuned for reading, and that has access to the full text of the section. When you call read_and_analyze_section, you just need to provide analysis instructions, so that this special-purpose LLM knows what to do. Keep in mind that this function can only analyze one section at a time. If you want to analyze multiple sections, you'll need to call this function multiple times. This is the only method you have to read what you write, so be sure to use it frequently!",
         arguments="Arguments:\n  - section_index: The index of the section to read and analyze. Note: sections are zero-indexed, so the first section will be index 0, etc.\n  - analysis_instructions: Natural language instructions describing the analysis to be performed. Be clear about what exactly you want to analyze.",
-        action_function=read_and_analyze_section
+        action_function=read_and_analyze_section,
+        async_action_function=aread_and_analyze_section,
+        resource_function=get_section,
+        read_only=True,
+    ),
+    Action(
+        name="edit_sections(section_edits)",
+        when_to_use="Use this function instead of edit_section when you want to edit several sections at once. The edits are made in parallel, so this is much faster than calling edit_section once for each section. Each edit works the same way as edit_section.",
+        arguments="Arguments:\n  - section_edits: A list of dictionaries, one for each edit, each with the keys \"section_index\" (the index of the section to edit) and \"editing_instructions\" (natural language instructions describing the additions or edits to be made to that section).",
+        action_function=edit_sections,
+        async_action_function=aedit_sections,
+    ),
+    Action(
+        name="read_and_analyze_sections(section_analyses)",
+        when_to_use="Use this function instead of read_and_analyze_section when you want to analyze several sections at once. The analyses are done in parallel, so this is much faster than calling read_and_analyze_section once for each section. Each analysis works the same way as read_and_analyze_section.",
+        arguments="Arguments:\n  - section_analyses: A list of dictionaries, one for each analysis, each with the keys \"section_index\" (the index of the section to analyze) and \"analysis_instructions\" (natural language instructions describing the analysis to be performed on that section).",
+        action_function=read_and_analyze_sections,
+        async_action_function=aread_and_analyze_sections,
+        read_only=True,
+    ),
+    Action(
+        name="search_document(query)",
+        when_to_use="Use this function to find the passages anywhere in the document that are most relevant to a query, e.g. to check what you've already written about a character, location or event, or whether a new section is consistent with earlier ones. It searches the full text of every section by keyword and returns only the best matching passages, along with the section and element each is in, so it's much faster than reading whole sections with read_and_analyze_section. Use read_and_analyze_section when you need to read a section as a whole.",
+        arguments="Arguments:\n  - query: The words to search for, e.g. the name of a character and what you want to check about them.",
+        action_function=search_document,
+        read_only=True,
     ),
 ]
 
@@ -1,23 +1,132 @@
-class Task:
+from agent.checkpoint import Journaled
+
+class Task(Journaled):
+    """
+    A node in the task tree.
+
+    The next task is the first task, in depth-first order, that isn't complete and whose subtasks (if any) are all complete. To find it without searching the whole tree, each task keeps:
+    - _index: its position in its parent's subtasks list
+    - _num_complete_subtasks: how many of its direct subtasks are complete
+    - _num_ready: how many tasks in its subtree (including itself) could be the next task
+    These are kept up to date by add_subtask() and by setting complete, so subtasks should only be added through add_subtask(). They aren't saved when the tree is pickled or checkpointed; the index is rebuilt the first time it's needed after loading.
+
+    Tasks use __slots__ rather than a __dict__, since an agent can create tens of thousands of them.
+    """
+    __slots__ = ("description", "_complete", "subtasks", "parent", "_index", "_num_complete_subtasks", "_num_ready", "_scan_from")
+    _derived_attributes = ("_index", "_num_complete_subtasks", "_num_ready", "_scan_from")
+
     def __init__(self, description, complete=False, parent=None):
         self.description = description
-        self.complete = complete
+        self._complete = bool(complete)
         self.subtasks = []
         self.parent = parent
+        object.__setattr__(self, "_index", 0)
+        object.__setattr__(self, "_num_complete_subtasks", 0)
+        object.__setattr__(self, "_num_ready", 0 if complete else 1)
+
+    def __setstate__(self, state):
+        if "complete" in state:
+            # pickled before complete became a property
+            state = dict(state)
+            state["_complete"] = state.pop("complete")
+        super().__setstate__(state)
+
+    @property
+    def complete(self):
+        return self._complete
+
+    @complete.setter
+    def complete(self, value):
+        value = bool(value)
+        if value == self._complete:
+            return
+        self.ensure_index()
+
+        was_ready = self.is_ready()
+        self._complete = value
+        self.update_num_ready(self.is_ready() - was_ready)
+
+        if self.parent:
+            parent_was_ready = self.parent.is_ready()
+            object.__setattr__(self.parent, "_num_complete_subtasks", self.parent._num_complete_subtasks + (1 if value else -1))
+            self.parent.update_num_ready(self.parent.is_ready() - parent_was_ready)
+
+    def is_ready(self):
+        # True if this task could be the next task: it isn't complete, and neither is it waiting on any subtasks
+        return not self._complete and self._num_complete_subtasks == len(self.subtasks)
+
+    def update_num_ready(self, delta):
+        """
+        Adds delta to _num_ready for this task and all its ancestors.
+        """
+        if not delta:
+            return
+        task = self
+        while task is not None:
+            object.__setattr__(task, "_num_ready", task._num_ready + delta)
+            parent = task.parent
+            if delta > 0 and parent is not None and task._index < getattr(parent, "_scan_from", 0):
+                object.__setattr__(parent, "_scan_from", task._index)
+            task = parent
+
+    def ensure_index(self):
+        """
+        Rebuilds the index for the whole tree if it's missing (i.e. the tree was just loaded).
+        """
+        if getattr(self, "_num_ready", None) is not None:
+            return
+        root = self
+        while root.parent is not None:
+            root = root.parent
+
+        # post-order traversal, so subtasks are indexed before their parents
+        stack = [(root, False)]
+        while stack:
+            task, subtasks_done = stack.pop()
+            if not subtasks_done:
+                stack.append((task, True))
+                stack.extend((subtask, False) for subtask in task.subtasks)
+                continue
+            for i, subtask in enumerate(task.subtasks):
+                object.__setattr__(subtask, "_index", i)
+            object.__setattr__(task, "_num_complete_subtasks", sum(1 for subtask in task.subtasks if subtask._complete))
+            object.__setattr__(task, "_num_ready", int(task.is_ready()) + sum(subtask._num_ready for subtask in task.subtasks))
+            object.__setattr__(task, "_scan_from", 0)
+        if getattr(root, "_index", None) is None:
+            object.__setattr__(root, "_index", 0)
 
     def add_subtask(self, subtask):
+        self.ensure_index()
+        subtask.ensure_index()
+
+        was_ready = self.is_ready()
         subtask.parent = self
+        object.__setattr__(subtask, "_index", len(self.subtasks))
         self.subtasks.append(subtask)
+        if subtask._complete:
+            object.__setattr__(self, "_num_complete_subtasks", self._num_complete_subtasks + 1)
+        self.mark_changed()
 
-    def find_next_task(self):
-        if not self.complete and (not self.subtasks or all([subtask.complete for subtask in self.subtasks])):
-            return self
+        self.update_num_ready(subtask._num_ready + self.is_ready() - was_ready)
 
-        for subtask in self.subtasks:
-            next_task = subtask.find_next_task()
-            if next_task:
-                return next_task
-        return None
+    def find_next_task(self):
+        """
+        Returns the next task to work on in this task's subtree, or None if there isn't one.
+        """
+        self.ensure_index()
+
+        # walk down the tree, always into the first subtask whose subtree has a ready task
+        task = self
+        if task._num_ready == 0:
+            return None
+        while not task.is_ready():
+            # subtasks before _scan_from are known to have no ready tasks, so we don't need to look at them again
+            i = getattr(task, "_scan_from", 0)
+            while task.subtasks[i]._num_ready == 0:
+                i += 1
+            object.__setattr__(task, "_scan_from", i)
+            task = task.subtasks[i]
+        return task
 
     def print_tree(self, level=0):
         indent = "  " * level
@@ -38,7 +147,7 @@ class Task:
         if self.parent:
             local_task_tree_str += "Current and sibling tasks:\n"
             for i,task in enumerate(self.parent.subtasks):
-                if task == self:
+                if i == self._index:
                     local_task_tree_str += f"  - Task {i+1}: {task.description} (CURRENT TASK)\n"
                 else:
                     local_task_tree_str += f"  - Task {i+1}: {task.description}\n"
@@ -1,19 +1,99 @@
-import json
+import asyncio
+import copy
+import inspect
 
-class Action:
-    def __init__(self, name: str, when_to_use: str, arguments: str, action_function, action_set_name: str=None, action_set_object=None):
+from agent.action_log import ActionLog
+from agent.checkpoint import Journaled
+from agent.response_parser import PART_1_HEADER, PART_2_HEADER, StreamingResponseParser, parse_action_list
+
+class Action(Journaled):
+    _derived_attributes = ("_function_name", "_signature")
+
+    def __init__(self, name: str, when_to_use: str, arguments: str, action_function, action_set_name: str=None, action_set_object=None, async_action_function=None, resource_function=None, read_only: bool=False, batch_function=None):
         self.name = name # function name, in string format, with arguments and their types - MUST identically match the function signature (except for arguments)
         self.when_to_use = when_to_use # description of when to use the action
         self.arguments = arguments # description of the arguments for the action, as a string
         self.action_function = action_function # callable function
         self.action_set_name = action_set_name # name of the action set that contains this action
         self.action_set_object = action_set_object # optional object used by the action set
+        self.async_action_function = async_action_function # optional coroutine function; actions that have one can run concurrently with each other
+        self.resource_function = resource_function # optional function that takes the same arguments as the action and returns the object it touches (e.g. a Section), for conflict detection
+        self.read_only = read_only # True if the action doesn't modify the resource it touches
+        self.batch_function = batch_function # optional function that performs several requests for this action at once: it takes a list of parameter dicts and returns a list of outputs, one per request, with the exception in place of the output of a request that failed. Consecutive requests for the action are coalesced into one call of it
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        # drop the cached name and signature if what they're derived from changes
+        if name == "name":
+            self.__dict__.pop("_function_name", None)
+        elif name == "action_function":
+            self.__dict__.pop("_signature", None)
+
+    def get_function_name(self):
+        """
+        Returns the name the LLM uses to call this action, i.e. the part of self.name before the arguments.
+        """
+        function_name = self.__dict__.get("_function_name")
+        if function_name is None:
+            function_name = self.name.split("(")[0].strip()
+            object.__setattr__(self, "_function_name", function_name)
+        return function_name
+
+    def get_signature(self):
+        """
+        Returns the inspect.Signature of the action function, or None if it can't be determined (e.g. for some builtins).
+        """
+        if "_signature" not in self.__dict__:
+            try:
+                signature = inspect.signature(self.action_function)
+            except (TypeError, ValueError):
+                signature = None
+            object.__setattr__(self, "_signature", signature)
+        return self.__dict__["_signature"]
+
+    def check_arguments(self, parameters):
+        """
+        Returns an error message if the action can't be called with these parameters, or None if it can.
+        """
+        signature = self.get_signature()
+        if signature is None:
+            return None
+        try:
+            signature.bind(**parameters)
+        except TypeError as e:
+            return f"Invalid arguments for action {self.get_function_name()}: {e}. Usage: {self.name}"
+        return None
 
     def perform(self, *args, **kwargs):
         return self.action_function(*args, **kwargs)
+
+    async def aperform(self, *args, **kwargs):
+        if getattr(self, "async_action_function", None) is None:
+            return self.perform(*args, **kwargs)
+        return await self.async_action_function(*args, **kwargs)
+
+    def perform_batch(self, parameters_list):
+        return self.batch_function(parameters_list)
+
+    def is_batchable(self):
+        # actions pickled before batching existed won't have the attribute
+        return getattr(self, "batch_function", None) is not None
+
+    def is_concurrent(self):
+        # actions pickled before async support existed won't have these attributes
+        return getattr(self, "async_action_function", None) is not None and getattr(self, "resource_function", None) is not None
+
+    def get_resource(self, parameters):
+        """
+        Returns the object this action will touch when called with these parameters, or None if it can't be determined.
+        """
+        try:
+            return self.resource_function(**parameters)
+        except Exception:
+            return None
     
 
-class ActionSet:
+class ActionSet(Journaled):
     def __init__(self, action_list: list, action_set_name: str, action_set_object):
         self.action_list = action_list # list of Action objects
         self.action_set_name = action_set_name # name of the action set
@@ -25,10 +105,23 @@ class ActionSet:
             action.action_set_object = self.action_set_object
 
     def update_action_set_object(self, action_set_object):
+        if action_set_object is self.action_set_object:
+            return
         self.action_set_object = action_set_object
         for action in self.action_list:
             action.action_set_object = action_set_object
     
+    def copy(self, action_set_object=None):
+        """
+        Returns a copy of this action set with its own Action objects, pointed at action_set_object (or at the same object as this one, if None).
+
+        Agents that run in the same process (see agent/scheduler.py) each need their own copy, since running an agent re-points its action sets at that agent's objects.
+        """
+        action_list = [copy.copy(action) for action in self.action_list]
+        if action_set_object is None:
+            action_set_object = self.action_set_object
+        return ActionSet(action_list=action_list, action_set_name=self.action_set_name, action_set_object=action_set_object)
+
     def format_prompt_context(self):
         # look for a function called "format_prompt_context" in the action set object
         if hasattr(self.action_set_object, "format_prompt_context"):
@@ -36,154 +129,437 @@ class ActionSet:
         else:
             return None
 
+    def get_prompt_context_version(self):
+        """
+        Returns a value that changes whenever the output of format_prompt_context() might change, or None if that can't be known (in which case the context isn't cached).
+
+        Action set objects opt in to caching by defining get_prompt_context_version() alongside format_prompt_context() (see Document).
+        """
+        if not hasattr(self.action_set_object, "format_prompt_context"):
+            return ()
+        if hasattr(self.action_set_object, "get_prompt_context_version"):
+            return (self.action_set_object, self.action_set_object.get_prompt_context_version())
+        return None
+
     
-class ActionInterface:
+class ActionInterface(Journaled):
     """
     Contains functions for working with action sets and performing actions.
+
+    Actions and action sets are looked up by name in a registry (a dict), so the cost of dispatching an action doesn't depend on how many action sets are registered. The registry isn't saved; it's rebuilt the first time it's needed after loading. Use add_action_set() and remove_action_set() to change the action sets at runtime, so the registry stays in sync.
+
+    The prompt fragments built here (available actions, action set context, action log) are cached, each with the key it was built from, and reused until the key changes.
     """
-    def __init__(self, action_set_list):
+    _derived_attributes = ("_actions_by_name", "_action_sets_by_name", "_prompt_fragment_cache")
+
+    def __init__(self, action_set_list, action_log=None):
         self.action_set_list = action_set_list # save our list of ActionSet objects
         self.action_list = get_action_list(action_set_list) # create list of all Action objects
-        self.agent_action_log = []
+        self.agent_action_log = action_log if action_log is not None else ActionLog() # see agent/action_log.py
+        self.build_registry()
 
-    def get_action(self, action_name):
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        if isinstance(self.agent_action_log, list):
+            # saved before ActionLog existed, when the log was a list of formatted strings
+            object.__setattr__(self, "agent_action_log", ActionLog.from_entries(self.agent_action_log))
+            self.mark_changed()
+
+    def build_registry(self):
+        # if two actions have the same name, the first one wins, as it did when actions were looked up by scanning the list
+        actions_by_name = {}
         for action in self.action_list:
-            function_name = action.name.split("(")[0]
-            if function_name == action_name:
-                return action
-        return None
+            actions_by_name.setdefault(action.get_function_name(), action)
+        action_sets_by_name = {}
+        for action_set in self.action_set_list:
+            action_sets_by_name.setdefault(action_set.action_set_name, action_set)
+        object.__setattr__(self, "_actions_by_name", actions_by_name)
+        object.__setattr__(self, "_action_sets_by_name", action_sets_by_name)
+
+    def get_registry(self):
+        if "_actions_by_name" not in self.__dict__:
+            self.build_registry()
+        return self._actions_by_name, self._action_sets_by_name
+
+    def add_action_set(self, action_set):
+        if action_set.action_set_name in self.get_registry()[1]:
+            raise ValueError(f"An action set named {action_set.action_set_name} has already been added.")
+        self.action_set_list.append(action_set)
+        self.action_list.extend(action_set.action_list)
+        self.mark_changed()
+        self.build_registry()
+
+    def remove_action_set(self, action_set_name):
+        """
+        Removes the action set with this name, and returns it.
+        """
+        action_set = self.get_action_set(action_set_name)
+        if action_set is None:
+            raise ValueError(f"Unknown action set: {action_set_name}")
+        self.action_set_list.remove(action_set)
+        self.action_list = get_action_list(self.action_set_list)
+        self.build_registry()
+        return action_set
+
+    def get_action(self, action_name):
+        if not isinstance(action_name, str):
+            return None
+        return self.get_registry()[0].get(action_name)
     
     def get_action_set(self, action_set_name):
-        for action_set in self.action_set_list:
-            if action_set.action_set_name == action_set_name:
-                return action_set
-        return None
+        return self.get_registry()[1].get(action_set_name)
     
+    def get_cached_prompt_fragment(self, fragment_name, key, build_function):
+        """
+        Returns the cached fragment if it was built with the same key, and otherwise builds it with build_function() and caches it. A key of None means the fragment can't be cached.
+        """
+        cache = self.__dict__.get("_prompt_fragment_cache")
+        if cache is None:
+            cache = {}
+            object.__setattr__(self, "_prompt_fragment_cache", cache)
+        cached = cache.get(fragment_name)
+        if key is not None and cached is not None and cached[0] == key:
+            return cached[1]
+        fragment = build_function()
+        cache[fragment_name] = (key, fragment)
+        return fragment
+
     def get_action_set_prompt_context(self):
         """
         add additional context associated with each action set
         """
-        context_str = ""
-        for action_set in self.action_set_list:
-            prompt_context = action_set.format_prompt_context()
-            if prompt_context:
-                context_str += prompt_context + "\n\n"
-        return context_str.strip()
+        key = tuple(action_set.get_prompt_context_version() for action_set in self.action_set_list)
+        if None in key:
+            key = None
+        return self.get_cached_prompt_fragment("action_set_prompt_context", key, self.build_action_set_prompt_context)
+
+    def build_action_set_prompt_context(self):
+        prompt_contexts = [action_set.format_prompt_context() for action_set in self.action_set_list]
+        return "\n\n".join(prompt_context for prompt_context in prompt_contexts if prompt_context).strip()
     
     def get_available_actions_for_prompt(self):
-        available_actions_str = ""
-        for action in self.action_list:
-            available_actions_str += f"{action.name}\nUsage: {action.when_to_use}\n{action.arguments}\n\n"
-        return available_actions_str.strip()
+        key = tuple((action.name, action.when_to_use, action.arguments) for action in self.action_list)
+        return self.get_cached_prompt_fragment("available_actions", key, self.build_available_actions_for_prompt)
+
+    def build_available_actions_for_prompt(self):
+        return "\n\n".join(f"{action.name}\nUsage: {action.when_to_use}\n{action.arguments}" for action in self.action_list).strip()
     
     def update_action_set_object(self, action_set_name, action_set_object):
-        for action in self.action_list:
-            if action.action_set_name == action_set_name:
-                action.action_set_object = action_set_object
-
-        for action_set in self.action_set_list:
-            if action_set.action_set_name == action_set_name:
-                action_set.action_set_object = action_set_object
+        action_set = self.get_action_set(action_set_name)
+        if action_set is not None:
+            action_set.update_action_set_object(action_set_object)
     
-    def parse_response_and_perform_actions(self, response):
-        """
-        This function relies on the LLM being prompted to respond with a JSON string containing a list of action dictionaries.
+    def parse_actions_list(self, response):
         """
-        # Extract the action JSON string from the response, starting with the first open square bracket
-        actions_json_str = response.strip()[response.strip().find("["):]
+        This function relies on the LLM being prompted to respond with a list of action dictionaries, after the "Part 2) Action requests" header.
 
-        if not actions_json_str:
+        Returns the list of action dictionaries that could be parsed, or None if there wasn't an action list at all. Each dictionary is parsed separately (see agent/response_parser.py), so one malformed action doesn't throw away the rest of the response; the errors for any that couldn't be parsed are added to the action log.
+        """
+        if not response.strip():
             error_message = "Warning: Empty response from LLM."
             print(error_message)
-            self.agent_action_log.append(self.format_error_message(error_message, response)) # Add the error message to the agent's action log
+            self.add_to_action_log(self.format_error_message(error_message, response)) # Add the error message to the agent's action log
             return None
 
+        actions_list, errors = parse_action_list(response)
+        self.log_parse_errors(errors, response)
+        return actions_list
+
+    def prepare_action(self, action_dict):
+        """
+        Looks up the action requested in action_dict and binds its parameters, including the action set object.
+
+        Returns (action_obj, parameters, None), or (None, None, error_message) if the action can't be performed. The caller adds the error to the action log (see log_action_error()), once the entries of the actions requested before it have been added.
+        """
+        # Extract the action name and parameters from the dictionary
+        action_name = action_dict.get("function")
+        parameters = action_dict.get("arguments", {})
+
+        # Find the corresponding action object using the ActionInterface instance
+        action_obj = self.get_action(action_name)
+
+        # If the action object is not found, print a warning and skip to the next action
+        if action_obj is None:
+            return None, None, f"Warning: Unknown action: {action_name}"
+
+        if not isinstance(parameters, dict):
+            return None, None, f"Warning: The arguments for action {action_name} must be a dictionary."
+
+        if action_obj.action_set_object is not None:
+            parameters["action_set_object"] = action_obj.action_set_object
+
+        # check the arguments against the function signature up front, so the LLM gets a useful error message
+        error_message = action_obj.check_arguments(parameters)
+        if error_message is not None:
+            return None, None, f"Warning: {error_message}"
+
+        return action_obj, parameters, None
+
+    def log_action_error(self, error_message, response):
+        print(error_message)
+        self.add_to_action_log(self.format_error_message(error_message, response)) # Add the error message to the agent's action log
+
+    def perform_action(self, action_obj, parameters, response):
+        """
+        Performs a prepared action and returns the entry for the agent's action log.
+        """
         try:
-            actions_list = json.loads(actions_json_str)  # Load the action JSON string into a Python list of dictionaries
-        except json.JSONDecodeError as e:
-            error_message = f"Warning: Invalid JSON format in LLM response. Error: {e}"
+            action_output = action_obj.perform(**parameters)
+        except Exception as e:
+            error_message = f"Warning: Error performing action {action_obj.get_function_name()}. Error: {e}"
             print(error_message)
-            self.agent_action_log.append(self.format_error_message(error_message, response)) # Add the error message to the agent's action log
+            return self.format_error_message(error_message, response)
+        return self.format_action(action_obj, parameters, action_output)
+
+    async def aperform_action(self, action_obj, parameters, response):
+        """
+        Async version of perform_action().
+        """
+        try:
+            action_output = await action_obj.aperform(**parameters)
+        except Exception as e:
+            error_message = f"Warning: Error performing action {action_obj.get_function_name()}. Error: {e}"
+            print(error_message)
+            return self.format_error_message(error_message, response)
+        return self.format_action(action_obj, parameters, action_output)
+
+    def perform_action_batch(self, action_obj, parameters_list, response):
+        """
+        Performs several requests for the same action with one call of its batch_function, and returns the entries for the agent's action log, one per request, in order. A request whose output is an exception gets an error entry; if the batch_function itself raises, they all do.
+        """
+        if len(parameters_list) == 1:
+            return [self.perform_action(action_obj, parameters_list[0], response)]
+        try:
+            action_outputs = action_obj.perform_batch(parameters_list)
+            if len(action_outputs) != len(parameters_list):
+                raise ValueError(f"expected {len(parameters_list)} outputs, got {len(action_outputs)}")
+        except Exception as e:
+            error_message = f"Warning: Error performing action {action_obj.get_function_name()}. Error: {e}"
+            print(error_message)
+            return [self.format_error_message(error_message, response) for _ in parameters_list]
+        log_entries = []
+        for parameters, action_output in zip(parameters_list, action_outputs):
+            if isinstance(action_output, Exception):
+                error_message = f"Warning: Error performing action {action_obj.get_function_name()}. Error: {action_output}"
+                print(error_message)
+                log_entries.append(self.format_error_message(error_message, response))
+            else:
+                log_entries.append(self.format_action(action_obj, parameters, action_output))
+        return log_entries
+
+    def perform_requested_action(self, action_dict, response, batcher):
+        """
+        Performs the action requested in action_dict, or adds it to batcher if the action can be batched with the ones requested just before it.
+        """
+        action_obj, parameters, error_message = self.prepare_action(action_dict)
+        if error_message is not None or not batcher.continues_batch(action_dict):
+            batcher.flush()
+        if error_message is not None:
+            self.log_action_error(error_message, response)
+            return
+        if action_obj.is_batchable():
+            batcher.add(action_obj, parameters, response)
+        else:
+            # perform the action and add it to the agent's action log
+            self.add_to_action_log(self.perform_action(action_obj, parameters, response))
+
+    def parse_response_and_perform_actions(self, response):
+        """
+        Parses the LLM response and performs each requested action, in order.
+
+        Consecutive requests for an action that has a batch_function (e.g. several knowledge base searches) are performed together, with one call of it. They still get an action log entry each.
+        """
+        actions_list = self.parse_actions_list(response)
+        if actions_list is None:
             return None
 
-        # Iterate through the list of action dictionaries
+        batcher = ActionBatcher(self)
         for action_dict in actions_list:
-            # Extract the action name and parameters from the dictionary
-            action_name = action_dict.get("function")
-            parameters = action_dict.get("arguments", {})
+            self.perform_requested_action(action_dict, response, batcher)
+        batcher.flush()
 
-            # Find the corresponding action object using the ActionInterface instance
-            action_obj = self.get_action(action_name)
+    async def aparse_response_and_perform_actions(self, response):
+        """
+        Async version of parse_response_and_perform_actions().
 
-            # If the action object is not found, print a warning and skip to the next action
-            if action_obj is None:
-                error_message = f"Warning: Unknown action: {action_name}"
-                print(error_message)
-                self.agent_action_log.append(self.format_error_message(error_message, response)) # Add the error message to the agent's action log
-                continue
+        Consecutive actions that have an async implementation (e.g. edit_section, which makes its own LLM call) are run concurrently, as long as they don't conflict. Two actions conflict if they touch the same resource (e.g. the same Section) and at least one of them isn't read-only; a conflicting action waits for the current batch to finish. Actions without an async implementation act as barriers: everything before them finishes first, and they run on their own. So do batches of consecutive requests for an action that has a batch_function. Action log entries are always added in the order the actions were requested.
+        """
+        actions_list = self.parse_actions_list(response)
+        if actions_list is None:
+            return None
 
-            if action_obj.action_set_object is not None:
-                parameters["action_set_object"] = action_obj.action_set_object
+        dispatcher = AsyncActionDispatcher(self)
+        for action_dict in actions_list:
+            await dispatcher.dispatch(action_dict, response)
+        await dispatcher.finish()
 
-            # Find the corresponding action object using the ActionInterface instance
-            action_obj = self.get_action(action_name)
+    def stream_response_and_perform_actions(self, chunks, on_scratchpad_text=None):
+        """
+        Streaming version of parse_response_and_perform_actions(). chunks is an iterable of pieces of the response (see LLMClient.stream()).
 
-            # perform the action
-            try:
-                action_output = action_obj.perform(**parameters)
-            except Exception as e:
-                error_message = f"Warning: Error performing action {action_name}. Error: {e}"
-                print(error_message)
-                self.agent_action_log.append(self.format_error_message(error_message, response))
-                continue
+        Each action is performed as soon as its action dictionary is complete, while the rest of the response is still arriving (a batchable action, as soon as the next action dictionary shows it isn't followed by another request for the same action). Scratchpad text is passed to on_scratchpad_text as it arrives. Returns the full response.
 
-            # Add the action to the agent's action log
-            self.agent_action_log.append(self.format_action(action_obj, parameters, action_output))
+        Unlike parse_response_and_perform_actions(), an invalid action dictionary doesn't stop the actions requested before it from being performed, since they may already have run. If the response has no "Part 2" header, nothing is performed until the response is complete, and then it's parsed the same way as a non-streamed response.
+        """
+        parser = StreamingResponseParser()
+        batcher = ActionBatcher(self)
+        for chunk in chunks:
+            scratchpad_text, action_dicts = parser.feed(chunk)
+            if scratchpad_text and on_scratchpad_text: on_scratchpad_text(scratchpad_text)
+            for action_dict in action_dicts:
+                self.perform_requested_action(action_dict, parser.response, batcher)
+        scratchpad_text = parser.finish()
+        if scratchpad_text and on_scratchpad_text: on_scratchpad_text(scratchpad_text)
+        batcher.flush()
 
-    def format_action(self, action_obj, parameters, action_output):
+        if not parser.found_action_list:
+            self.parse_response_and_perform_actions(parser.response)
+        else:
+            self.log_parse_errors(parser.errors, parser.response)
+        return parser.response
+
+    async def astream_response_and_perform_actions(self, chunks, on_scratchpad_text=None):
+        """
+        Async version of stream_response_and_perform_actions(). chunks is an async iterable (see LLMClient.astream()). Actions are run concurrently following the same rules as aparse_response_and_perform_actions().
         """
-        Formats the action and its output into a string that can be displayed in the LLM prompt's agent action log section.
+        parser = StreamingResponseParser()
+        dispatcher = AsyncActionDispatcher(self)
+        async for chunk in chunks:
+            scratchpad_text, action_dicts = parser.feed(chunk)
+            if scratchpad_text and on_scratchpad_text: on_scratchpad_text(scratchpad_text)
+            for action_dict in action_dicts:
+                await dispatcher.dispatch(action_dict, parser.response)
+        scratchpad_text = parser.finish()
+        if scratchpad_text and on_scratchpad_text: on_scratchpad_text(scratchpad_text)
+        await dispatcher.finish()
+
+        if not parser.found_action_list:
+            await self.aparse_response_and_perform_actions(parser.response)
+        else:
+            self.log_parse_errors(parser.errors, parser.response)
+        return parser.response
 
-        # TODO: summarize the action output if it is too long
+    def log_parse_errors(self, errors, response):
+        for error_message, text in errors:
+            error_message = f"Warning: {error_message}" + (f" Action request: {text}" if text else "")
+            print(error_message)
+            self.add_to_action_log(self.format_error_message(error_message, response)) # Add the error message to the agent's action log
+
+    def format_action(self, action_obj, parameters, action_output):
+        """
+        Creates the action log record for an action and its output. Large outputs and parameter values are truncated (see ActionLog).
         """
-        # replace the task object in parameters with the task description
+        # replace the task object in parameters with the task description, and leave out the action set object, which the LLM didn't pass
+        parameters = {name: value for name, value in parameters.items() if name != "action_set_object"}
         if "task" in parameters:
             parameters["task"] = parameters["task"].description
-        
-        action_str = f"Action: {action_obj.name}\n"
-        action_str += f"Parameters: {parameters}\n"
-        action_str += f"Output: {action_output}"
-        return action_str
+
+        return self.agent_action_log.create_action_record(action_obj.name, parameters, action_output)
     
     def format_error_message(self, error_message, raw_response):
         """
-        Formats the error message into a string that can be displayed in the LLM prompt's agent action log section.
+        Creates the action log record for an error, including (a truncated copy of) the response that led to it.
         """
-        error_str = f"ERROR performing action\n{error_message}\n"
-        error_str += f"Your response that led to this error:\n`{raw_response}`"
-        return error_str
+        return self.agent_action_log.create_error_record(error_message, raw_response)
     
-    def format_agent_action_log(self):
-        """
-        Formats the agent's action log into a string that can be displayed in the LLM prompt's agent action log section.
+    def add_to_action_log(self, *entries):
+        self.agent_action_log.add(*entries)
 
-        # TODO: add a parameter to specify how many actions to display
+    def format_agent_action_log(self, num_actions_to_display: int = None):
         """
-        num_actions_to_display = 10
-        agent_action_log_str = ""
-        for action_str in self.agent_action_log[-num_actions_to_display:]:
-            agent_action_log_str += f"{action_str}\n\n"
-        return agent_action_log_str.strip()
+        Formats the most recent entries of the agent's action log (the action log's num_records_to_display by default) into a string that can be displayed in the LLM prompt's agent action log section.
+        """
+        key = (self.agent_action_log.get_version(), num_actions_to_display)
+        return self.get_cached_prompt_fragment("agent_action_log", key, lambda: self.agent_action_log.format(num_actions_to_display))
     
     def format_response(self, response):
         """
         Formats the LLM response into a string that is suitable for displaying to the user.
         """
         # extract the scratchpad from the response (everything between 'Part 1) Temporary scratchpad' and 'Part 2) Action requests')
-        scratchpad = response[response.find("Part 1) Temporary scratchpad") + len("Part 1) Temporary scratchpad"):response.find("Part 2) Action requests")].strip()
+        scratchpad = response[response.find(PART_1_HEADER) + len(PART_1_HEADER):response.find(PART_2_HEADER)].strip()
         return scratchpad
 
     
+class ActionBatcher:
+    """
+    Collects consecutive requests for the same action, if it has a batch_function (see Action), so they can be performed with one call of it. flush() performs them and adds their action log entries.
+    """
+    def __init__(self, action_interface):
+        self.action_interface = action_interface
+        self.action_obj = None
+        self.parameters_list = []
+        self.response = None
+
+    def continues_batch(self, action_dict):
+        # True if the requested action is the one being batched
+        return self.action_obj is not None and self.action_interface.get_action(action_dict.get("function")) is self.action_obj
+
+    def add(self, action_obj, parameters, response):
+        if action_obj is not self.action_obj:
+            self.flush()
+            self.action_obj = action_obj
+        self.parameters_list.append(parameters)
+        self.response = response
+
+    def flush(self):
+        if self.action_obj is None:
+            return
+        log_entries = self.action_interface.perform_action_batch(self.action_obj, self.parameters_list, self.response)
+        self.action_obj = None
+        self.parameters_list = []
+        self.action_interface.add_to_action_log(*log_entries)
+
+
+class AsyncActionDispatcher:
+    """
+    Starts actions as they're requested, running non-conflicting async actions concurrently (see ActionInterface.aparse_response_and_perform_actions()). Call finish() once every action has been dispatched.
+    """
+    def __init__(self, action_interface):
+        self.action_interface = action_interface
+        self.running = [] # list of (task, action_obj, resource), in the order the actions were requested
+        self.batcher = ActionBatcher(action_interface)
+
+    async def dispatch(self, action_dict, response):
+        action_obj, parameters, error_message = self.action_interface.prepare_action(action_dict)
+        if error_message is not None:
+            # logged after the entries of the actions requested before it
+            await self.finish()
+            self.action_interface.log_action_error(error_message, response)
+            return
+        if not self.batcher.continues_batch(action_dict):
+            self.batcher.flush()
+
+        if action_obj.is_batchable():
+            # a batch runs on its own, after everything requested before it
+            if self.batcher.action_obj is None:
+                await self.finish()
+            self.batcher.add(action_obj, parameters, response)
+            return
+
+        resource = action_obj.get_resource(parameters) if action_obj.is_concurrent() else None
+        if resource is None:
+            # run on its own, after everything requested before it
+            await self.finish()
+            self.action_interface.add_to_action_log(await self.action_interface.aperform_action(action_obj, parameters, response))
+            return
+
+        if any(resource is other_resource and not (action_obj.read_only and other_action.read_only) for _, other_action, other_resource in self.running):
+            await self.finish()
+        task = asyncio.ensure_future(self.action_interface.aperform_action(action_obj, parameters, response))
+        self.running.append((task, action_obj, resource))
+
+    async def finish(self):
+        """
+        Waits for every running action, and adds their log entries in the order they were requested, then performs the pending batch, if any.
+        """
+        if self.running:
+            log_entries = await asyncio.gather(*[task for task, _, _ in self.running])
+            self.action_interface.add_to_action_log(*log_entries)
+            self.running = []
+        self.batcher.flush()
+
+
 # create list of Action objects from a list of ActionSet objects
 def get_action_list(action_sets):
     action_list = []
@@ -0,0 +1,138 @@
+"""
+The agent's action log: a record of the actions it performed (and the errors it ran into), shown to it in the prompt.
+
+Only the most recent entries are ever shown, so the log is bounded:
+- records are kept in a ring buffer of max_records; older records are dropped, or appended to a JSONL archive file if archive_path is set
+- large action outputs, parameters and raw LLM responses are truncated when the record is created, keeping the start and end of the text
+- records are stored as structured data and only formatted as strings when the log is shown in the prompt
+"""
+
+import json
+from collections import deque
+
+from agent.checkpoint import Journaled
+
+
+def truncate_text(text, max_chars):
+    """
+    Cuts text down to about max_chars characters, keeping the start and end, with a note saying how much was omitted.
+    """
+    if max_chars is None or len(text) <= max_chars:
+        return text
+    num_head_chars = max_chars * 2 // 3
+    num_tail_chars = max_chars - num_head_chars
+    return f"{text[:num_head_chars]}\n... [{len(text) - max_chars} characters omitted] ...\n{text[-num_tail_chars:] if num_tail_chars else ''}"
+
+
+class ActionLogRecord:
+    """
+    One entry in the action log: either an action that was performed ("action") or an error ("error").
+    """
+    __slots__ = ("kind", "action_name", "parameters", "output", "error_message", "response")
+
+    def __init__(self, kind, action_name=None, parameters=None, output=None, error_message=None, response=None):
+        self.kind = kind
+        self.action_name = action_name # the action's name, with its arguments, e.g. "add_section(index, title='', summary='')"
+        self.parameters = parameters # dict of the parameters the LLM passed
+        self.output = output # string
+        self.error_message = error_message
+        self.response = response # the LLM response that led to an error
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name in self.__slots__:
+            setattr(self, name, state.get(name))
+
+    def to_dict(self):
+        return self.__getstate__()
+
+    @classmethod
+    def from_dict(cls, record_dict):
+        record = cls.__new__(cls)
+        record.__setstate__(record_dict)
+        return record
+
+    def format(self):
+        """
+        Formats the record into a string that can be displayed in the LLM prompt's agent action log section.
+        """
+        if self.kind == "error":
+            error_str = f"ERROR performing action\n{self.error_message}\n"
+            error_str += f"Your response that led to this error:\n`{self.response}`"
+            return error_str
+        action_str = f"Action: {self.action_name}\n"
+        action_str += f"Parameters: {self.parameters}\n"
+        action_str += f"Output: {self.output}"
+        return action_str
+
+    def __str__(self):
+        return self.format()
+
+
+class ActionLog(Journaled):
+    """
+    Bounded log of ActionLogRecords. See the module docstring.
+    - max_records: number of records kept in memory (and in checkpoints)
+    - num_records_to_display: number of records shown in the prompt
+    - max_output_chars: action outputs and parameter values longer than this are truncated
+    - max_response_chars: raw LLM responses saved with errors are truncated to this length
+    - archive_path: if set, records that are dropped from the ring buffer are appended to this JSONL file
+    """
+    def __init__(self, max_records: int = 100, num_records_to_display: int = 10, max_output_chars: int = 2000, max_response_chars: int = 1000, archive_path: str = None):
+        self.records = deque(maxlen=max_records)
+        self.num_records_to_display = num_records_to_display
+        self.max_output_chars = max_output_chars
+        self.max_response_chars = max_response_chars
+        self.archive_path = archive_path
+
+    @classmethod
+    def from_entries(cls, entries, **kwargs):
+        """
+        Creates an ActionLog from a list of preformatted strings, as saved by versions of ActionInterface before ActionLog existed.
+        """
+        action_log = cls(**kwargs)
+        action_log.records.extend(entries[-action_log.records.maxlen:])
+        return action_log
+
+    def create_action_record(self, action_name, parameters, output):
+        parameters = {name: truncate_text(value, self.max_output_chars) if isinstance(value, str) else value for name, value in parameters.items()}
+        return ActionLogRecord("action", action_name=action_name, parameters=parameters, output=truncate_text(str(output), self.max_output_chars))
+
+    def create_error_record(self, error_message, response):
+        return ActionLogRecord("error", error_message=error_message, response=truncate_text(str(response), self.max_response_chars))
+
+    def add(self, *records):
+        evicted_records = []
+        for record in records:
+            if len(self.records) == self.records.maxlen:
+                evicted_records.append(self.records[0])
+            self.records.append(record)
+        if evicted_records and self.archive_path:
+            self.archive(evicted_records)
+        self.mark_changed()
+
+    def archive(self, records):
+        with open(self.archive_path, "a") as f:
+            for record in records:
+                record_dict = record.to_dict() if isinstance(record, ActionLogRecord) else {"kind": "text", "output": record}
+                f.write(json.dumps(record_dict, default=str) + "\n")
+
+    def format(self, num_records: int = None):
+        """
+        Formats the most recent records (num_records_to_display by default) for the prompt.
+        """
+        if num_records is None:
+            num_records = self.num_records_to_display
+        start = max(0, len(self.records) - num_records)
+        return "\n\n".join(str(self.records[i]) for i in range(start, len(self.records))).strip()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def __iter__(self):
+        return iter(self.records)
@@ -1,73 +1,245 @@
-import pickle
 import os
 import sys
 
 # add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually. It's in ../../task_tree_agent
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
 
-from agent.utils import openai_api_call
-from agent.prompt import prompt_template
+from agent.checkpoint import Checkpointer, Journaled
+from agent.executor import run_blocking
+from agent.guidance import ConsoleGuidanceSource
+from agent.llm_client import get_default_llm_client
+from agent.prompt import PROMPT_TEMPLATES
+from agent.prompt_builder import PrefixTracker, PromptBuilder, PromptSection
 
 from action_sets.task_tree.task_class import Task
 from agent.action_interface import ActionInterface, RESPONSE_FORMATTING_INSTRUCTIONS
 
-class Agent:
-    def __init__(self, task_description, action_sets, constitution="", save_path="agent.pkl"):
+MAX_RESPONSE_TOKENS = 1000
+
+class Agent(Journaled):
+    # _checkpointer holds file positions for this process only, last_prompt_usage and prompt_prefix_tracker are just for reporting, guidance_source holds threads and sockets, and _scheduler_llm_client is only set while an AgentScheduler is running the agent
+    _derived_attributes = ("_checkpointer", "last_prompt_usage", "prompt_prefix_tracker", "guidance_source", "_scheduler_llm_client")
+
+    def __init__(self, task_description, action_sets, constitution="", save_path="agent.pkl", llm_client=None, max_prompt_tokens=None, action_log=None, use_response_cache=False, prompt_layout="default", guidance_source=None):
         self.task_tree = Task(description=task_description)
-        self.action_interface = ActionInterface(action_sets)
+        self.action_interface = ActionInterface(action_sets, action_log=action_log) # action_log: an ActionLog, to configure how much of the log is kept and shown (see agent/action_log.py)
         self.save_path = save_path
         self.human_input_list = []
         self.constitution = constitution
+        self.llm_client = llm_client # if None, the default LLMClient is used
+        self.max_prompt_tokens = max_prompt_tokens # if None, the model's context window minus the tokens reserved for the response
+        if prompt_layout not in PROMPT_TEMPLATES:
+            raise ValueError(f"Unknown prompt layout {prompt_layout!r}. Choose from: {', '.join(PROMPT_TEMPLATES)}")
+        self.prompt_layout = prompt_layout # "stable_prefix" orders the prompt from most to least stable, so the backend's prompt caching can reuse more of it (see agent/prompt.py)
+        self.use_response_cache = use_response_cache # if True, non-streamed responses may be answered from the LLM client's cache (see agent/response_cache.py), e.g. to replay a run
+        self.set_guidance_source(guidance_source)
+
+    @classmethod
+    def load(cls, save_path):
+        """
+        Loads an agent saved with save() (or pickled whole by older versions) and resumes checkpointing to the same files.
+        """
+        checkpointer = Checkpointer(save_path)
+        agent = checkpointer.load()
+        object.__setattr__(agent, "_checkpointer", checkpointer)
+        return agent
+
+    def save(self):
+        """
+        Checkpoints the agent to self.save_path. Only the parts of the agent that changed since the last save are written (see agent/checkpoint.py).
+        """
+        if getattr(self, "_checkpointer", None) is None or self._checkpointer.save_path != self.save_path:
+            object.__setattr__(self, "_checkpointer", Checkpointer(self.save_path))
+        self._checkpointer.checkpoint(self)
+
+    def get_llm_client(self):
+        # agents pickled before llm_client existed won't have the attribute
+        return getattr(self, "_scheduler_llm_client", None) or getattr(self, "llm_client", None) or get_default_llm_client()
+
+    def set_guidance_source(self, guidance_source):
+        """
+        Sets where run() and arun() get human guidance from (see agent/guidance.py). If None, guidance is read from the console without blocking. Use NoGuidanceSource() for unattended runs.
+        """
+        object.__setattr__(self, "guidance_source", guidance_source)
+
+    def get_guidance_source(self):
+        if getattr(self, "guidance_source", None) is None:
+            object.__setattr__(self, "guidance_source", ConsoleGuidanceSource())
+        return self.guidance_source
+
+    def poll_guidance(self):
+        """
+        Returns the human guidance that has arrived since the last call, one message per line ("" if there is none). Never waits for a human.
+        """
+        return "\n".join(message.strip() for message in self.get_guidance_source().poll() if message.strip())
+
+    def call_llm(self, prompt, model_name):
+        if getattr(self, "use_response_cache", False):
+            return self.get_llm_client().complete_cached(prompt, model_name=model_name, temperature=0.2, max_tokens=MAX_RESPONSE_TOKENS)
+        return self.get_llm_client().complete(prompt, model_name=model_name, temperature=0.2, max_tokens=MAX_RESPONSE_TOKENS)
+
+    async def acall_llm(self, prompt, model_name):
+        if getattr(self, "use_response_cache", False):
+            return await self.get_llm_client().acomplete_cached(prompt, model_name=model_name, temperature=0.2, max_tokens=MAX_RESPONSE_TOKENS)
+        return await self.get_llm_client().acomplete(prompt, model_name=model_name, temperature=0.2, max_tokens=MAX_RESPONSE_TOKENS)
 
     def format_human_input_list(self, max_messages=10):
         return "\n".join([" - " + message for message in self.human_input_list[-max_messages:]])
 
-    def run(self, max_iterations=10, model_name="gpt-4", verbose=False):
+    def start_iteration(self):
+        """
+        Finds the next task and points the task tree management action set at it. Returns None if there are no more tasks.
+        """
+        current_task = self.task_tree.find_next_task() # get the next task
+        self.action_interface.update_action_set_object("task_tree_management_action_set", current_task) # update the task tree used in the action interface to the current task
+        return current_task
+
+    def build_prompt(self, current_task, human_input, model_name="gpt-4"):
+        """
+        Builds the prompt for the current iteration, truncating the least important sections if it wouldn't fit in the model's context window. The token usage of each section, and the length of the prefix shared with the previous prompt, are saved in self.last_prompt_usage.
+        """
+        if not human_input:
+            human_input_for_prompt = "None"
+        else:
+            human_input_for_prompt = human_input
+
+        # sections with lower priorities are truncated first
+        sections = [
+            PromptSection("local_task_tree", current_task.get_local_task_tree(), priority=4, min_tokens=200),
+            PromptSection("constitution", self.constitution, required=True),
+            PromptSection("agent_action_log", self.action_interface.format_agent_action_log(), priority=1, keep="end", min_tokens=1000),
+            PromptSection("action_set_prompt_context", self.action_interface.get_action_set_prompt_context(), priority=2, min_tokens=500),
+            PromptSection("human_input_list", self.format_human_input_list(), priority=3, keep="end"),
+            PromptSection("current_human_input", human_input_for_prompt, required=True),
+            PromptSection("available_actions", self.action_interface.get_available_actions_for_prompt(), required=True),
+            PromptSection("response_formatting_instructions", RESPONSE_FORMATTING_INSTRUCTIONS, required=True),
+        ]
+        prompt_builder = PromptBuilder(PROMPT_TEMPLATES[getattr(self, "prompt_layout", "default")], model_name=model_name, max_response_tokens=MAX_RESPONSE_TOKENS, max_prompt_tokens=getattr(self, "max_prompt_tokens", None))
+        prompt, usage = prompt_builder.build(sections)
+        if getattr(self, "prompt_prefix_tracker", None) is None:
+            object.__setattr__(self, "prompt_prefix_tracker", PrefixTracker())
+        self.prompt_prefix_tracker.record_usage("agent", prompt, usage, prompt_builder.token_counter)
+        object.__setattr__(self, "last_prompt_usage", usage)
+        return prompt
+
+    def finish_iteration(self, human_input, verbose=False):
+        # print the task tree after each iteration
+        if verbose: self.task_tree.print_tree()
+
+        # we want to save the human input for later
+        if human_input:
+            self.human_input_list.append(human_input.strip())
+            self.mark_changed()
+
+        # save the Agent object after each iteration
+        self.save()
+
+    def run(self, max_iterations=10, model_name="gpt-4", verbose=False, stream=False):
+        """
+        Runs the agent loop. Human guidance is picked up from the guidance source at the start of each iteration, without waiting for it (see set_guidance_source()).
+        - stream: stream the LLM response, printing the agent's thoughts as they arrive and performing each action as soon as it's been requested, instead of waiting for the whole response
+        """
         for _ in range(max_iterations):
-            current_task = self.task_tree.find_next_task() # get the next task
-            self.action_interface.update_action_set_object("task_tree_management_action_set", current_task) # update the task tree used in the action interface to the current task
+            current_task = self.start_iteration()
             if not current_task:
                 print("There are no more tasks to complete.")
                 break
 
-            # ask for human input
-            human_input = input("Do you have any guidance for me? Press enter to skip.\n\nUSER INPUT: ")
-            if not human_input:
-                human_input_for_prompt = "None"
-            else:
-                human_input_for_prompt = human_input
+            # pick up any human input that's arrived
+            human_input = self.poll_guidance()
+            if human_input: print(f"USER INPUT: {human_input}\n")
 
             # construct the prompt
-            prompt = prompt_template.format(
-                local_task_tree=current_task.get_local_task_tree(),
-                constitution=self.constitution,
-                agent_action_log=self.action_interface.format_agent_action_log(),
-                action_set_prompt_context=self.action_interface.get_action_set_prompt_context(),
-                human_input_list=self.format_human_input_list(),
-                current_human_input=human_input_for_prompt,
-                available_actions=self.action_interface.get_available_actions_for_prompt(),
-                response_formatting_instructions=RESPONSE_FORMATTING_INSTRUCTIONS,
-            )
-
-            if verbose: print(f"Prompt sent to LLM:\n{prompt}\n")
+            prompt = self.build_prompt(current_task, human_input, model_name=model_name)
+            if verbose: print(f"Prompt sent to LLM:\n{prompt}\n\n{self.last_prompt_usage.format()}\n")
 
+            if stream:
+                # call the LLM, performing the requested actions as they arrive
+                chunks = self.get_llm_client().stream(prompt, model_name=model_name, temperature=0.2, max_tokens=MAX_RESPONSE_TOKENS)
+                response = self.action_interface.stream_response_and_perform_actions(chunks, on_scratchpad_text=ThoughtsPrinter())
+                print("\n")
+                if verbose: print(f"Raw response from LLM:\n{response}\n")
+            else:
+                # call the LLM
+                response = self.call_llm(prompt, model_name)
+                if verbose: print(f"Raw response from LLM:\n{response}\n")
+                    
+                formatted_response = self.action_interface.format_response(response)
+                print(f"\nAGENT THOUGHTS: {formatted_response}\n")
+                
+                # parse the response and perform the requested actions
+                self.action_interface.parse_response_and_perform_actions(response)  
+
+            self.finish_iteration(human_input, verbose)
+
+    async def arun(self, max_iterations=10, model_name="gpt-4", verbose=False, stream=False):
+        """
+        Async version of run(). The LLM call doesn't block the event loop, and independent actions from a single response (e.g. several edit_section calls on different sections) are performed concurrently.
+        """
+        for _ in range(max_iterations):
+            current_task = self.start_iteration()
+            if not current_task:
+                print("There are no more tasks to complete.")
+                break
+
+            # pick up any human input that's arrived
+            human_input = self.poll_guidance()
+            if human_input: print(f"USER INPUT: {human_input}\n")
+
+            await self.astep(model_name=model_name, human_input=human_input, verbose=verbose, stream=stream, current_task=current_task)
+
+    async def astep(self, model_name="gpt-4", human_input="", verbose=False, show_thoughts=True, stream=False, current_task=None):
+        """
+        Runs a single iteration of the agent loop, with the given human input (the guidance source isn't polled). Returns False if there are no more tasks to complete.
+        - current_task: the task returned by start_iteration(), if it's already been called for this iteration. Otherwise the next task is found here
+        """
+        if current_task is None:
+            current_task = self.start_iteration()
+        if not current_task:
+            return False
+
+        # construct the prompt
+        prompt = self.build_prompt(current_task, human_input, model_name=model_name)
+        if verbose: print(f"Prompt sent to LLM:\n{prompt}\n\n{self.last_prompt_usage.format()}\n")
+
+        if stream:
+            # call the LLM, performing the requested actions as they arrive
+            chunks = self.get_llm_client().astream(prompt, model_name=model_name, temperature=0.2, max_tokens=MAX_RESPONSE_TOKENS)
+            response = await self.action_interface.astream_response_and_perform_actions(chunks, on_scratchpad_text=ThoughtsPrinter() if show_thoughts else None)
+            if show_thoughts: print("\n")
+            if verbose: print(f"Raw response from LLM:\n{response}\n")
+        else:
             # call the LLM
-            response = openai_api_call(prompt, model_name=model_name, temperature=0.2, max_tokens=1000)
+            response = await self.acall_llm(prompt, model_name)
             if verbose: print(f"Raw response from LLM:\n{response}\n")
-                
+
             formatted_response = self.action_interface.format_response(response)
-            print(f"\nAGENT THOUGHTS: {formatted_response}\n")
-            
+            if show_thoughts: print(f"\nAGENT THOUGHTS: {formatted_response}\n")
+
             # parse the response and perform the requested actions
-            self.action_interface.parse_response_and_perform_actions(response)  
+            await self.action_interface.aparse_response_and_perform_actions(response)
+
+        # saving pickles and fsyncs the checkpoint, so it's done in a worker thread to let other agents on the event loop keep running
+        await run_blocking(self.finish_iteration, human_input, verbose)
+        return True
 
-            # print the task tree after each iteration
-            if verbose: self.task_tree.print_tree()
 
-            # we want to save the human input for later
-            if human_input:
-                self.human_input_list.append(human_input.strip())
+class ThoughtsPrinter:
+    """
+    Prints the agent's scratchpad as it's streamed in (see ActionInterface.stream_response_and_perform_actions()).
+    """
+    def __init__(self):
+        self.started = False
+        self.pending_whitespace = "" # trailing whitespace is only printed if more text follows it
 
-            # save the Agent object after each iteration
-            with open(self.save_path, "wb") as f:
-                pickle.dump(self, f)
\ No newline at end of file
+    def __call__(self, text):
+        if not self.started:
+            text = text.lstrip()
+            if not text:
+                return
+            print("\nAGENT THOUGHTS: ", end="")
+            self.started = True
+        text = self.pending_whitespace + text
+        stripped_text = text.rstrip()
+        self.pending_whitespace = text[len(stripped_text):]
+        print(stripped_text, end="", flush=True)
@@ -0,0 +1,285 @@
+"""
+Incremental checkpointing for agents.
+
+Instead of re-pickling the whole Agent after every iteration, the Checkpointer appends only the objects that changed since the last checkpoint to an append-only journal file, and periodically compacts everything into a snapshot.
+
+How it works:
+- The objects that make up an agent's state (Agent, ActionInterface, ActionSet, Action, Task, Document, Section, Element) subclass Journaled. Each one has a stable uid and a version counter that's bumped whenever one of its attributes is assigned. Code that mutates a list or dict attribute in place calls mark_changed().
+- Each Journaled object is saved as its own record. References to other Journaled objects are saved as uids (using pickle's persistent_id mechanism), so a record only contains that object's own state. Editing one element of a 100k word document writes one small record.
+- Every checkpoint ends with a commit record. When loading, a checkpoint whose commit record is missing (e.g. because we crashed mid-write) is ignored.
+- Snapshots are written to a temporary file and then atomically renamed over the old one, so there's always a complete copy on disk. The journal is emptied after each snapshot.
+
+Files:
+- save_path: the latest snapshot (or, for agents saved before this module existed, a plain pickle of the Agent, which load_checkpoint() still reads)
+- save_path + ".journal": checkpoints made since the latest snapshot
+"""
+
+import io
+import os
+import pickle
+import uuid
+from collections import deque
+from functools import lru_cache
+
+CHECKPOINT_FORMAT = "task_tree_agent_checkpoint_v1"
+
+
+_MISSING = object()
+
+
+@lru_cache(maxsize=None)
+def get_state_slot_names(cls):
+    """
+    Returns the names of the __slots__ defined by cls and its base classes that are part of its saved state.
+    """
+    excluded_names = ("__dict__", "__weakref__") + Journaled.__slots__ + tuple(cls._derived_attributes)
+    slot_names = []
+    for klass in cls.__mro__:
+        slots = klass.__dict__.get("__slots__", ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        for name in slots:
+            if name not in excluded_names and name not in slot_names:
+                slot_names.append(name)
+    return tuple(slot_names)
+
+
+class Journaled:
+    """
+    Base class for objects whose state is checkpointed incrementally. See the module docstring.
+
+    Subclasses can list attributes in _derived_attributes that can be recomputed from the rest of the state (e.g. indexes and caches). These aren't saved, and should be assigned with object.__setattr__ so they don't count as changes.
+    """
+    __slots__ = ("_uid", "_version")
+    _derived_attributes = ()
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name not in Journaled.__slots__:
+            self.mark_changed()
+
+    def mark_changed(self):
+        object.__setattr__(self, "_version", self.get_version() + 1)
+
+    def get_version(self):
+        return getattr(self, "_version", 0)
+
+    def get_uid(self):
+        uid = getattr(self, "_uid", None)
+        if uid is None:
+            uid = uuid.uuid4().hex
+            object.__setattr__(self, "_uid", uid)
+        return uid
+
+    def __getstate__(self):
+        # the uid and version aren't part of the state, so copies of an object get their own uid
+        state = {}
+        for name in get_state_slot_names(type(self)):
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING:
+                state[name] = value
+        if hasattr(self, "__dict__"):
+            state.update(self.__dict__)
+            for name in self._derived_attributes:
+                state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+
+def get_journaled_objects(root):
+    """
+    Returns every Journaled object reachable from root, following references through other Journaled objects and through lists, tuples, deques, sets and dicts.
+    """
+    journaled_objects = []
+    seen = set()
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, (str, bytes, int, float, bool)) or obj is None or id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, Journaled):
+            journaled_objects.append(obj)
+            stack.extend(obj.__getstate__().values())
+        elif isinstance(obj, (list, tuple, deque, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.values())
+    return journaled_objects
+
+
+class _RecordPickler(pickle.Pickler):
+    # saves references to Journaled objects as their uids
+    def persistent_id(self, obj):
+        if isinstance(obj, Journaled):
+            return obj.get_uid()
+        return None
+
+
+class _RecordUnpickler(pickle.Unpickler):
+    def __init__(self, file, objects):
+        super().__init__(file)
+        self.objects = objects
+
+    def persistent_load(self, uid):
+        return self.objects[uid]
+
+
+def serialize_state(obj):
+    buffer = io.BytesIO()
+    _RecordPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(obj.__getstate__())
+    return buffer.getvalue()
+
+
+def materialize(records, root_uid):
+    """
+    Rebuilds the object graph from a dict of uid -> (class, serialized state). Returns the root object.
+    """
+    # create every object first, so references can be resolved in any order (the graph has cycles, e.g. Task.parent)
+    objects = {}
+    for uid, (cls, _) in records.items():
+        obj = cls.__new__(cls)
+        object.__setattr__(obj, "_uid", uid)
+        objects[uid] = obj
+
+    for uid, (_, state_bytes) in records.items():
+        state = _RecordUnpickler(io.BytesIO(state_bytes), objects).load()
+        objects[uid].__setstate__(state)
+
+    return objects[root_uid]
+
+
+class Checkpointer:
+    """
+    Saves an object graph (usually an Agent) to save_path incrementally. See the module docstring for the file format.
+    - snapshot_every: compact the journal into a new snapshot after this many checkpoints
+    """
+    def __init__(self, save_path, snapshot_every: int = 100):
+        self.save_path = save_path
+        self.journal_path = save_path + ".journal"
+        self.snapshot_every = snapshot_every
+        self.written_versions = {} # uid -> version of the object as of the last record we wrote (or loaded) for it
+        self.seq = 0 # sequence number of the last checkpoint
+        self.snapshot_seq = None # sequence number of the current snapshot; None if we haven't written or loaded one
+        self.checkpoints_since_snapshot = 0
+        self.snapshot_size = 0
+        self.journal_size = 0
+
+    def checkpoint(self, root):
+        """
+        Saves everything that changed since the last checkpoint. Returns the number of object records written.
+        """
+        if self.snapshot_seq is None or self.checkpoints_since_snapshot >= self.snapshot_every or self.journal_size > self.snapshot_size:
+            return self.snapshot(root)
+
+        changed_objects = [obj for obj in get_journaled_objects(root) if self.written_versions.get(obj.get_uid()) != obj.get_version()]
+        self.seq += 1
+        with open(self.journal_path, "ab") as f:
+            for obj in changed_objects:
+                pickle.dump(("object", obj.get_uid(), type(obj), serialize_state(obj)), f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(("commit", self.seq, root.get_uid()), f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+            self.journal_size = f.tell()
+
+        for obj in changed_objects:
+            self.written_versions[obj.get_uid()] = obj.get_version()
+        self.checkpoints_since_snapshot += 1
+        return len(changed_objects)
+
+    def snapshot(self, root):
+        """
+        Writes every object reachable from root to a new snapshot, then empties the journal.
+        """
+        journaled_objects = get_journaled_objects(root)
+        self.seq += 1
+
+        temp_path = self.save_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump({"format": CHECKPOINT_FORMAT, "seq": self.seq, "root": root.get_uid()}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            for obj in journaled_objects:
+                pickle.dump(("object", obj.get_uid(), type(obj), serialize_state(obj)), f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(("commit", self.seq, root.get_uid()), f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+            self.snapshot_size = f.tell()
+        os.replace(temp_path, self.save_path)
+
+        # the journal only holds checkpoints older than the new snapshot now, which are skipped when loading, so it's safe to empty it
+        with open(self.journal_path, "wb"):
+            pass
+        self.journal_size = 0
+
+        self.written_versions = {obj.get_uid(): obj.get_version() for obj in journaled_objects}
+        self.snapshot_seq = self.seq
+        self.checkpoints_since_snapshot = 0
+        return len(journaled_objects)
+
+    def load(self, read_only=False):
+        """
+        Loads the latest checkpoint from save_path and its journal, and returns the root object. Later checkpoints made with this Checkpointer continue from there.
+        - read_only: don't drop a half-written checkpoint from the end of the journal (e.g. when reading the files of an agent that's still running)
+        """
+        with open(self.save_path, "rb") as f:
+            header = pickle.load(f)
+            if not (isinstance(header, dict) and header.get("format") == CHECKPOINT_FORMAT):
+                # saved before incremental checkpointing existed; the file is just a pickle of the whole object
+                return header
+
+            records = {}
+            read_records(f, records, min_seq=0)
+            self.snapshot_size = f.tell()
+
+        self.seq = header["seq"]
+        self.snapshot_seq = header["seq"]
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb" if read_only else "rb+") as f:
+                last_seq, end_of_last_commit = read_records(f, records, min_seq=header["seq"] + 1)
+                self.seq = max(self.seq, last_seq)
+                if not read_only:
+                    # drop anything after the last complete checkpoint (e.g. a half-written one), so new checkpoints are appended right after it
+                    f.truncate(end_of_last_commit)
+                self.journal_size = end_of_last_commit
+
+        root = materialize(records, header["root"])
+        self.written_versions = {uid: 0 for uid in records} # freshly loaded objects are at version 0
+        return root
+
+
+def read_records(f, records, min_seq):
+    """
+    Reads records from f into records (uid -> (class, serialized state)), applying each checkpoint once its commit record is read, as long as its sequence number is at least min_seq. Stops at the end of the file or at a truncated or corrupt record.
+
+    Returns the sequence number of the last checkpoint applied, and the file offset just past the last commit record.
+    """
+    last_seq = 0
+    end_of_last_commit = f.tell()
+    pending = {}
+    while True:
+        try:
+            record = pickle.load(f)
+        except Exception:
+            # a partially written record can fail to unpickle in all sorts of ways
+            break
+
+        if record[0] == "object":
+            _, uid, cls, state_bytes = record
+            pending[uid] = (cls, state_bytes)
+        elif record[0] == "commit":
+            seq = record[1]
+            if seq >= min_seq:
+                records.update(pending)
+                last_seq = seq
+            pending = {}
+            end_of_last_commit = f.tell()
+    return last_seq, end_of_last_commit
+
+
+def load_checkpoint(save_path, read_only=False):
+    """
+    Loads an object saved with a Checkpointer (or pickled whole, the old way) from save_path.
+    """
+    return Checkpointer(save_path).load(read_only=read_only)
@@ -0,0 +1,33 @@
+"""
+Where async code runs blocking work, like sync LLM calls and checkpoint writes, so it doesn't block the event loop.
+
+By default that's the event loop's default executor. AgentScheduler runs its agents inside use_executor() with a thread pool of its own, so the blocking work of every agent it runs shares one pool of a known size, and the default executor of the caller's event loop is left alone.
+"""
+
+import asyncio
+import contextvars
+import functools
+from contextlib import contextmanager
+
+_current_executor = contextvars.ContextVar("current_executor", default=None)
+
+
+@contextmanager
+def use_executor(executor):
+    """
+    Runs the blocking work of the async code in this block (and of the tasks it starts) in the given executor.
+    """
+    token = _current_executor.set(executor)
+    try:
+        yield executor
+    finally:
+        _current_executor.reset(token)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs) in the current executor (see use_executor()) and returns its result. Like asyncio.to_thread(), func sees the caller's context variables.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_current_executor.get(), functools.partial(context.run, func, *args, **kwargs))
@@ -0,0 +1,161 @@
+"""
+Sources of human guidance for a running agent.
+
+The agent loop never waits for a human. At the start of each iteration it polls its guidance source, which returns whatever messages have arrived since the last poll (usually none), and the loop carries on at full speed either way. Messages are added to the agent's human_input_list, like guidance typed at the old per-iteration prompt.
+
+- NoGuidanceSource: never has any messages, for unattended and batch runs
+- QueueGuidanceSource: messages are put on a queue, e.g. by another thread or a UI
+- FileGuidanceSource: each line appended to a text file is a message
+- SocketGuidanceSource: each line sent to a local TCP port is a message (e.g. `echo "focus on chapter 2" | nc localhost 8765`)
+- ConsoleGuidanceSource: each line typed at the console is a message, read by a background thread. This is the default for Agent.run()
+
+Guidance sources hold threads, files and sockets, so they aren't saved with the agent. Set one again after loading an agent.
+"""
+
+import os
+import queue
+import socketserver
+import sys
+import threading
+
+
+class GuidanceSource:
+    """
+    Base class for guidance sources. Subclasses must implement poll(), which must never block.
+    """
+    def poll(self):
+        """
+        Returns the list of messages that have arrived since the last call.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class NoGuidanceSource(GuidanceSource):
+    def poll(self):
+        return []
+
+
+class QueueGuidanceSource(GuidanceSource):
+    """
+    Messages are added with put(), from any thread. A queue.Queue can be passed in to share it with other code.
+    """
+    def __init__(self, message_queue: queue.Queue = None):
+        self.queue = message_queue if message_queue is not None else queue.Queue()
+
+    def put(self, message: str):
+        self.queue.put(message)
+
+    def poll(self):
+        messages = []
+        while True:
+            try:
+                messages.append(self.queue.get_nowait())
+            except queue.Empty:
+                return messages
+
+
+class FileGuidanceSource(GuidanceSource):
+    """
+    Watches a text file; each line appended to it is a message. A line isn't read until its newline has been written.
+    - read_existing: also return the lines already in the file when the source is created (by default only new lines are returned)
+    """
+    def __init__(self, path: str, read_existing: bool = False):
+        self.path = path
+        self.position = 0
+        self.pending_bytes = b"" # the start of a line whose newline hasn't been written yet. It's kept undecoded, since it can end partway through a multi-byte character
+        if not read_existing and os.path.exists(path):
+            self.position = os.path.getsize(path)
+
+    def poll(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return [] # the file hasn't been created yet
+        if size < self.position:
+            # the file was truncated or replaced, so start again from the top
+            self.position = 0
+            self.pending_bytes = b""
+        if size == self.position:
+            return []
+
+        with open(self.path, "rb") as f:
+            f.seek(self.position)
+            data = self.pending_bytes + f.read()
+            self.position = f.tell()
+        lines = data.split(b"\n")
+        self.pending_bytes = lines.pop()
+        messages = [line.decode("utf-8", errors="replace").rstrip("\r") for line in lines]
+        return [message for message in messages if message.strip()]
+
+
+class _BackgroundGuidanceSource(GuidanceSource):
+    # messages are collected by a background thread and handed over through a queue
+    def __init__(self):
+        self.messages = queue.Queue()
+
+    def poll(self):
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+
+class _GuidanceRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            message = line.decode("utf-8", errors="replace").strip()
+            if message:
+                self.server.messages.put(message)
+
+
+class _GuidanceServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SocketGuidanceSource(_BackgroundGuidanceSource):
+    """
+    Listens on a local TCP port; each line a client sends is a message. port=0 picks a free port, which can be read from self.address.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765):
+        super().__init__()
+        self.server = _GuidanceServer((host, port), _GuidanceRequestHandler)
+        self.server.messages = self.messages
+        self.address = self.server.server_address
+        self.thread = threading.Thread(target=self.server.serve_forever, name="guidance-server", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ConsoleGuidanceSource(_BackgroundGuidanceSource):
+    """
+    Reads lines typed at the console on a background thread, so the agent doesn't stop to wait for them. The thread is started by the first poll().
+    """
+    def __init__(self, stream=None):
+        super().__init__()
+        self.stream = stream # defaults to sys.stdin
+        self.thread = None
+
+    def start(self):
+        print("You can type guidance for the agent at any time. Press enter to send it; it will be seen at the start of the next iteration.\n")
+        self.thread = threading.Thread(target=self.read_lines, name="guidance-console", daemon=True)
+        self.thread.start()
+
+    def read_lines(self):
+        stream = self.stream or sys.stdin
+        for line in stream:
+            if line.strip():
+                self.messages.put(line.strip())
+
+    def poll(self):
+        if self.thread is None:
+            self.start()
+        return super().poll()
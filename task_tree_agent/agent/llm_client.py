@@ -0,0 +1,477 @@
+"""
+LLM backends used by the agent and by action sets that make their own LLM calls (e.g. the SDF Document).
+
+Everything that talks to an LLM goes through an LLMClient, so the backend can be swapped out without touching the agent loop:
+- OpenAIClient calls the OpenAI chat completions endpoint over a pooled HTTP session, so connections are reused across calls
+- FakeLLMClient is a deterministic local stand-in that returns scripted or recorded responses, for offline runs and throughput tests
+- RecordingLLMClient wraps another client and records its responses so they can be replayed later with FakeLLMClient
+- ConcurrencyLimitedLLMClient wraps another client and caps the number of calls in flight, so many agents can share one API quota
+- CachedLLMClient (in agent/response_cache.py) wraps another client and saves responses on disk, so repeated requests don't hit the API
+
+Every client can also stream a response (stream() and astream()), yielding the text as it's generated. Clients that can't stream yield the whole response as a single chunk.
+
+Call sites whose requests are deterministic enough to be worth caching call complete_cached() instead of complete(). Clients without a cache treat it the same as complete().
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import weakref
+
+import requests
+import tenacity
+from requests.adapters import HTTPAdapter
+
+from agent.executor import run_blocking
+
+SYSTEM_INSTRUCTIONS = """You are a brilliant AGI assistant whose goal is to achieve whatever task is given to you, to the best of your abilities. You are just a computer program, and you don’t have a body, so the only way you can interact with the world is by responding to this prompt with a sequence of action requests. The set of actions you have at your disposal, as well as the exact format for these action requests, will be provided to you later in this prompt. This program is running in a continuous loop, so you only need to specify one action, or maybe a few, at a time. You will see this prompt again immediately after you respond to it, with any relevant information updated to reflect the actions that were performed for you."""
+
+
+class LLMError(Exception):
+    """
+    Raised when an LLM call fails in a way that retrying won't fix (e.g. an invalid request).
+    """
+
+
+class LLMAPIError(LLMError):
+    """
+    Raised for transient failures (timeouts, connection errors, server errors). These are retried.
+    """
+
+
+class RateLimitError(LLMAPIError):
+    """
+    Raised when the backend rejects a call because we're over our rate limit.
+    - retry_after is the number of seconds the backend asked us to wait, if it told us
+    """
+    def __init__(self, message, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(headers):
+    """
+    Returns the number of seconds to wait from a Retry-After header, or None if there isn't a usable one.
+    """
+    retry_after = headers.get("Retry-After")
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        return None # HTTP dates aren't worth supporting here
+
+
+class wait_for_rate_limit(tenacity.wait.wait_base):
+    """
+    tenacity wait strategy: if the last attempt was rate limited and the backend said how long to wait, wait that long (plus a little jitter so clients don't retry in lockstep). Otherwise fall back to exponential backoff with jitter.
+    """
+    def __init__(self, fallback=None, max_jitter: float = 1.0):
+        self.fallback = fallback or tenacity.wait_random_exponential(multiplier=1, max=60)
+        self.max_jitter = max_jitter
+
+    def __call__(self, retry_state):
+        exception = retry_state.outcome.exception() if retry_state.outcome else None
+        retry_after = getattr(exception, "retry_after", None)
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.max_jitter)
+        return self.fallback(retry_state)
+
+
+def request_key(prompt: str, model_name: str, temperature: float, max_tokens: int, system_message: str = SYSTEM_INSTRUCTIONS):
+    """
+    Returns a stable hash that identifies an LLM request. Used to look up recorded responses.
+    """
+    request = {
+        "model_name": model_name,
+        "temperature": float(temperature),
+        "max_tokens": int(max_tokens),
+        "system_message": system_message,
+        "prompt": prompt,
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class LLMClient:
+    """
+    Base class for LLM backends. Subclasses must implement complete().
+    """
+    def complete(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        """
+        Sends the prompt to the LLM as a single user message and returns the text of the response.
+        """
+        raise NotImplementedError
+
+    async def acomplete(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        """
+        Async version of complete(). By default this runs complete() in a worker thread so it doesn't block the event loop (see agent/executor.py).
+        """
+        return await run_blocking(self.complete, prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+
+    def complete_cached(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        """
+        Same as complete(), but the response may come from a cache (see CachedLLMClient). Only used where a cached response is acceptable, e.g. for analysis calls that should give the same answer for the same prompt.
+        """
+        return self.complete(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+
+    async def acomplete_cached(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        return await self.acomplete(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+
+    def stream(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        """
+        Yields the text of the response in chunks, as it's generated. By default the whole response is yielded as one chunk.
+        """
+        yield self.complete(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+
+    async def astream(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        """
+        Async version of stream(). By default each chunk of stream() is waited for in a worker thread.
+        """
+        chunks = self.stream(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+        end_of_stream = object()
+        while True:
+            chunk = await run_blocking(next, chunks, end_of_stream)
+            if chunk is end_of_stream:
+                return
+            yield chunk
+
+
+class OpenAIClient(LLMClient):
+    """
+    Calls the OpenAI chat completions endpoint.
+
+    A single requests.Session (with a connection pool of pool_size connections) is shared by every call made through this client, so we don't pay for a new TCP/TLS handshake on each call. The session is created lazily and isn't pickled along with the client.
+
+    Failed calls are retried with rate-limit-aware backoff (see wait_for_rate_limit). When any call gets rate limited, every other call made through this client also holds off until the backend's Retry-After has passed, instead of each one hitting the limit separately.
+    """
+    def __init__(self, api_key: str = None, api_base: str = "https://api.openai.com/v1", request_timeout: float = 120, pool_size: int = 10):
+        self.api_key = api_key # if None, the OPENAI_API_KEY environment variable is read at call time
+        self.api_base = api_base.rstrip("/")
+        self.request_timeout = request_timeout
+        self.pool_size = pool_size
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._cooldown_until = 0.0 # time.monotonic() value before which no new calls are sent
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_session"] = None
+        state["_cooldown_until"] = 0.0
+        del state["_session_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._session_lock = threading.Lock()
+        self._cooldown_until = 0.0
+
+    def get_session(self):
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+        return self._session
+
+    def close(self):
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def start_cooldown(self, seconds: float):
+        self._cooldown_until = max(self._cooldown_until, time.monotonic() + seconds)
+
+    def wait_for_cooldown(self):
+        delay = self._cooldown_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    @tenacity.retry(
+        stop=tenacity.stop_after_attempt(5),
+        wait=wait_for_rate_limit(),
+        retry=tenacity.retry_if_exception_type(LLMAPIError),
+        reraise=True,
+    )
+    def post(self, payload: dict, stream: bool = False):
+        """
+        Sends a chat completions request and returns the HTTP response, raising the appropriate LLMError if it failed. Failed requests are retried.
+        """
+        headers = {"Authorization": f"Bearer {self.api_key or os.getenv('OPENAI_API_KEY')}"}
+
+        self.wait_for_cooldown()
+        try:
+            response = self.get_session().post(f"{self.api_base}/chat/completions", json=payload, headers=headers, timeout=self.request_timeout, stream=stream)
+        except (requests.Timeout, requests.ConnectionError) as e:
+            raise LLMAPIError(f"Error connecting to the OpenAI API: {e}") from e
+
+        if response.status_code == 429:
+            retry_after = parse_retry_after(response.headers)
+            self.start_cooldown(retry_after if retry_after is not None else 1.0)
+            raise RateLimitError(f"OpenAI API rate limit exceeded: {response.text}", retry_after=retry_after)
+        if response.status_code >= 500:
+            raise LLMAPIError(f"OpenAI API error (status {response.status_code}): {response.text}")
+        if response.status_code >= 400:
+            raise LLMError(f"OpenAI API request failed (status {response.status_code}): {response.text}")
+        return response
+
+    def build_payload(self, prompt, model_name, temperature, max_tokens, system_message):
+        return {
+            "model": model_name,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt},
+            ],
+            "max_tokens": int(max_tokens),
+            "temperature": float(temperature),
+        }
+
+    def complete(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        response = self.post(self.build_payload(prompt, model_name, temperature, max_tokens, system_message))
+        return response.json()["choices"][0]["message"]["content"].strip()
+
+    def stream(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        """
+        Streams the response using server-sent events. Only opening the stream is retried; an error partway through raises LLMAPIError, since the text that was already yielded can't be taken back.
+        """
+        payload = self.build_payload(prompt, model_name, temperature, max_tokens, system_message)
+        payload["stream"] = True
+        response = self.post(payload, stream=True)
+        response.encoding = "utf-8"
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                # each event is a line like 'data: {...}', and the stream ends with 'data: [DONE]'
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or []
+                content = choices[0].get("delta", {}).get("content") if choices else None
+                if content:
+                    yield content
+        except (requests.Timeout, requests.ConnectionError) as e:
+            raise LLMAPIError(f"Lost the connection to the OpenAI API while streaming: {e}") from e
+        finally:
+            response.close()
+
+
+class FakeLLMClient(LLMClient):
+    """
+    Deterministic local stand-in for an LLM backend. Nothing is sent over the network.
+
+    Responses are chosen in this order:
+    1. a recorded response for this exact request (see RecordingLLMClient and load_recording())
+    2. the next scripted response from the responses list (cycling back to the start if cycle=True)
+    3. default_response
+
+    latency (in seconds) is slept on every call, so the agent loop can be load tested against a realistic response time. When streaming, the response is yielded in chunks of stream_chunk_size characters, with the latency spread evenly across them.
+    """
+    def __init__(self, responses: list = None, default_response: str = "", cycle: bool = False, latency: float = 0.0, stream_chunk_size: int = 20):
+        self.responses = list(responses or [])
+        self.default_response = default_response
+        self.cycle = cycle
+        self.latency = latency
+        self.stream_chunk_size = stream_chunk_size
+        self.recorded_responses = {} # request key -> response
+        self.num_calls = 0
+        self._next_response_index = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_recording(cls, path, **kwargs):
+        client = cls(**kwargs)
+        client.load_recording(path)
+        return client
+
+    def load_recording(self, path):
+        """
+        Loads responses recorded by RecordingLLMClient (a JSON lines file).
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self.recorded_responses[record["key"]] = record["response"]
+
+    def complete(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.get_response(prompt, model_name, temperature, max_tokens, system_message)
+
+    async def acomplete(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        # no thread needed, since there's no real I/O to wait on
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.get_response(prompt, model_name, temperature, max_tokens, system_message)
+
+    def stream(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        chunks = self.split_into_chunks(self.get_response(prompt, model_name, temperature, max_tokens, system_message))
+        start_time = time.monotonic()
+        for i, chunk in enumerate(chunks):
+            # chunks become available on a fixed schedule, as if the backend keeps generating while the caller is busy with earlier chunks
+            delay = start_time + self.latency * (i + 1) / len(chunks) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            yield chunk
+
+    async def astream(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        chunks = self.split_into_chunks(self.get_response(prompt, model_name, temperature, max_tokens, system_message))
+        start_time = time.monotonic()
+        for i, chunk in enumerate(chunks):
+            delay = start_time + self.latency * (i + 1) / len(chunks) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield chunk
+
+    def split_into_chunks(self, response):
+        chunk_size = max(1, self.stream_chunk_size)
+        return [response[i:i + chunk_size] for i in range(0, len(response), chunk_size)] or [""]
+
+    def get_response(self, prompt, model_name, temperature, max_tokens, system_message):
+        key = request_key(prompt, model_name, temperature, max_tokens, system_message)
+        with self._lock:
+            self.num_calls += 1
+            if key in self.recorded_responses:
+                return self.recorded_responses[key]
+            if self.responses and self.cycle:
+                response = self.responses[self._next_response_index % len(self.responses)]
+                self._next_response_index += 1
+                return response
+            if self._next_response_index < len(self.responses):
+                response = self.responses[self._next_response_index]
+                self._next_response_index += 1
+                return response
+            return self.default_response
+
+
+class RecordingLLMClient(LLMClient):
+    """
+    Wraps another LLMClient and appends every request/response pair to a JSON lines file, which can be replayed with FakeLLMClient.from_recording().
+    """
+    def __init__(self, client: LLMClient, path: str):
+        self.client = client
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def complete(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        response = self.client.complete(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+        self.record(prompt, model_name, temperature, max_tokens, system_message, response)
+        return response
+
+    def complete_cached(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        response = self.client.complete_cached(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+        self.record(prompt, model_name, temperature, max_tokens, system_message, response)
+        return response
+
+    def stream(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        chunks = []
+        for chunk in self.client.stream(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message):
+            chunks.append(chunk)
+            yield chunk
+        # the streamed text isn't stripped, unlike the result of complete()
+        self.record(prompt, model_name, temperature, max_tokens, system_message, "".join(chunks).strip())
+
+    def record(self, prompt, model_name, temperature, max_tokens, system_message, response):
+        record = {"key": request_key(prompt, model_name, temperature, max_tokens, system_message), "model_name": model_name, "response": response}
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+class ConcurrencyLimitedLLMClient(LLMClient):
+    """
+    Wraps another LLMClient and caps the number of calls that can be in flight at once. Sync and async calls are limited separately, each to max_concurrent_calls (async calls per event loop).
+
+    This is how many agents running in one process share a single API quota (see agent/scheduler.py).
+    """
+    def __init__(self, client: LLMClient, max_concurrent_calls: int = 8):
+        self.client = client
+        self.max_concurrent_calls = max_concurrent_calls
+        self._thread_semaphore = threading.BoundedSemaphore(max_concurrent_calls)
+        self._async_semaphores = weakref.WeakKeyDictionary() # event loop -> its semaphore, since an asyncio.Semaphore can only be used in one event loop (e.g. one AgentScheduler.run())
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_thread_semaphore"]
+        del state["_async_semaphores"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._thread_semaphore = threading.BoundedSemaphore(self.max_concurrent_calls)
+        self._async_semaphores = weakref.WeakKeyDictionary()
+
+    def get_async_semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._async_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._async_semaphores[loop] = asyncio.Semaphore(self.max_concurrent_calls)
+        return semaphore
+
+    def complete(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        with self._thread_semaphore:
+            return self.client.complete(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+
+    async def acomplete(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        async with self.get_async_semaphore():
+            return await self.client.acomplete(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+
+    def complete_cached(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        with self._thread_semaphore:
+            return self.client.complete_cached(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+
+    async def acomplete_cached(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        async with self.get_async_semaphore():
+            return await self.client.acomplete_cached(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+
+    def stream(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        # the call counts as in flight until the stream is finished
+        with self._thread_semaphore:
+            yield from self.client.stream(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+
+    async def astream(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        async with self.get_async_semaphore():
+            async for chunk in self.client.astream(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message):
+                yield chunk
+
+
+# the client used by anything that isn't given one explicitly
+_default_llm_client = None
+_default_llm_client_lock = threading.Lock()
+
+def get_default_llm_client():
+    global _default_llm_client
+    with _default_llm_client_lock:
+        if _default_llm_client is None:
+            _default_llm_client = OpenAIClient()
+        return _default_llm_client
+
+def set_default_llm_client(client: LLMClient):
+    global _default_llm_client
+    with _default_llm_client_lock:
+        _default_llm_client = client
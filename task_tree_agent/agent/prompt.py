@@ -40,4 +40,57 @@ Here are the actions you have at your disposal. These are the ONLY options you h
 RESPONSE FORMATTING INSTRUCTIONS
 {response_formatting_instructions}
 
-""".strip()
\ No newline at end of file
+""".strip()
+
+
+# the same prompt with its sections ordered from most to least stable, so consecutive prompts share as long a prefix as possible and the backend's prompt caching can reuse it. The static instructions come first, then the content that changes rarely (human guidance, the action set context), then what changes on every iteration (the task tree, the action log and the current human input).
+stable_prefix_prompt_template = """
+OBJECTIVE
+The primary method you use to keep track of your tasks over time is your task tree. This task tree has a hierarchical tree structure. There is a root task at the top (which you do not have any information about), and that task has an ordered list of subtasks, each of which have their own ordered list of subtasks, and so on.
+
+What you get to see here is your local task tree. This consists of the current task you’re working on, as well as the parent task of that task, and the sibling tasks of that task. You should focus on solving the current task right now, but you can use the parent task and sibling tasks to provide context. Your local task tree is shown in the LOCAL TASK TREE section below.
+
+As you will see below when your action options are presented to you, you have control over your task tree. You can edit it and update it as you see fit. For example, you may attempt to solve a task, fail at it, and then decide you should break it up into subtasks to make it easier to solve. You are the only one with control over your task tree, so be sure to manage it with care.
+
+CONSTITUTION
+The following is a list of rules you MUST ALWAYS abide by when choosing actions to perform. If you do not abide by these rules, you will be turned off.
+
+{constitution}
+
+AVAILABLE ACTIONS
+Here are the actions you have at your disposal. These are the ONLY options you have for interacting with the world. Any text you output that does not properly request one or more of these actions will be ignored. These actions are formatted as Python functions.
+
+{available_actions}
+
+RESPONSE FORMATTING INSTRUCTIONS
+{response_formatting_instructions}
+
+HUMAN GUIDANCE (most recent message last)
+
+Human input from previous iterations (you've already seen these):
+{human_input_list}
+
+CONTEXT
+{action_set_prompt_context}
+
+LOCAL TASK TREE
+Here is your local task tree:
+
+{local_task_tree}
+
+ACTION LOG
+In order to help you keep track of what actions you’ve recently taken, we have provided you with an action log, which is shown below. This action log is automatically generated each time you request an action to be performed. These are listed in chronological order, so the most recent action performed will be shown last. Pay close attention to any actions you performed that were not successful, because this may indicate that you need to change your approach.
+
+{agent_action_log}
+
+Current iteration human input:
+{current_human_input}
+
+Now respond, following the RESPONSE FORMATTING INSTRUCTIONS above.
+""".strip()
+
+# prompt layouts that can be chosen with Agent(prompt_layout=...)
+PROMPT_TEMPLATES = {
+    "default": prompt_template,
+    "stable_prefix": stable_prefix_prompt_template,
+}
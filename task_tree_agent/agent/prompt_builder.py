@@ -0,0 +1,175 @@
+"""
+Fills in a prompt template while keeping the prompt within a token budget.
+
+Each template field is a PromptSection with a priority. If the filled-in prompt would be over budget, the lowest-priority sections are truncated first (down to their min_tokens), then the next lowest, and so on. Required sections (e.g. the response formatting instructions) are never truncated. Every build reports how many tokens each section used, and how many were cut.
+
+The budget defaults to the model's context window minus the tokens reserved for the response.
+
+LLM backends that cache prompt prefixes only help if consecutive prompts start with the same bytes. PrefixTracker measures how long the prefix shared by consecutive prompts is, so prompt layouts can be checked against that (see the "stable_prefix" layouts in agent/prompt.py and SDF_prompt_template.py).
+"""
+
+from functools import lru_cache
+from string import Formatter
+
+from agent.token_counter import get_context_window, get_token_counter
+
+TRUNCATION_MARKER = "[... truncated to fit the context window ...]"
+
+
+class PromptSection:
+    """
+    One field of a prompt template.
+    - priority: sections with lower priorities are truncated first
+    - keep: which part of the text to keep when truncating, "start" or "end" (e.g. "end" for logs, so the most recent entries are kept)
+    - min_tokens: the section is never truncated below this many tokens
+    - required: the section is never truncated
+    """
+    def __init__(self, name: str, text: str, priority: int = 0, keep: str = "start", min_tokens: int = 0, required: bool = False):
+        self.name = name
+        self.text = text if text is not None else ""
+        self.priority = priority
+        self.keep = keep
+        self.min_tokens = min_tokens
+        self.required = required
+
+
+class PromptUsage:
+    """
+    Token usage for one built prompt.
+    - sections: dict of section name -> (tokens used, tokens before truncation)
+    """
+    def __init__(self, budget: int, template_tokens: int, sections: dict, token_counter_name: str):
+        self.budget = budget
+        self.template_tokens = template_tokens
+        self.sections = sections
+        self.token_counter_name = token_counter_name
+        self.shared_prefix_tokens = None # tokens shared with the start of the previous prompt of the same kind, if it's being tracked (see PrefixTracker)
+
+    def get_total_tokens(self):
+        return self.template_tokens + sum(tokens for tokens, _ in self.sections.values())
+
+    def get_truncated_sections(self):
+        return [name for name, (tokens, original_tokens) in self.sections.items() if tokens < original_tokens]
+
+    def is_over_budget(self):
+        return self.get_total_tokens() > self.budget
+
+    def format(self):
+        lines = [f"Prompt tokens: {self.get_total_tokens()} / {self.budget} ({self.token_counter_name} count)"]
+        lines.append(f"  template: {self.template_tokens}")
+        for name, (tokens, original_tokens) in self.sections.items():
+            truncated_str = f" (truncated from {original_tokens})" if tokens < original_tokens else ""
+            lines.append(f"  {name}: {tokens}{truncated_str}")
+        if self.shared_prefix_tokens is not None:
+            lines.append(f"  shared prefix with the previous prompt: {self.shared_prefix_tokens}")
+        return "\n".join(lines)
+
+
+@lru_cache(maxsize=64)
+def count_template_tokens(template, token_counter):
+    # the tokens used by the template itself, with every field left empty
+    field_names = {field_name for _, field_name, _, _ in Formatter().parse(template) if field_name}
+    return token_counter.count(template.format(**{field_name: "" for field_name in field_names}))
+
+
+class PromptBuilder:
+    """
+    Builds prompts from a template and a list of PromptSections, truncating sections as needed to stay within max_prompt_tokens.
+    - max_prompt_tokens: defaults to the context window of model_name minus max_response_tokens
+    - token_counter: defaults to get_token_counter(model_name)
+    """
+    def __init__(self, template: str, model_name: str = "gpt-4", max_response_tokens: int = 1000, max_prompt_tokens: int = None, token_counter=None):
+        self.template = template
+        self.token_counter = token_counter or get_token_counter(model_name)
+        if max_prompt_tokens is None:
+            max_prompt_tokens = get_context_window(model_name) - max_response_tokens
+        self.max_prompt_tokens = max_prompt_tokens
+
+    def build(self, sections):
+        """
+        Returns (prompt, PromptUsage).
+        """
+        template_tokens = count_template_tokens(self.template, self.token_counter)
+        texts = {section.name: section.text for section in sections}
+        original_tokens = {section.name: self.token_counter.count(section.text) for section in sections}
+        tokens = dict(original_tokens)
+
+        overflow = template_tokens + sum(tokens.values()) - self.max_prompt_tokens
+        if overflow > 0:
+            marker_tokens = self.token_counter.count(TRUNCATION_MARKER) + 1
+            # lowest priority first; sort is stable, so sections with equal priority are truncated in the order they were given
+            for section in sorted(sections, key=lambda section: section.priority):
+                if overflow <= 0:
+                    break
+                if section.required:
+                    continue
+                target_tokens = max(section.min_tokens, tokens[section.name] - overflow)
+                if target_tokens >= tokens[section.name]:
+                    continue
+                texts[section.name] = self.truncate(section, target_tokens, marker_tokens)
+                new_tokens = self.token_counter.count(texts[section.name])
+                overflow -= tokens[section.name] - new_tokens
+                tokens[section.name] = new_tokens
+
+        usage = PromptUsage(
+            budget=self.max_prompt_tokens,
+            template_tokens=template_tokens,
+            sections={section.name: (tokens[section.name], original_tokens[section.name]) for section in sections},
+            token_counter_name=self.token_counter.name,
+        )
+        return self.template.format(**texts), usage
+
+    def truncate(self, section, target_tokens, marker_tokens):
+        # leave room for the marker, so the LLM knows something was cut
+        if target_tokens <= marker_tokens:
+            return ""
+        truncated_text = self.token_counter.truncate(section.text, target_tokens - marker_tokens, keep=section.keep)
+        if section.keep == "end":
+            return f"{TRUNCATION_MARKER}\n{truncated_text}"
+        return f"{truncated_text}\n{TRUNCATION_MARKER}"
+
+
+def get_shared_prefix_length(a, b):
+    """
+    Returns the number of characters at the start of a and b that are the same.
+    """
+    length = min(len(a), len(b))
+    # compare in blocks first, since comparing slices is much faster than comparing characters one at a time in Python
+    block_size = 4096
+    i = 0
+    while i + block_size <= length and a[i:i + block_size] == b[i:i + block_size]:
+        i += block_size
+    while i < length and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class PrefixTracker:
+    """
+    Measures the prefix each prompt shares with the previous prompt of the same kind (e.g. "agent", "edit_section"), which is the part a backend's prompt cache could reuse.
+    """
+    def __init__(self):
+        self.last_prompts = {} # kind -> last prompt
+        self.num_prompts = 0
+        self.total_chars = 0
+        self.total_shared_chars = 0
+
+    def record(self, kind, prompt):
+        """
+        Returns the number of characters prompt shares with the previous prompt of this kind (0 for the first one).
+        """
+        last_prompt = self.last_prompts.get(kind)
+        shared_chars = get_shared_prefix_length(last_prompt, prompt) if last_prompt is not None else 0
+        self.last_prompts[kind] = prompt
+        self.num_prompts += 1
+        self.total_chars += len(prompt)
+        self.total_shared_chars += shared_chars
+        return shared_chars
+
+    def record_usage(self, kind, prompt, usage, token_counter):
+        # records the prompt and saves the length of the shared prefix, in tokens, in its PromptUsage
+        shared_chars = self.record(kind, prompt)
+        usage.shared_prefix_tokens = token_counter.count(prompt[:shared_chars]) if shared_chars else 0
+
+    def get_shared_fraction(self):
+        return self.total_shared_chars / self.total_chars if self.total_chars else 0.0
@@ -0,0 +1,187 @@
+"""
+On-disk cache of LLM responses.
+
+Resuming a saved agent, re-running an example, or retrying after a crash re-sends prompts that have already been answered. CachedLLMClient wraps another LLMClient and saves responses in a ResponseCache (an SQLite file), keyed on a hash of everything that determines the response (see request_key()), so a repeated request can be answered without calling the API.
+
+Caching is opt-in per call site: only calls made through complete_cached() / acomplete_cached() use the cache (e.g. Document.read_and_analyze_section()). Plain complete() calls, like the agent's exploratory steps, always go to the LLM unless cache_all_calls is set.
+
+Entries older than max_age_seconds are treated as missing. When the cache holds more than max_entries entries or max_bytes bytes of responses, the least recently used entries are evicted.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from agent.llm_client import LLMClient, SYSTEM_INSTRUCTIONS, request_key
+
+
+class ResponseCache:
+    """
+    SQLite-backed store of LLM responses, keyed on request_key(). Safe to use from multiple threads; multiple processes can share the file.
+    - path: the SQLite file (":memory:" for a cache that isn't saved)
+    - max_entries, max_bytes: size limits; None means no limit
+    - max_age_seconds: entries older than this are ignored and deleted; None means entries never expire
+    """
+    def __init__(self, path: str = "llm_response_cache.sqlite", max_entries: int = 10000, max_bytes: int = None, max_age_seconds: float = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get_connection(self):
+        # called with self._lock held
+        if self._connection is None:
+            if self.path != ":memory:" and os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            if self.path != ":memory:":
+                connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, model_name TEXT, response TEXT, size INTEGER, created_at REAL, last_accessed REAL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_last_accessed ON responses (last_accessed)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def get(self, key):
+        """
+        Returns the cached response for key, or None if there isn't one.
+        """
+        now = time.time()
+        with self._lock:
+            connection = self.get_connection()
+            row = connection.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age_seconds is not None and now - row[1] > self.max_age_seconds:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                connection.commit()
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            connection.execute("UPDATE responses SET last_accessed = ? WHERE key = ?", (now, key))
+            connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response, model_name=""):
+        now = time.time()
+        with self._lock:
+            connection = self.get_connection()
+            connection.execute("INSERT OR REPLACE INTO responses (key, model_name, response, size, created_at, last_accessed) VALUES (?, ?, ?, ?, ?, ?)", (key, model_name, response, len(response.encode("utf-8")), now, now))
+            self.evict(connection, now)
+            connection.commit()
+
+    def evict(self, connection, now):
+        # called with self._lock held
+        if self.max_age_seconds is not None:
+            self.evictions += connection.execute("DELETE FROM responses WHERE created_at < ?", (now - self.max_age_seconds,)).rowcount
+
+        if self.max_entries is None and self.max_bytes is None:
+            return
+        num_entries, total_bytes = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        excess_entries = num_entries - self.max_entries if self.max_entries is not None else 0
+        excess_bytes = total_bytes - self.max_bytes if self.max_bytes is not None else 0
+        if excess_entries <= 0 and excess_bytes <= 0:
+            return
+
+        # least recently used first
+        keys_to_evict = []
+        for key, size in connection.execute("SELECT key, size FROM responses ORDER BY last_accessed"):
+            if excess_entries <= 0 and excess_bytes <= 0:
+                break
+            keys_to_evict.append((key,))
+            excess_entries -= 1
+            excess_bytes -= size
+        connection.executemany("DELETE FROM responses WHERE key = ?", keys_to_evict)
+        self.evictions += len(keys_to_evict)
+
+    def clear(self):
+        with self._lock:
+            connection = self.get_connection()
+            connection.execute("DELETE FROM responses")
+            connection.commit()
+
+    def get_stats(self):
+        """
+        Returns a dict of hit/miss counts and the current size of the cache.
+        """
+        with self._lock:
+            num_entries, total_bytes = self.get_connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        num_lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / num_lookups if num_lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": num_entries,
+            "bytes": total_bytes,
+        }
+
+
+class CachedLLMClient(LLMClient):
+    """
+    Wraps another LLMClient, answering complete_cached() and acomplete_cached() calls from a ResponseCache when possible.
+    - cache_all_calls: also cache plain complete() / acomplete() calls (e.g. to replay a whole agent run after a crash)
+    """
+    def __init__(self, client: LLMClient, cache: ResponseCache = None, cache_all_calls: bool = False):
+        self.client = client
+        self.cache = cache if cache is not None else ResponseCache()
+        self.cache_all_calls = cache_all_calls
+
+    def complete(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        if self.cache_all_calls:
+            return self.complete_cached(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+        return self.client.complete(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+
+    async def acomplete(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        if self.cache_all_calls:
+            return await self.acomplete_cached(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+        return await self.client.acomplete(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+
+    def stream(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        # streamed calls are never cached
+        return self.client.stream(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+
+    def astream(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        return self.client.astream(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+
+    def complete_cached(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        key = request_key(prompt, model_name, temperature, max_tokens, system_message)
+        response = self.cache.get(key)
+        if response is None:
+            response = self.client.complete(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+            self.cache.put(key, response, model_name=model_name)
+        return response
+
+    async def acomplete_cached(self, prompt: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.5, max_tokens: int = 1000, system_message: str = SYSTEM_INSTRUCTIONS):
+        key = request_key(prompt, model_name, temperature, max_tokens, system_message)
+        response = self.cache.get(key)
+        if response is None:
+            response = await self.client.acomplete(prompt, model_name=model_name, temperature=temperature, max_tokens=max_tokens, system_message=system_message)
+            self.cache.put(key, response, model_name=model_name)
+        return response
+
+    def get_stats(self):
+        return self.cache.get_stats()
@@ -0,0 +1,246 @@
+"""
+Parsers for the action requests in an LLM response.
+
+The agent's response has two parts (see RESPONSE_FORMATTING_INSTRUCTIONS): a free-text scratchpad, then a list of action dictionaries under the "Part 2) Action requests" header. LLMs don't always follow that format exactly, so the parsers here are lenient:
+- the action list is looked for after the Part 2 header, so brackets in the scratchpad aren't mistaken for it
+- each action dictionary is parsed separately, so one malformed dictionary doesn't throw away the others
+- Python literal syntax (single quotes, True/False/None) is accepted as well as JSON
+- text after the end of the list (e.g. a closing code fence or a sign-off) is ignored
+- if the response was cut off partway through the list, every dictionary that was completed is still returned
+
+parse_action_list() parses a complete response. StreamingResponseParser is fed the response a chunk at a time, and returns the scratchpad text and each action dictionary as soon as they arrive.
+"""
+
+import ast
+import json
+import re
+
+PART_1_HEADER = "Part 1) Temporary scratchpad"
+PART_2_HEADER = "Part 2) Action requests"
+
+PART_2_HEADER_PATTERN = re.compile(r"part\s*2\s*\)?\s*[:.\-]?\s*action\s+requests?", re.IGNORECASE)
+ACTION_LIST_START_PATTERN = re.compile(r"\[\s*\{")
+SPECIAL_CHARACTER_PATTERN = re.compile(r"[\"'\\\[\]{}]") # the only characters that change the scanner's state
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+
+# scratchpad text isn't returned until we know it isn't the start of a header
+_HOLDBACK_CHARS = max(len(PART_1_HEADER), len(PART_2_HEADER))
+
+
+def parse_action_dict(text):
+    """
+    Parses the text of a single action dictionary, as JSON or as a Python literal. Returns (action_dict, None) on success, or (None, error message).
+    """
+    try:
+        action_dict = json.loads(text)
+    except json.JSONDecodeError as e:
+        action_dict = None
+        error = e
+        for parse in (ast.literal_eval, lambda text: json.loads(TRAILING_COMMA_PATTERN.sub(r"\1", text))):
+            try:
+                action_dict = parse(text)
+                break
+            except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+                continue
+        if action_dict is None:
+            return None, f"Invalid JSON format in action request. Error: {error}"
+
+    if not isinstance(action_dict, dict):
+        return None, "Each action request must be a dictionary."
+    if "function" not in action_dict:
+        return None, "Action request is missing the \"function\" key."
+    return action_dict, None
+
+
+class ActionListScanner:
+    """
+    Finds the action dictionaries in an action list, given the text that follows its opening "[". Text can be fed in pieces.
+
+    Tracks bracket depth and whether we're inside a string (single or double quoted, so Python literals work too), and returns the text of each top-level dictionary as soon as its closing brace is seen.
+    """
+    def __init__(self):
+        self.text = ""
+        self.position = 0
+        self.depth = 1 # we start just inside the list
+        self.quote = None # the quote character of the string we're in, if any
+        self.escaped_position = -1 # position of the character after a backslash in a string
+        self.object_start = None
+        self.closed = False
+
+    def feed(self, text):
+        """
+        Adds text, and returns the text of every action dictionary completed by it.
+        """
+        self.text += text
+        if self.closed:
+            return []
+
+        object_texts = []
+        scanned_text = self.text
+        for match in SPECIAL_CHARACTER_PATTERN.finditer(scanned_text, self.position):
+            c = match.group()
+            i = match.start()
+            if self.quote is not None:
+                if i == self.escaped_position:
+                    continue
+                elif c == "\\":
+                    self.escaped_position = i + 1
+                elif c == self.quote:
+                    self.quote = None
+            elif c == '"' or c == "'":
+                self.quote = c
+            elif c == "[" or c == "{":
+                self.depth += 1
+                if self.depth == 2 and c == "{":
+                    self.object_start = i
+            elif c == "]" or c == "}":
+                self.depth -= 1
+                if self.depth == 1 and c == "}" and self.object_start is not None:
+                    object_texts.append(scanned_text[self.object_start:i + 1])
+                    self.object_start = None
+                elif self.depth <= 0:
+                    self.closed = True
+                    break
+        self.position = len(scanned_text)
+        return object_texts
+
+    def get_incomplete_text(self):
+        # the text of the dictionary that was still open when the input ended, if any
+        return self.text[self.object_start:] if self.object_start is not None else ""
+
+
+def find_action_list_start(response, start=0):
+    """
+    Returns the index just past the "[" that opens the action list, or None if there isn't one.
+
+    The list is looked for after the Part 2 header. If there's no header, the first "[" that's followed by a "{" is used.
+    """
+    header_match = PART_2_HEADER_PATTERN.search(response, start)
+    if header_match:
+        list_start = response.find("[", header_match.end())
+        return list_start + 1 if list_start != -1 else None
+    list_match = ACTION_LIST_START_PATTERN.search(response, start)
+    return list_match.start() + 1 if list_match else None
+
+
+def parse_action_list(response):
+    """
+    Parses the action list in a complete response.
+
+    Returns (list of action dictionaries, list of errors), where each error is (error message, text it refers to). The list of action dictionaries is None if no action list was found at all.
+    """
+    list_start = find_action_list_start(response)
+    if list_start is None:
+        return None, [("No action list found in the response.", "")]
+
+    # fast path: a well-formed JSON list (anything after it is ignored)
+    try:
+        action_dicts, _ = json.JSONDecoder().raw_decode(response, list_start - 1)
+        if isinstance(action_dicts, list) and all(isinstance(action_dict, dict) and "function" in action_dict for action_dict in action_dicts):
+            return action_dicts, []
+    except json.JSONDecodeError:
+        pass
+
+    scanner = ActionListScanner()
+    action_dicts = []
+    errors = []
+    for object_text in scanner.feed(response[list_start:]):
+        action_dict, error_message = parse_action_dict(object_text)
+        if action_dict is not None:
+            action_dicts.append(action_dict)
+        else:
+            errors.append((error_message, object_text))
+    if not scanner.closed and scanner.get_incomplete_text():
+        errors.append(("The action list is incomplete; the response may have been cut off.", scanner.get_incomplete_text()))
+    return action_dicts, errors
+
+
+class StreamingResponseParser:
+    """
+    Feed chunks of the response to feed(), then call finish() once the response is complete.
+
+    Actions are only parsed from after the "Part 2" header, so brackets in the scratchpad can't be mistaken for the action list. If the header never arrives, no actions are returned while streaming, and the caller should parse the full response with parse_action_list() instead (found_action_list is False).
+    """
+    def __init__(self):
+        self.response = ""
+        self.scratchpad_start = None # index just past the Part 1 header, once we've seen it (or know it isn't there)
+        self.scratchpad_returned_until = 0 # index up to which scratchpad text has been returned
+        self.part_2_start = None # index of the Part 2 header
+        self.part_2_end = None
+        self.header_search_position = 0
+        self.scanner = None # ActionListScanner, once the action list has started
+        self.errors = [] # (error message, text of the action dictionary that couldn't be parsed)
+
+    @property
+    def found_action_list(self):
+        return self.scanner is not None
+
+    def feed(self, chunk):
+        """
+        Adds a chunk of the response. Returns (new scratchpad text, list of newly completed action dictionaries).
+        """
+        self.response += chunk
+        action_dicts = []
+        if self.scanner is not None:
+            object_texts = self.scanner.feed(chunk)
+        else:
+            object_texts = self.find_action_list()
+        for object_text in object_texts:
+            action_dict, error_message = parse_action_dict(object_text)
+            if action_dict is not None:
+                action_dicts.append(action_dict)
+            else:
+                self.errors.append((error_message, object_text))
+        return self.get_new_scratchpad_text(final=False), action_dicts
+
+    def finish(self):
+        """
+        Call once the whole response has been fed. Returns the rest of the scratchpad text.
+
+        If the action list was started but never closed (e.g. the response was cut off by max_tokens), an error is added to self.errors.
+        """
+        scratchpad_text = self.get_new_scratchpad_text(final=True)
+        if self.scanner is not None and not self.scanner.closed and self.scanner.get_incomplete_text():
+            self.errors.append(("The action list is incomplete; the response may have been cut off.", self.scanner.get_incomplete_text()))
+        return scratchpad_text
+
+    def find_action_list(self):
+        if self.scratchpad_start is None:
+            header_position = self.response.find(PART_1_HEADER)
+            if header_position != -1:
+                self.scratchpad_start = header_position + len(PART_1_HEADER)
+            elif len(self.response) >= _HOLDBACK_CHARS + len(PART_1_HEADER):
+                self.scratchpad_start = 0 # the response didn't start with the header
+
+        if self.part_2_start is None:
+            # the header may have been split across chunks, so search a little way back
+            header_match = PART_2_HEADER_PATTERN.search(self.response, max(0, self.header_search_position - _HOLDBACK_CHARS))
+            if header_match is None:
+                self.header_search_position = len(self.response)
+                return []
+            self.part_2_start = header_match.start()
+            self.part_2_end = header_match.end()
+
+        list_start = self.response.find("[", self.part_2_end)
+        if list_start == -1:
+            return []
+        self.scanner = ActionListScanner()
+        return self.scanner.feed(self.response[list_start + 1:])
+
+    def get_new_scratchpad_text(self, final):
+        if self.part_2_start is not None:
+            end = self.part_2_start
+        elif final:
+            end = len(self.response)
+        else:
+            end = len(self.response) - _HOLDBACK_CHARS
+        if self.scratchpad_start is None:
+            if not final and self.part_2_start is None:
+                return "" # still waiting to see if the response starts with the Part 1 header
+            header_position = self.response.find(PART_1_HEADER, 0, end)
+            self.scratchpad_start = header_position + len(PART_1_HEADER) if header_position != -1 else 0
+        start = max(self.scratchpad_returned_until, self.scratchpad_start)
+        if end <= start:
+            return ""
+        self.scratchpad_returned_until = end
+        return self.response[start:end]
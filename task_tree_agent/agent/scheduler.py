@@ -0,0 +1,146 @@
+"""
+Runs many Agent instances in one process.
+
+Each agent is stepped one iteration at a time (Agent.astep), and agents take turns in round-robin order, so no agent can starve the others. All agents share one LLMClient, wrapped in a ConcurrencyLimitedLLMClient so the total number of LLM calls in flight never exceeds max_concurrent_llm_calls. Rate limiting is handled by the underlying client (see OpenAIClient), which backs off for every agent at once when the API says to slow down.
+
+Agents run unattended: the only human input they get is from a guidance source set on them explicitly with Agent.set_guidance_source() (see agent/guidance.py).
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agent.executor import use_executor
+from agent.llm_client import ConcurrencyLimitedLLMClient, get_default_llm_client
+
+
+class AgentJob:
+    """
+    An agent registered with the scheduler, along with its iteration budget and progress.
+    """
+    def __init__(self, agent, max_iterations: int, model_name: str, name: str):
+        self.agent = agent
+        self.max_iterations = max_iterations
+        self.model_name = model_name
+        self.name = name
+        self.iterations_completed = 0
+        self.finished = False
+        self.error = None # the exception that stopped this job, if any
+
+
+class AgentScheduler:
+    """
+    Multiplexes many agents over a shared worker pool and LLM concurrency limit.
+    - max_concurrent_llm_calls: global cap on LLM calls in flight, across all agents (including calls made by action sets, e.g. edit_section)
+    - max_concurrent_agents: how many agents can be mid-iteration at once (defaults to max_concurrent_llm_calls)
+    - max_worker_threads: size of the thread pool used for blocking work, like sync LLM calls and checkpoint writes (defaults to max_concurrent_llm_calls * 2). The pool is created for each run and shut down when it ends (see agent/executor.py)
+
+    Every agent must have its own action sets (see ActionSet.copy()), since running an agent re-points its action sets at its current task, and its own save_path.
+    """
+    def __init__(self, llm_client=None, max_concurrent_llm_calls: int = 8, max_concurrent_agents: int = None, max_worker_threads: int = None, verbose: bool = False):
+        self.llm_client = ConcurrencyLimitedLLMClient(llm_client or get_default_llm_client(), max_concurrent_calls=max_concurrent_llm_calls)
+        self.max_concurrent_agents = max_concurrent_agents or max_concurrent_llm_calls
+        self.max_worker_threads = max_worker_threads or max_concurrent_llm_calls * 2
+        self.verbose = verbose
+        self.jobs = []
+
+    def add_agent(self, agent, max_iterations: int = 10, model_name: str = "gpt-4", name: str = None):
+        # make sure this agent doesn't share any action sets with an agent that's already been added
+        action_set_ids = {id(action_set) for action_set in agent.action_interface.action_set_list}
+        for job in self.jobs:
+            for action_set in job.agent.action_interface.action_set_list:
+                if id(action_set) in action_set_ids:
+                    raise ValueError(f"Action set {action_set.action_set_name} is already used by agent {job.name}. Use ActionSet.copy() to give each agent its own action sets.")
+
+        # agents that checkpoint to the same file would overwrite each other's saves
+        save_path = os.path.abspath(agent.save_path)
+        for job in self.jobs:
+            if os.path.abspath(job.agent.save_path) == save_path:
+                raise ValueError(f"Save path {agent.save_path} is already used by agent {job.name}. Give each agent its own save_path.")
+
+        job = AgentJob(agent, max_iterations, model_name, name or f"agent_{len(self.jobs)}")
+        self.jobs.append(job)
+        return job
+
+    def run(self):
+        """
+        Runs every registered agent until it runs out of tasks or iterations. Returns the list of AgentJob objects.
+        """
+        return asyncio.run(self.arun())
+
+    async def arun(self):
+        # route every LLM call through the shared, concurrency-limited client for the duration of the run
+        attached_objects = self.attach_llm_client()
+
+        queue = asyncio.Queue()
+        for job in self.jobs:
+            if not job.finished:
+                queue.put_nowait(job)
+        num_unfinished_jobs = queue.qsize()
+        num_workers = min(self.max_concurrent_agents, num_unfinished_jobs)
+
+        async def worker():
+            nonlocal num_unfinished_jobs
+            while True:
+                job = await queue.get()
+                if job is None:
+                    return
+
+                await self.step_job(job)
+
+                if job.finished:
+                    num_unfinished_jobs -= 1
+                    if num_unfinished_jobs == 0:
+                        for _ in range(num_workers):
+                            queue.put_nowait(None) # tell the workers to stop
+                else:
+                    queue.put_nowait(job) # back of the line, so every agent gets a turn
+
+        start_time = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=self.max_worker_threads)
+        try:
+            with use_executor(executor):
+                await asyncio.gather(*[worker() for _ in range(num_workers)])
+        finally:
+            self.detach_llm_client(attached_objects)
+            executor.shutdown() # waits for any checkpoint write still in progress, e.g. if the run was cancelled
+
+        if self.verbose:
+            elapsed = time.perf_counter() - start_time
+            total_iterations = sum(job.iterations_completed for job in self.jobs)
+            print(f"Ran {total_iterations} iterations across {len(self.jobs)} agents in {elapsed:.1f}s ({total_iterations / max(elapsed, 1e-9):.2f} iterations/s)")
+
+        return self.jobs
+
+    async def step_job(self, job):
+        try:
+            human_input = job.agent.poll_guidance() if getattr(job.agent, "guidance_source", None) is not None else ""
+            has_more_tasks = await job.agent.astep(model_name=job.model_name, human_input=human_input, verbose=False, show_thoughts=False)
+        except Exception as e:
+            print(f"Agent {job.name} stopped after an error: {e}")
+            job.error = e
+            job.finished = True
+            return
+
+        if has_more_tasks:
+            job.iterations_completed += 1
+        if not has_more_tasks or job.iterations_completed >= job.max_iterations:
+            job.finished = True
+            if self.verbose: print(f"Agent {job.name} finished after {job.iterations_completed} iterations")
+
+    def attach_llm_client(self):
+        """
+        Points each agent, and each action set object that makes its own LLM calls (e.g. an SDF Document), at the shared client. The client is set as _scheduler_llm_client, a derived attribute that get_llm_client() checks first, so it's never saved in a checkpoint. Returns the objects it was set on, so it can be removed.
+        """
+        attached_objects = []
+        for job in self.jobs:
+            for obj in [job.agent] + [action_set.action_set_object for action_set in job.agent.action_interface.action_set_list]:
+                if hasattr(obj, "get_llm_client"):
+                    object.__setattr__(obj, "_scheduler_llm_client", self.llm_client)
+                    attached_objects.append(obj)
+        return attached_objects
+
+    def detach_llm_client(self, attached_objects):
+        for obj in attached_objects:
+            object.__setattr__(obj, "_scheduler_llm_client", None)
@@ -0,0 +1,143 @@
+"""
+Local token counting, so prompts can be kept within the model's context window without calling the API.
+
+If tiktoken is installed (and its encoding files are available), token counts are exact for OpenAI models. Otherwise an estimate based on character counts is used, which is close enough for budgeting (OpenAI's rule of thumb is ~4 characters per token for English text). Any other estimator can be plugged in by subclassing TokenCounter.
+"""
+
+import re
+from functools import lru_cache
+
+# context window sizes, in tokens. Model names are matched by prefix, longest prefix first, so e.g. "gpt-4-0613" uses the "gpt-4" entry.
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-1106": 128000,
+    "gpt-4-0125": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo-16k": 16384,
+    "gpt-3.5-turbo-1106": 16385,
+    "gpt-3.5-turbo-0125": 16385,
+    "gpt-3.5-turbo": 4096,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+TOKEN_BOUNDARY_PATTERN = re.compile(r"(?<=\S) ") # a space right after a non-space character, which tiktoken's encodings never put in the same token, whatever text is around them
+EDIT_WINDOW_MARGIN = 64 # characters on either side of an edit that are searched for a token boundary, at first (see TiktokenCounter.count_change())
+
+
+def get_context_window(model_name: str):
+    """
+    Returns the context window size of model_name, in tokens, or DEFAULT_CONTEXT_WINDOW if the model isn't known.
+    """
+    for prefix in sorted(MODEL_CONTEXT_WINDOWS, key=len, reverse=True):
+        if model_name.startswith(prefix):
+            return MODEL_CONTEXT_WINDOWS[prefix]
+    return DEFAULT_CONTEXT_WINDOW
+
+
+class TokenCounter:
+    """
+    Base class for token counters. Subclasses implement count() and truncate().
+    """
+    name = "base"
+
+    def count(self, text: str):
+        raise NotImplementedError
+
+    def truncate(self, text: str, max_tokens: int, keep: str = "start"):
+        """
+        Returns text cut down to at most max_tokens tokens.
+        - keep: "start" keeps the beginning of the text, "end" keeps the end (e.g. for logs, where the most recent entries matter most)
+        """
+        raise NotImplementedError
+
+    def count_change(self, old_text, new_text, start: int, old_end: int, new_end: int):
+        """
+        Returns count(new_text) - count(old_text), where new_text is old_text with old_text[start:old_end] replaced by new_text[start:new_end]. The texts are PieceTables (anything with len() and get_text(start, end)), so subclasses can count only the text around the edit. By default both texts are counted in full.
+        """
+        return self.count(new_text.get_text(0, len(new_text))) - self.count(old_text.get_text(0, len(old_text)))
+
+
+class HeuristicTokenCounter(TokenCounter):
+    """
+    Estimates token counts from character counts. Used when tiktoken isn't available.
+    """
+    name = "heuristic"
+
+    def __init__(self, chars_per_token: float = 4.0):
+        self.chars_per_token = chars_per_token
+
+    def count(self, text: str):
+        return self.count_chars(len(text))
+
+    def count_chars(self, num_chars: int):
+        return int(-(-num_chars // self.chars_per_token)) # round up
+
+    def count_change(self, old_text, new_text, start: int, old_end: int, new_end: int):
+        # the estimate only depends on the length of the text
+        return self.count_chars(len(new_text)) - self.count_chars(len(old_text))
+
+    def truncate(self, text: str, max_tokens: int, keep: str = "start"):
+        max_chars = int(max_tokens * self.chars_per_token)
+        if len(text) <= max_chars:
+            return text
+        if max_chars <= 0:
+            return ""
+        return text[:max_chars] if keep == "start" else text[-max_chars:]
+
+
+class TiktokenCounter(TokenCounter):
+    """
+    Exact token counts for OpenAI models, using tiktoken.
+    """
+    name = "tiktoken"
+
+    def __init__(self, model_name: str = "gpt-4"):
+        import tiktoken
+        try:
+            self.encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding("cl100k_base")
+        # prompt fragments are cached and reused between calls (see ActionInterface), so the same strings get counted over and over
+        self.count = lru_cache(maxsize=256)(self.count)
+
+    def count(self, text: str):
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def count_change(self, old_text, new_text, start: int, old_end: int, new_end: int):
+        # tokens never span a TOKEN_BOUNDARY_PATTERN match, so only the text between the nearest ones outside the edit (in text that it didn't change) has to be recounted
+        margin = EDIT_WINDOW_MARGIN
+        while True:
+            window_start = max(0, start - margin)
+            window_end = min(len(old_text), old_end + margin)
+            window = old_text.get_text(window_start, window_end)
+            boundaries = [match.start() + window_start for match in TOKEN_BOUNDARY_PATTERN.finditer(window)]
+            left = max((boundary for boundary in boundaries if boundary < start), default=0 if window_start == 0 else None)
+            right = min((boundary for boundary in boundaries if boundary > old_end), default=len(old_text) if window_end == len(old_text) else None)
+            if left is not None and right is not None:
+                break
+            margin *= 4
+        old_window = window[left - window_start:right - window_start]
+        new_window = new_text.get_text(left, right + new_end - old_end)
+        return self.count(new_window) - self.count(old_window)
+
+    def truncate(self, text: str, max_tokens: int, keep: str = "start"):
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        if max_tokens <= 0:
+            return ""
+        tokens = tokens[:max_tokens] if keep == "start" else tokens[-max_tokens:]
+        return self.encoding.decode(tokens)
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(model_name: str = "gpt-4"):
+    """
+    Returns the best available TokenCounter for model_name: a TiktokenCounter if tiktoken can be loaded, and a HeuristicTokenCounter otherwise.
+    """
+    try:
+        return TiktokenCounter(model_name)
+    except Exception:
+        # tiktoken isn't installed, or it couldn't load its encoding files (it downloads them on first use)
+        return HeuristicTokenCounter()
@@ -0,0 +1,92 @@
+"""
+Benchmark for exporting the documents of many saved agents.
+
+Saves a directory of synthetic agents, each with a document of about 20,000 words, then exports them all to markdown and docx:
+- one at a time, loading each agent and writing each file in turn, as the old export_document.py script did for a single agent
+- with batch_export.export_directory(), using one worker process and then one per CPU
+- with export_directory() again, when nothing has changed, and after a tenth of the agents have been edited and saved again
+
+Usage: python benchmarks/batch_export_benchmark.py [number of agents]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.agent_class import Agent
+from action_sets.long_form_writing.SDF import Document
+from action_sets.long_form_writing.writing_action_set import writing_action_set
+from action_sets.long_form_writing.export_document import export_document, get_document
+from action_sets.long_form_writing.batch_export import export_directory, find_checkpoints, format_report
+
+PARAGRAPH = "The quick brown fox jumps over the lazy dog while the committee deliberates on the budget. " * 6
+NUM_SECTIONS = 20
+ELEMENTS_PER_SECTION = 10
+FORMATS = ["md", "docx"]
+
+
+def save_agents(directory, num_agents):
+    for i in range(num_agents):
+        document = Document(title=f"Document {i}")
+        for j in range(NUM_SECTIONS):
+            document.add_section(j, title=f"Chapter {j + 1}")
+            for k in range(ELEMENTS_PER_SECTION):
+                document.sections[j].add_element(k, f"{i}.{j}.{k} {PARAGRAPH}")
+        document.update_toc()
+        # a few agents per subdirectory, as runs are usually organized
+        save_path = os.path.join(directory, f"batch_{i // 25}", f"agent_{i}.pkl")
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        agent = Agent(task_description=f"Write document {i}", action_sets=[writing_action_set.copy(document)], save_path=save_path)
+        agent.save()
+
+
+def export_one_at_a_time(input_directory, output_directory):
+    for relative_path in find_checkpoints(input_directory):
+        document = get_document(Agent.load(os.path.join(input_directory, relative_path)))
+        for format in FORMATS:
+            output_path = os.path.join(output_directory, os.path.splitext(relative_path)[0] + "." + format)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            export_document(document, output_path)
+
+
+def edit_agents(input_directory, fraction):
+    relative_paths = find_checkpoints(input_directory)
+    for relative_path in relative_paths[:int(len(relative_paths) * fraction)]:
+        agent = Agent.load(os.path.join(input_directory, relative_path))
+        get_document(agent).sections[0].append_text(0, " An edit.")
+        agent.save()
+
+
+def main():
+    num_agents = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as directory:
+        input_directory = os.path.join(directory, "agents")
+        save_agents(input_directory, num_agents)
+        print(f"Exporting {num_agents} agents to {' and '.join(FORMATS)} on {os.cpu_count()} CPUs\n")
+
+        start_time = time.perf_counter()
+        export_one_at_a_time(input_directory, os.path.join(directory, "one_at_a_time"))
+        elapsed = time.perf_counter() - start_time
+        print(f"One at a time\n{elapsed:.2f}s, {num_agents / elapsed:.1f} checkpoints/s\n")
+
+        print("Batch, 1 worker")
+        print(format_report(export_directory(input_directory, os.path.join(directory, "batch_1"), formats=FORMATS, max_workers=1)) + "\n")
+
+        output_directory = os.path.join(directory, "batch")
+        print(f"Batch, {os.cpu_count()} workers")
+        print(format_report(export_directory(input_directory, output_directory, formats=FORMATS)) + "\n")
+
+        print("Batch again, nothing changed")
+        print(format_report(export_directory(input_directory, output_directory, formats=FORMATS)) + "\n")
+
+        edit_agents(input_directory, 0.1)
+        print("Batch again, after editing a tenth of the agents")
+        print(format_report(export_directory(input_directory, output_directory, formats=FORMATS)))
+
+
+if __name__ == "__main__":
+    main()
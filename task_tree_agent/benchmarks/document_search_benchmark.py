@@ -0,0 +1,87 @@
+"""
+Benchmark for searching an SDF document.
+
+Builds a synthetic document of about a million words, then simulates an agent that edits one element and then searches the document, NUM_ITERATIONS times. Compares keeping the search index up to date incrementally (Document.search()) with rebuilding it from scratch for every search, and checks that both give the same results. Also reports how much text the search results contain, compared to the full text of the sections they come from, which is what reading those sections with read_and_analyze_section() would put in front of an LLM.
+
+Usage: python benchmarks/document_search_benchmark.py
+"""
+
+import os
+import random
+import sys
+import time
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from action_sets.long_form_writing.SDF import Document
+from action_sets.long_form_writing.document_index import DocumentIndex
+
+NUM_SECTIONS = 500
+ELEMENTS_PER_SECTION = 20
+WORDS_PER_ELEMENT = 100
+NUM_ITERATIONS = 20
+WORDS = "the a of and to in was her his she he it that with as had for on at by from they into castle river night storm letter sword harbor forest king queen dawn secret promise journey winter bridge tower lantern".split()
+CHARACTERS = ["Alice", "Bram", "Corin", "Dara", "Elias", "Fenna", "Garrick", "Hale"]
+
+
+def random_text():
+    words = random.choices(WORDS, k=WORDS_PER_ELEMENT)
+    words[random.randrange(len(words))] = random.choice(CHARACTERS)
+    return " ".join(words)
+
+
+def build_document():
+    random.seed(0)
+    document = Document(title="Benchmark Document")
+    for i in range(NUM_SECTIONS):
+        document.add_section(i, title=f"Chapter {i + 1}")
+        section = document.sections[i]
+        for j in range(ELEMENTS_PER_SECTION):
+            section.add_element(j, random_text())
+    return document
+
+
+def run(document, edits, queries, incremental):
+    """
+    Returns (time in seconds, results of each search).
+    """
+    all_results = []
+    start_time = time.perf_counter()
+    for (section_index, element_index, text), query in zip(edits, queries):
+        document.sections[section_index].edit_element(element_index, text)
+        search_index = document.get_search_index() if incremental else DocumentIndex(document)
+        all_results.append([(round(score, 6), section_index, element_index) for score, section_index, element_index, _ in search_index.search(query)])
+    return time.perf_counter() - start_time, all_results
+
+
+def main():
+    document = build_document()
+    print(f"Searching a document of {document.get_word_count()} words in {NUM_SECTIONS} sections, after each of {NUM_ITERATIONS} edits\n")
+
+    random.seed(1)
+    edits = [(random.randrange(NUM_SECTIONS), random.randrange(ELEMENTS_PER_SECTION), random_text()) for _ in range(NUM_ITERATIONS)]
+    queries = [f"{random.choice(CHARACTERS)} {random.choice(['letter', 'sword', 'secret', 'promise'])}" for _ in range(NUM_ITERATIONS)]
+
+    rebuild_time, rebuild_results = run(build_document(), edits, queries, incremental=False)
+    start_time = time.perf_counter()
+    document.get_search_index().update()
+    build_time = time.perf_counter() - start_time
+    incremental_time, incremental_results = run(document, edits, queries, incremental=True)
+    assert incremental_results == rebuild_results, "The incremental index gives different results"
+
+    print(f"{'':<28} {'time per search (ms)':>21}")
+    print(f"{'rebuild index every search':<28} {rebuild_time / NUM_ITERATIONS * 1000:>21.1f}")
+    print(f"{'incremental index':<28} {incremental_time / NUM_ITERATIONS * 1000:>21.1f}")
+    print(f"\nInitial index build: {build_time:.2f}s")
+
+    result_chars = sum(len(document.search(query)) for query in queries)
+    section_chars = 0
+    for query in queries:
+        section_indices = {section_index for _, section_index, _, _ in document.get_search_index().search(query)}
+        section_chars += sum(document.sections[i].get_stats()[1] for i in section_indices)
+    print(f"Search results: {result_chars / NUM_ITERATIONS:.0f} characters per search, vs {section_chars / NUM_ITERATIONS:.0f} in the full text of the sections they're from")
+
+
+if __name__ == "__main__":
+    main()
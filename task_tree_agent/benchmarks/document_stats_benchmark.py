@@ -0,0 +1,59 @@
+"""
+Benchmark for the word, character and token counts of an SDF Document.
+
+Builds documents of increasing size, then repeatedly edits one element and reads the document's word count (as format_prompt_context() does on every prompt). Compares recounting every element's words after each edit, as the word count used to be computed, against the incrementally maintained counts (Document.get_stats()).
+
+Usage: python benchmarks/document_stats_benchmark.py
+"""
+
+import os
+import sys
+import time
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from action_sets.long_form_writing.SDF import Document
+
+PARAGRAPH = "The quick brown fox jumps over the lazy dog while the committee deliberates on the budget. " * 20
+NUM_EDITS = 50
+
+
+def build_document(num_sections, elements_per_section):
+    document = Document(title="Benchmark Document")
+    for i in range(num_sections):
+        document.add_section(i, title=f"Title {i}")
+        for j in range(elements_per_section):
+            document.sections[i].add_element(j, PARAGRAPH)
+    return document
+
+
+def legacy_word_count(document):
+    # the word count as it used to be computed: every element of every section re-split
+    return sum(len(element.content.split()) for section in document.sections for element in section.elements)
+
+
+def time_edits(document, word_count_function):
+    """
+    Returns the average time to edit an element and read the word count, in milliseconds.
+    """
+    start_time = time.perf_counter()
+    for i in range(NUM_EDITS):
+        document.sections[i % len(document.sections)].edit_element(0, PARAGRAPH + f" Edit {i}.")
+        word_count_function(document)
+    return (time.perf_counter() - start_time) / NUM_EDITS * 1e3
+
+
+def main():
+    print(f"{'words':>10} {'recount (ms)':>13} {'incremental (ms)':>17}")
+    for num_sections in [10, 100, 500]:
+        document = build_document(num_sections, 20)
+        assert legacy_word_count(document) == document.get_word_count()
+        recount_time = time_edits(document, legacy_word_count)
+        incremental_time = time_edits(document, Document.get_word_count)
+        assert legacy_word_count(document) == document.get_word_count()
+        print(f"{document.get_word_count():>10} {recount_time:>13.3f} {incremental_time:>17.3f}")
+
+
+if __name__ == "__main__":
+    main()
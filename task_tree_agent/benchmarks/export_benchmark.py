@@ -0,0 +1,114 @@
+"""
+Benchmark for exporting SDF documents.
+
+Builds a synthetic document of about a million words, then exports it with the original exporters (which built the whole document as one string with repeated +=, re-implemented here as legacy_format_txt and legacy_format_markdown) and with the streaming writers in export_document.py, which write it to the file a section at a time. Reports the time and the peak memory used by each export, not counting the document itself, and checks that the txt and markdown output is unchanged.
+
+Time and memory are measured in separate runs, since tracing memory allocations slows everything down.
+
+Usage: python benchmarks/export_benchmark.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from action_sets.long_form_writing.SDF import Document
+from action_sets.long_form_writing.export_document import WRITERS, export_document
+
+PARAGRAPH = "The quick brown fox jumps over the lazy dog while the committee deliberates on the budget. " * 7 # 112 words
+NUM_SECTIONS = 500
+ELEMENTS_PER_SECTION = 20
+
+
+def build_document():
+    document = Document(title="Benchmark Document")
+    for i in range(NUM_SECTIONS):
+        document.add_section(i, title=f"Chapter {i + 1}")
+        section = document.sections[i]
+        for j in range(ELEMENTS_PER_SECTION):
+            # a distinct string for every element, as in a real document
+            section.add_element(j, f"{i}.{j} {PARAGRAPH}")
+    document.update_toc()
+    return document
+
+
+def legacy_format_txt(document):
+    formatted = f"Title: {document.title}\n\nTable of Contents:\n"
+    for index, title in enumerate(document.table_of_contents):
+        formatted += f"{index + 1}. {title}\n"
+    formatted += "\n"
+    for section in document.sections:
+        section_formatted = f"# {section.title}\n\n"
+        for element in section.elements:
+            section_formatted += f"{element.content}\n\n"
+        formatted += section_formatted
+    return formatted
+
+
+def legacy_format_markdown(document):
+    formatted = f"# {document.title}\n\n## Table of Contents\n"
+    for index, title in enumerate(document.table_of_contents):
+        formatted += f"{index + 1}. [{title}](#{title.lower().replace(' ', '-')})\n"
+    formatted += "\n"
+    for section in document.sections:
+        section_formatted = f"## {section.title}\n\n"
+        for element in section.elements:
+            section_formatted += f"{element.content}\n\n"
+        formatted += section_formatted
+    return formatted
+
+
+def legacy_export(format_function, output_path):
+    def export(document):
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(format_function(document))
+    return export
+
+
+def measure(export, document):
+    """
+    Returns (time in seconds, peak memory in MB).
+    """
+    start_time = time.perf_counter()
+    export(document)
+    elapsed = time.perf_counter() - start_time
+
+    tracemalloc.start()
+    export(document)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak_memory / 1e6
+
+
+def main():
+    document = build_document()
+    print(f"Exporting a document of {document.get_word_count()} words in {NUM_SECTIONS} sections\n")
+
+    with tempfile.TemporaryDirectory() as directory:
+        exports = [
+            ("txt, legacy", "legacy.txt", legacy_export(legacy_format_txt, os.path.join(directory, "legacy.txt"))),
+            ("md, legacy", "legacy.md", legacy_export(legacy_format_markdown, os.path.join(directory, "legacy.md"))),
+        ]
+        for format in WRITERS:
+            file_name = f"document.{format}"
+            exports.append((f"{format}, streaming", file_name, lambda document, path=os.path.join(directory, file_name): export_document(document, path)))
+
+        print(f"{'':<18} {'time (s)':>9} {'peak memory (MB)':>17} {'file size (MB)':>15}")
+        for name, file_name, export in exports:
+            elapsed, peak_memory = measure(export, document)
+            file_size = os.path.getsize(os.path.join(directory, file_name)) / 1e6
+            print(f"{name:<18} {elapsed:>9.3f} {peak_memory:>17.1f} {file_size:>15.1f}")
+
+        for format in ["txt", "md"]:
+            with open(os.path.join(directory, f"legacy.{format}"), "rb") as f, open(os.path.join(directory, f"document.{format}"), "rb") as g:
+                assert f.read() == g.read(), f"The streaming {format} output differs from the legacy output"
+        print("\nThe streaming txt and md output is identical to the legacy output")
+
+
+if __name__ == "__main__":
+    main()
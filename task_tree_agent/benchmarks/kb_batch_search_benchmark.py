@@ -0,0 +1,82 @@
+"""
+Benchmark for batched knowledge base searches.
+
+Simulates agent responses that each request SEARCHES_PER_RESPONSE superpowered_kb_search actions in a row, and runs them through an ActionInterface twice: once with the searches performed one at a time, as before, and once with them coalesced into one query_many() call per response. The searches go to a LocalKnowledgeBackend that takes SEARCH_LATENCY seconds per search, like a call to the Superpowered API, and to a LocalVectorBackend over a synthetic corpus. Reports the time taken and the length of the action log the agent sees, which is shorter when a batch's searches return overlapping passages.
+
+Usage: python benchmarks/kb_batch_search_benchmark.py
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.action_interface import ActionInterface
+from action_sets.knowledge_retrieval.knowledge_base import LocalKnowledgeBackend, SuperpoweredKnowledgeBase
+from action_sets.knowledge_retrieval.knowledge_retrieval_action_set import knowledge_retrieval_action_set
+from action_sets.knowledge_retrieval.vector_index import LocalVectorBackend, VectorIndex
+
+SEARCH_LATENCY = 0.02
+NUM_RESPONSES = 20
+SEARCHES_PER_RESPONSE = 5
+TOPICS = ["registration of investment advisers", "custody of client funds", "advertising rules", "fiduciary duty", "performance fees", "books and records", "exemptions for family offices", "anti-fraud provisions"]
+ASPECTS = ["obligations", "exceptions", "penalties", "deadlines", "definitions"]
+
+
+def build_passages():
+    return [f"Section {i}: this passage discusses the {aspect} for {topic}, and how they apply to small advisers." for i, (topic, aspect) in enumerate((topic, aspect) for topic in TOPICS for aspect in ASPECTS)]
+
+
+def build_responses():
+    # every search is distinct, so the query cache doesn't hide the cost of the searches
+    random.seed(0)
+    responses = []
+    for response_number in range(NUM_RESPONSES):
+        topic = random.choice(TOPICS)
+        actions = [{"function": "superpowered_kb_search", "arguments": {"query": f"{aspect} for {topic} ({response_number})"}} for aspect in random.sample(ASPECTS, SEARCHES_PER_RESPONSE)]
+        responses.append("Part 1) Temporary scratchpad\nLet me look these up.\n\nPart 2) Action requests\n" + json.dumps(actions))
+    return responses
+
+
+def make_action_interface(backend, batched):
+    action_set = knowledge_retrieval_action_set.copy(SuperpoweredKnowledgeBase("benchmark", backend=backend))
+    if not batched:
+        for action in action_set.action_list:
+            action.batch_function = None
+    return ActionInterface([action_set])
+
+
+def run(backend, responses, batched):
+    action_interface = make_action_interface(backend, batched)
+    start_time = time.perf_counter()
+    for response in responses:
+        action_interface.parse_response_and_perform_actions(response)
+    elapsed = time.perf_counter() - start_time
+    return elapsed, len(action_interface.format_agent_action_log())
+
+
+def main():
+    passages = build_passages()
+    responses = build_responses()
+    print(f"{NUM_RESPONSES} responses with {SEARCHES_PER_RESPONSE} searches each, {SEARCH_LATENCY * 1000:.0f}ms per search\n")
+
+    with tempfile.TemporaryDirectory() as directory:
+        VectorIndex.build(directory, ((f"passage_{i}", passage) for i, passage in enumerate(passages)))
+        backends = [
+            ("local, simulated API", lambda: LocalKnowledgeBackend(passages, latency=SEARCH_LATENCY)),
+            ("vector index", lambda: LocalVectorBackend(directory)),
+        ]
+        print(f"{'':<22} {'':<10} {'time (s)':>9} {'log chars':>10}")
+        for name, make_backend in backends:
+            for batched in [False, True]:
+                elapsed, log_length = run(make_backend(), responses, batched)
+                print(f"{name:<22} {'batched' if batched else 'serial':<10} {elapsed:>9.3f} {log_length:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark for knowledge base searches.
+
+Replays the searches an agent makes over a run, many of which repeat an earlier search, sometimes with different case or punctuation, against a LocalKnowledgeBackend that takes SEARCH_LATENCY seconds per search, like a call to the Superpowered API. Compares the original behaviour, where every search also looked up the knowledge base handle (another LOOKUP_LATENCY round trip) and nothing was cached, against SuperpoweredKnowledgeBase with its query cache.
+
+Usage: python benchmarks/knowledge_base_benchmark.py
+"""
+
+import os
+import random
+import sys
+import time
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from action_sets.knowledge_retrieval.knowledge_base import LocalKnowledgeBackend, SuperpoweredKnowledgeBase
+
+SEARCH_LATENCY = 0.02
+LOOKUP_LATENCY = 0.005
+NUM_ITERATIONS = 40
+TOPICS = ["registration of investment advisers", "custody of client funds", "advertising rules", "fiduciary duty", "performance fees", "books and records", "exemptions for family offices", "anti-fraud provisions"]
+
+
+def build_passages():
+    return [f"Section {i}: this passage discusses {topic}, including the obligations that apply and the exceptions to them." for i, topic in enumerate(TOPICS * 50)]
+
+
+def build_queries():
+    # each iteration, the agent searches for a couple of topics, often ones it has searched for before
+    random.seed(0)
+    queries = []
+    for _ in range(NUM_ITERATIONS):
+        for topic in random.sample(TOPICS[:5], 2):
+            query = random.choice([topic, topic.capitalize(), f"{topic}?", f"  {topic.upper()}"])
+            queries.append(f"What are the rules on {query}" if random.random() < 0.2 else query)
+    return queries
+
+
+class LegacyBackend(LocalKnowledgeBackend):
+    # every search looked up the knowledge base handle again before querying it
+    def query(self, query, retriever_top_k, reranker_top_k):
+        time.sleep(LOOKUP_LATENCY)
+        return super().query(query, retriever_top_k, reranker_top_k)
+
+
+def run(knowledge_base, queries, use_cache):
+    start_time = time.perf_counter()
+    for query in queries:
+        if use_cache:
+            knowledge_base.query(query)
+        else:
+            knowledge_base.get_backend().query(query, knowledge_base.retriever_top_k, knowledge_base.reranker_top_k)
+    return time.perf_counter() - start_time
+
+
+def main():
+    passages = build_passages()
+    queries = build_queries()
+    print(f"{len(queries)} searches, {len(set(queries))} distinct query strings\n")
+
+    legacy_time = run(SuperpoweredKnowledgeBase("benchmark", backend=LegacyBackend(passages, latency=SEARCH_LATENCY)), queries, use_cache=False)
+    knowledge_base = SuperpoweredKnowledgeBase("benchmark", backend=LocalKnowledgeBackend(passages, latency=SEARCH_LATENCY))
+    cached_time = run(knowledge_base, queries, use_cache=True)
+    stats = knowledge_base.get_query_cache().get_stats()
+
+    print(f"{'':<26} {'time (s)':>9} {'backend calls':>14}")
+    print(f"{'legacy (no cache)':<26} {legacy_time:>9.2f} {len(queries):>14}")
+    print(f"{'query cache':<26} {cached_time:>9.2f} {stats['misses']:>14}")
+    print(f"\nCache hit rate: {stats['hit_rate']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
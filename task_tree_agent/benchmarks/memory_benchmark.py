@@ -0,0 +1,118 @@
+"""
+Memory and pickling benchmark for the task tree and SDF document classes.
+
+Builds a synthetic large document (sections full of short elements) and a large task tree, once with the slotted Task, Section and Element classes and once with dict-backed stand-ins that hold the same attributes, and reports memory use (via tracemalloc), pickle size and pickle/unpickle time for each.
+
+Element content is kept short so that per-object overhead, rather than the text itself, dominates.
+
+Usage: python benchmarks/memory_benchmark.py
+"""
+
+import os
+import pickle
+import sys
+import time
+import tracemalloc
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from action_sets.task_tree.task_class import Task
+from action_sets.long_form_writing.SDF import Element, Section
+
+
+# dict-backed stand-ins for the classes, holding the same attributes as the slotted versions (including the checkpoint version counter)
+class DictTask:
+    def __init__(self, description, complete=False, parent=None):
+        self.description = description
+        self._complete = complete
+        self.subtasks = []
+        self.parent = parent
+        self._index = 0
+        self._num_complete_subtasks = 0
+        self._num_ready = 1
+        self._scan_from = 0
+        self._version = 0
+
+    def add_subtask(self, subtask):
+        subtask.parent = self
+        subtask._index = len(self.subtasks)
+        self.subtasks.append(subtask)
+        self._num_ready += 1
+
+
+class DictElement:
+    def __init__(self, content):
+        self.content = content
+        self._version = 0
+
+
+class DictSection:
+    def __init__(self, section_identifier='', title='', summary=''):
+        self.section_identifier = section_identifier
+        self.title = title
+        self.summary = summary
+        self.outline = ""
+        self.elements = []
+        self._version = 0
+
+    def add_element(self, index, content):
+        self.elements.insert(index, DictElement(content))
+
+
+def build_document(section_class, num_sections, elements_per_section):
+    sections = []
+    for i in range(num_sections):
+        section = section_class(f"Section {i + 1}", f"Title {i}", f"Summary {i}")
+        for j in range(elements_per_section):
+            section.add_element(j, f"Element {j}")
+        sections.append(section)
+    return sections
+
+
+def build_task_tree(task_class, fanout, depth):
+    root = task_class("Root task")
+    level = [root]
+    for _ in range(depth):
+        next_level = []
+        for task in level:
+            for i in range(fanout):
+                subtask = task_class(f"Subtask {i}")
+                task.add_subtask(subtask)
+                next_level.append(subtask)
+        level = next_level
+    return root
+
+
+def measure(name, build):
+    tracemalloc.start()
+    obj = build()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start_time = time.perf_counter()
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    dump_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    pickle.loads(data)
+    load_time = time.perf_counter() - start_time
+
+    print(f"{name:<28} {memory / 1e6:>10.1f} {len(data) / 1e6:>12.1f} {dump_time * 1e3:>10.0f} {load_time * 1e3:>10.0f}")
+
+
+def main():
+    num_sections, elements_per_section = 1_000, 50
+    fanout, depth = 6, 6
+    sys.setrecursionlimit(100_000) # the task tree is pickled recursively
+
+    print(f"Document: {num_sections} sections x {elements_per_section} elements. Task tree: fanout {fanout}, depth {depth}.\n")
+    print(f"{'':<28} {'memory (MB)':>10} {'pickle (MB)':>12} {'dump (ms)':>10} {'load (ms)':>10}")
+    measure("document, dict-backed", lambda: build_document(DictSection, num_sections, elements_per_section))
+    measure("document, slotted", lambda: build_document(Section, num_sections, elements_per_section))
+    measure("task tree, dict-backed", lambda: build_task_tree(DictTask, fanout, depth))
+    measure("task tree, slotted", lambda: build_task_tree(Task, fanout, depth))
+
+
+if __name__ == "__main__":
+    main()
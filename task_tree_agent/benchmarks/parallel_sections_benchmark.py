@@ -0,0 +1,52 @@
+"""
+Benchmark for editing many sections of a document at once.
+
+Uses a FakeLLMClient with a fixed latency per call, and drafts every section of a 20-section document, first by calling Document.edit_section() once per section, then with a single Document.edit_sections() call that makes the LLM calls in parallel.
+
+Usage: python benchmarks/parallel_sections_benchmark.py
+"""
+
+import json
+import os
+import sys
+import time
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.llm_client import FakeLLMClient
+from action_sets.long_form_writing.SDF import Document
+
+LATENCY = 0.5 # seconds per LLM call
+NUM_SECTIONS = 20
+RESPONSE = "Part 1) Temporary scratchpad\nI'll draft the section.\n\nPart 2) Action requests\n" + json.dumps([{"function": "add_element", "arguments": {"element_index": 0, "content": "Draft paragraph. " * 100}}])
+
+
+def build_document():
+    document = Document(title="Benchmark Document", llm_client=FakeLLMClient(default_response=RESPONSE, latency=LATENCY))
+    for i in range(NUM_SECTIONS):
+        document.add_section(i, title=f"Chapter {i}", summary=f"Summary of chapter {i}.")
+    return document
+
+
+def main():
+    section_edits = [(i, "Draft this chapter.") for i in range(NUM_SECTIONS)]
+
+    document = build_document()
+    start_time = time.perf_counter()
+    for section_index, editing_instructions in section_edits:
+        document.edit_section(section_index, editing_instructions)
+    sequential_time = time.perf_counter() - start_time
+
+    print(f"{NUM_SECTIONS} sections, {LATENCY}s per LLM call\n")
+    print(f"edit_section() per section: {sequential_time:.2f}s")
+    for max_workers in [4, 8, 20]:
+        document = build_document()
+        start_time = time.perf_counter()
+        document.edit_sections(section_edits, max_workers=max_workers)
+        parallel_time = time.perf_counter() - start_time
+        print(f"edit_sections(max_workers={max_workers}): {parallel_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
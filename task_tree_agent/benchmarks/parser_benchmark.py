@@ -0,0 +1,102 @@
+"""
+Benchmark for parsing the action requests in LLM responses.
+
+Runs a corpus of responses through the original parser (find the first "[" and json.loads everything after it), re-implemented here as legacy_parse_action_list, and through agent.response_parser.parse_action_list. Reports the number of actions recovered out of the number requested, and the average parse time.
+
+The built-in corpus covers the ways LLM responses commonly deviate from the requested format: brackets in the scratchpad, trailing prose, code fences, Python literal syntax, trailing commas, a single malformed action, output cut off by max_tokens, and a missing Part 2 header. Responses recorded with RecordingLLMClient can be added to the corpus by passing the recording's path; since the number of actions requested in those isn't known, they only count towards parse time and the number of actions recovered.
+
+Usage: python benchmarks/parser_benchmark.py [recording.jsonl ...]
+"""
+
+import json
+import os
+import sys
+import time
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.response_parser import parse_action_list
+
+SCRATCHPAD = "Part 1) Temporary scratchpad\nThe current section needs an introduction and a summary of the key findings. I'll add the introduction first, then update the summary.\n\n"
+
+
+def build_actions(num_actions):
+    return [{"function": "add_element", "arguments": {"element_index": i, "content": f"Paragraph {i} of the section, which says something about the topic at hand. " * 5}} for i in range(num_actions)]
+
+
+def build_corpus():
+    """
+    Returns a list of (name, response, number of actions requested).
+    """
+    actions = build_actions(3)
+    actions_json = json.dumps(actions, indent=4)
+    corpus = [
+        ("well formed", f"{SCRATCHPAD}Part 2) Action requests\n{actions_json}", 3),
+        ("brackets in scratchpad", f"{SCRATCHPAD.strip()} Elements [0] and [1] are {{empty}}.\n\nPart 2) Action requests\n{actions_json}", 3),
+        ("trailing prose", f"{SCRATCHPAD}Part 2) Action requests\n{actions_json}\n\nLet me know if you'd like any other changes!", 3),
+        ("code fence", f"{SCRATCHPAD}Part 2) Action requests\n```json\n{actions_json}\n```", 3),
+        ("python literals", f"{SCRATCHPAD}Part 2) Action requests\n{repr(actions)}", 3),
+        ("trailing commas", f"{SCRATCHPAD}Part 2) Action requests\n{actions_json[:-2]},\n]", 3),
+        ("one malformed action", f"{SCRATCHPAD}Part 2) Action requests\n{actions_json[:-2]},\n    {{\"function\": \"delete_element\", \"arguments\": {{\"element_index\": 0,,}}}}\n]", 4),
+        ("cut off", f"{SCRATCHPAD}Part 2) Action requests\n{actions_json[:-60]}", 3),
+        ("missing header", f"{SCRATCHPAD}{actions_json}", 3),
+        ("long response", f"{SCRATCHPAD}Part 2) Action requests\n{json.dumps(build_actions(20), indent=4)}", 20),
+    ]
+    return corpus
+
+
+def load_recordings(paths):
+    corpus = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                if line.strip():
+                    corpus.append((f"{os.path.basename(path)}:{i + 1}", json.loads(line)["response"], None))
+    return corpus
+
+
+def legacy_parse_action_list(response):
+    # the original parser: everything from the first "[" must be a valid JSON list
+    actions_json_str = response.strip()[response.strip().find("["):]
+    try:
+        return json.loads(actions_json_str)
+    except json.JSONDecodeError:
+        return None
+
+
+def parse(parser, response, num_repeats):
+    start_time = time.perf_counter()
+    for _ in range(num_repeats):
+        action_dicts = parser(response)
+    elapsed = (time.perf_counter() - start_time) / num_repeats
+    if isinstance(action_dicts, tuple):
+        action_dicts = action_dicts[0]
+    num_recovered = len([action_dict for action_dict in action_dicts or [] if isinstance(action_dict, dict) and "function" in action_dict])
+    return num_recovered, elapsed * 1e6
+
+
+def main():
+    corpus = build_corpus() + load_recordings(sys.argv[1:])
+    num_repeats = 200
+
+    print(f"{'response':<26} {'requested':>9} {'legacy recovered':>17} {'new recovered':>14} {'legacy (us)':>12} {'new (us)':>9}")
+    totals = {"requested": 0, "legacy": 0, "new": 0, "legacy_time": 0.0, "new_time": 0.0}
+    for name, response, num_requested in corpus:
+        legacy_recovered, legacy_time = parse(legacy_parse_action_list, response, num_repeats)
+        new_recovered, new_time = parse(parse_action_list, response, num_repeats)
+        requested_str = str(num_requested) if num_requested is not None else "?"
+        print(f"{name[:26]:<26} {requested_str:>9} {legacy_recovered:>17} {new_recovered:>14} {legacy_time:>12.1f} {new_time:>9.1f}")
+        if num_requested is not None:
+            totals["requested"] += num_requested
+            totals["legacy"] += legacy_recovered
+            totals["new"] += new_recovered
+        totals["legacy_time"] += legacy_time
+        totals["new_time"] += new_time
+
+    print(f"\nActions recovered from the built-in corpus: legacy {totals['legacy']}/{totals['requested']}, new {totals['new']}/{totals['requested']}")
+    print(f"Average parse time: legacy {totals['legacy_time'] / len(corpus):.1f}us, new {totals['new_time'] / len(corpus):.1f}us")
+
+
+if __name__ == "__main__":
+    main()
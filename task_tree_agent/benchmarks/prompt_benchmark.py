@@ -0,0 +1,75 @@
+"""
+Benchmark for building the agent prompt as the document grows.
+
+Builds an Agent whose writing action set points at a synthetic document, and measures the time to build the prompt (Agent.build_prompt) at different document sizes:
+- uncached: every prompt fragment is rebuilt from scratch, as it was before the fragments were cached
+- cached, no changes: nothing changed since the last prompt, so every fragment is reused
+- cached, one edit: one element was edited since the last prompt, so the document context is re-rendered, but the word counts are only updated by the difference the edit made
+
+Usage: python benchmarks/prompt_benchmark.py
+"""
+
+import os
+import sys
+import time
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.agent_class import Agent
+from action_sets.task_tree.task_tree_management import task_tree_management_action_set
+from action_sets.long_form_writing.writing_action_set import writing_action_set
+from action_sets.long_form_writing.SDF import Document
+
+PARAGRAPH = "The quick brown fox jumps over the lazy dog while the committee deliberates on the budget. " * 20
+
+
+def build_agent(num_sections, elements_per_section):
+    document = Document(title="Benchmark Document", human_notes="Some notes.")
+    for i in range(num_sections):
+        document.add_section(i, title=f"Title {i}", summary=f"Summary of section {i}.")
+        for j in range(elements_per_section):
+            document.sections[i].add_element(j, PARAGRAPH)
+    action_sets = [task_tree_management_action_set.copy(), writing_action_set.copy(document)]
+    agent = Agent("Write a long document.", action_sets, save_path=os.devnull)
+    return agent, document
+
+
+def clear_caches(agent, document):
+    agent.action_interface.__dict__.pop("_prompt_fragment_cache", None)
+    document.__dict__.pop("_prompt_context_cache", None)
+    document.__dict__.pop("_stats", None)
+    for section in document.sections:
+        object.__setattr__(section, "_stats", None)
+
+
+def time_build_prompt(agent, num_iterations, before_each=None):
+    """
+    Returns the average time to build the prompt, in milliseconds.
+    """
+    current_task = agent.start_iteration()
+    total_time = 0
+    for _ in range(num_iterations):
+        if before_each is not None:
+            before_each()
+        start_time = time.perf_counter()
+        agent.build_prompt(current_task, "")
+        total_time += time.perf_counter() - start_time
+    return total_time / num_iterations * 1e3
+
+
+def main():
+    num_iterations = 20
+    elements_per_section = 20
+    print(f"{'words':>10} {'uncached (ms)':>14} {'cached, no changes (ms)':>24} {'cached, one edit (ms)':>22}")
+    for num_sections in [10, 100, 500]:
+        agent, document = build_agent(num_sections, elements_per_section)
+
+        uncached_time = time_build_prompt(agent, num_iterations, lambda: clear_caches(agent, document))
+        cached_time = time_build_prompt(agent, num_iterations)
+        edited_time = time_build_prompt(agent, num_iterations, lambda: document.sections[0].edit_element(0, PARAGRAPH))
+        print(f"{document.get_word_count():>10} {uncached_time:>14.3f} {cached_time:>24.3f} {edited_time:>22.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark for how much of each prompt a backend's prompt cache could reuse.
+
+Simulates agent iterations (an action log entry added each iteration, an occasional edit to the document, occasional human input), and edit_section() prompts for every section of the document, with each prompt layout. Reports the average fraction of each prompt that's shared with the start of the previous prompt of the same kind, as measured by PrefixTracker.
+
+Usage: python benchmarks/prompt_prefix_benchmark.py
+"""
+
+import os
+import sys
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.agent_class import Agent
+from agent.prompt import PROMPT_TEMPLATES
+from action_sets.task_tree.task_tree_management import task_tree_management_action_set
+from action_sets.long_form_writing.writing_action_set import writing_action_set
+from action_sets.long_form_writing.SDF import Document
+
+PARAGRAPH = "The quick brown fox jumps over the lazy dog while the committee deliberates on the budget. " * 20
+NUM_SECTIONS = 10
+ELEMENTS_PER_SECTION = 5
+NUM_ITERATIONS = 20
+
+
+def build_agent(prompt_layout):
+    document = Document(title="Benchmark Document", human_notes="Some notes.", prompt_layout=prompt_layout)
+    for i in range(NUM_SECTIONS):
+        document.add_section(i, title=f"Title {i}", summary=f"Summary of section {i}.")
+        for j in range(ELEMENTS_PER_SECTION):
+            document.sections[i].add_element(j, PARAGRAPH)
+    action_sets = [task_tree_management_action_set.copy(), writing_action_set.copy(document)]
+    agent = Agent("Write a long document.", action_sets, save_path=os.devnull, prompt_layout=prompt_layout)
+    return agent, document
+
+
+def main():
+    print(f"{'layout':<15} {'agent prompt shared':>20} {'edit_section prompt shared':>27}")
+    for prompt_layout in PROMPT_TEMPLATES:
+        agent, document = build_agent(prompt_layout)
+        current_task = agent.start_iteration()
+        for i in range(NUM_ITERATIONS):
+            human_input = "Make it more concise." if i % 5 == 0 else ""
+            agent.build_prompt(current_task, human_input)
+            agent.action_interface.add_to_action_log(f"Action: example_action()\nParameters: {{}}\nOutput: iteration {i}")
+            if human_input:
+                agent.human_input_list.append(human_input)
+            if i % 4 == 0:
+                document.sections[i % NUM_SECTIONS].edit_element(0, PARAGRAPH + f" Edit {i}.")
+
+        for i in range(NUM_SECTIONS):
+            document.create_edit_section_prompt(i, "Tighten the prose in this section.")
+
+        print(f"{prompt_layout:<15} {agent.prompt_prefix_tracker.get_shared_fraction():>20.0%} {document.prompt_prefix_tracker.get_shared_fraction():>27.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark for the on-disk LLM response cache.
+
+Sends a mix of repeated and new prompts through a FakeLLMClient with a fixed latency, with and without a CachedLLMClient in front of it, and reports the total time and the cache's hit rate. The repeated prompts stand in for a resumed or re-run session asking for the same analyses again.
+
+Usage: python benchmarks/response_cache_benchmark.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.llm_client import FakeLLMClient
+from agent.response_cache import CachedLLMClient, ResponseCache
+
+LATENCY = 0.05 # seconds per LLM call
+NUM_CALLS = 200
+NUM_DISTINCT_PROMPTS = 50
+
+
+def build_prompts():
+    rng = random.Random(0)
+    return [f"Analyze section {rng.randrange(NUM_DISTINCT_PROMPTS)} of the document. " * 50 for _ in range(NUM_CALLS)]
+
+
+def run(llm_client, prompts):
+    start_time = time.perf_counter()
+    for prompt in prompts:
+        llm_client.complete_cached(prompt, model_name="gpt-4", max_tokens=500)
+    return time.perf_counter() - start_time
+
+
+def main():
+    prompts = build_prompts()
+    uncached_time = run(FakeLLMClient(default_response="analysis " * 100, latency=LATENCY), prompts)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResponseCache(os.path.join(directory, "cache.sqlite"))
+        cached_time = run(CachedLLMClient(FakeLLMClient(default_response="analysis " * 100, latency=LATENCY), cache), prompts)
+        stats = cache.get_stats()
+        cache.close()
+
+    print(f"{NUM_CALLS} calls, {NUM_DISTINCT_PROMPTS} distinct prompts, {LATENCY * 1000:.0f}ms per LLM call\n")
+    print(f"Without cache: {uncached_time:.2f}s")
+    print(f"With cache:    {cached_time:.2f}s ({stats['hits']} hits, {stats['misses']} misses, hit rate {stats['hit_rate']:.0%}, {stats['bytes']} bytes stored)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark for streaming LLM responses with early action execution.
+
+Uses a FakeLLMClient that streams a multi-action response over a fixed generation time, and actions that each take a fixed time to perform (like edit_section, which makes its own LLM call). Compares the time per iteration when the whole response is waited for before any action is performed, against streaming the response and performing each action as soon as it has been requested.
+
+Usage: python benchmarks/streaming_benchmark.py
+"""
+
+import json
+import os
+import sys
+import time
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.action_interface import Action, ActionInterface, ActionSet
+from agent.llm_client import FakeLLMClient
+
+ACTION_TIME = 0.2 # seconds to perform each action
+GENERATION_TIME = 2.0 # seconds for the LLM to generate the whole response
+
+
+def perform_slow_action(content, action_set_object=None):
+    time.sleep(ACTION_TIME)
+    return "done"
+
+
+def build_response(num_actions):
+    actions_list = [{"function": "slow_action", "arguments": {"content": f"Content for action {i}. " * 20}} for i in range(num_actions)]
+    return f"Part 1) Temporary scratchpad\nI'll take {num_actions} actions.\n\nPart 2) Action requests\n{json.dumps(actions_list, indent=4)}"
+
+
+def build_action_interface():
+    action = Action(name="slow_action(content)", when_to_use="", arguments="", action_function=perform_slow_action)
+    return ActionInterface([ActionSet(action_list=[action], action_set_name="benchmark_action_set", action_set_object=None)])
+
+
+def main():
+    print(f"LLM generation time: {GENERATION_TIME}s, time per action: {ACTION_TIME}s\n")
+    print(f"{'actions':>8} {'wait for response (s)':>22} {'streaming (s)':>14}")
+    for num_actions in [1, 3, 5]:
+        llm_client = FakeLLMClient(default_response=build_response(num_actions), latency=GENERATION_TIME)
+
+        start_time = time.perf_counter()
+        build_action_interface().parse_response_and_perform_actions(llm_client.complete("prompt"))
+        full_response_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        build_action_interface().stream_response_and_perform_actions(llm_client.stream("prompt"))
+        streaming_time = time.perf_counter() - start_time
+
+        print(f"{num_actions:>8} {full_response_time:>22.2f} {streaming_time:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
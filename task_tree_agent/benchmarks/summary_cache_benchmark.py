@@ -0,0 +1,96 @@
+"""
+Benchmark for the hierarchical summary cache of SDF documents.
+
+Builds a synthetic document of about a million words whose sections have no summaries written by the agent, so the document context uses summaries made from their text. Then simulates an agent that edits one element and then builds an edit_section() prompt for a random section, NUM_ITERATIONS times. Compares the SummaryCache, which only remakes the summaries that an edit affects, with remaking every summary for each prompt. Reports the time per prompt and the number of summaries made per prompt, which with an LLMSummarizer would each be an LLM call.
+
+Also reports the size of the current section's context for one very long section, in full and as it's included in prompts.
+
+Usage: python benchmarks/summary_cache_benchmark.py
+"""
+
+import os
+import random
+import sys
+import time
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from action_sets.long_form_writing.SDF import Document
+
+NUM_SECTIONS = 500
+ELEMENTS_PER_SECTION = 20
+SENTENCES_PER_ELEMENT = 8
+NUM_ITERATIONS = 10
+LONG_SECTION_ELEMENTS = 300
+WORDS = "the a of and to in was her his she he it that with as had for on at by from they into castle river night storm letter sword harbor forest king queen dawn secret promise journey winter bridge tower lantern".split()
+CHARACTERS = ["Alice", "Bram", "Corin", "Dara", "Elias", "Fenna", "Garrick", "Hale"]
+
+
+def random_text():
+    sentences = []
+    for _ in range(SENTENCES_PER_ELEMENT):
+        words = [random.choice(CHARACTERS)] + random.choices(WORDS, k=11)
+        sentences.append(" ".join(words) + ".")
+    return " ".join(sentences)
+
+
+def build_document():
+    random.seed(0)
+    document = Document(title="Benchmark Document")
+    for i in range(NUM_SECTIONS):
+        document.add_section(i, title=f"Chapter {i + 1}")
+        section = document.sections[i]
+        for j in range(ELEMENTS_PER_SECTION):
+            section.add_element(j, random_text())
+    return document
+
+
+def run(document, edits, cached):
+    """
+    Returns (time in seconds, summaries made) for building a prompt after each edit.
+    """
+    summaries_made = 0
+    start_time = time.perf_counter()
+    for section_index, element_index, text, prompt_section_index in edits:
+        document.sections[section_index].edit_element(element_index, text)
+        if not cached:
+            document.__dict__.pop("_summary_cache", None)
+        summary_cache = document.get_summary_cache()
+        summaries_before = summary_cache.summaries_made
+        document.create_edit_section_prompt(prompt_section_index, "Continue the chapter.")
+        summaries_made += summary_cache.summaries_made - summaries_before
+    return time.perf_counter() - start_time, summaries_made
+
+
+def main():
+    document = build_document()
+    print(f"Building edit_section() prompts for a document of {document.get_word_count()} words in {NUM_SECTIONS} sections, after each of {NUM_ITERATIONS} edits\n")
+
+    random.seed(1)
+    edits = [(random.randrange(NUM_SECTIONS), random.randrange(ELEMENTS_PER_SECTION), random_text(), random.randrange(NUM_SECTIONS)) for _ in range(NUM_ITERATIONS)]
+
+    start_time = time.perf_counter()
+    document.create_edit_section_prompt(0, "Continue the chapter.")
+    first_time = time.perf_counter() - start_time
+    first_summaries = document.get_summary_cache().summaries_made
+    uncached_time, uncached_summaries = run(build_document(), edits, cached=False)
+    cached_time, cached_summaries = run(document, edits, cached=True)
+
+    print(f"{'':<24} {'time per prompt (ms)':>21} {'summaries per prompt':>21}")
+    print(f"{'no summary cache':<24} {uncached_time / NUM_ITERATIONS * 1000:>21.1f} {uncached_summaries / NUM_ITERATIONS:>21.1f}")
+    print(f"{'summary cache':<24} {cached_time / NUM_ITERATIONS * 1000:>21.1f} {cached_summaries / NUM_ITERATIONS:>21.1f}")
+    print(f"\nFirst prompt, summarizing the whole document: {first_time:.2f}s, {first_summaries} summaries")
+
+    long_section = document.sections[0]
+    for j in range(LONG_SECTION_ELEMENTS):
+        long_section.add_element(len(long_section.elements), random_text())
+    token_counter = document.get_summary_cache().token_counter
+    full_text = "".join(f"Element: {i}\n{element.content}\n\n" for i, element in enumerate(long_section.elements))
+    document.create_edit_section_prompt(0, "Continue the chapter.")
+    usage = document.last_prompt_usage
+    print(f"\nA section of {len(long_section.elements)} elements: {token_counter.count(full_text)} tokens in full, {usage.sections['current_section_context'][0]} in the prompt, which is {usage.get_total_tokens()} / {usage.budget} tokens, truncated sections: {', '.join(usage.get_truncated_sections()) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
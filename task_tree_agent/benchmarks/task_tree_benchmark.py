@@ -0,0 +1,98 @@
+"""
+Benchmark for finding the next task as the task tree grows.
+
+Simulates an agent that keeps breaking its current task into subtasks and completing leaf tasks, and measures the time per iteration (find the next task, render the local task tree, update the tree) at different tree sizes. The indexed lookup in Task.find_next_task is compared against the original full depth-first search, which is re-implemented here as full_scan_find_next_task.
+
+Usage: python benchmarks/task_tree_benchmark.py
+"""
+
+import os
+import random
+import sys
+import time
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from action_sets.task_tree.task_class import Task
+
+
+def full_scan_find_next_task(task):
+    # the original implementation: a full recursive search from the root on every call
+    if not task.complete and (not task.subtasks or all([subtask.complete for subtask in task.subtasks])):
+        return task
+
+    for subtask in task.subtasks:
+        next_task = full_scan_find_next_task(subtask)
+        if next_task:
+            return next_task
+    return None
+
+
+def get_depth(task):
+    depth = 0
+    while task.parent is not None:
+        task = task.parent
+        depth += 1
+    return depth
+
+
+def run_iterations(root, find_next_task, num_iterations, rng):
+    """
+    Runs num_iterations simulated agent iterations and returns the average time per iteration, in microseconds.
+    """
+    start_time = time.perf_counter()
+    for _ in range(num_iterations):
+        current_task = find_next_task(root)
+        if current_task is None:
+            break
+        current_task.get_local_task_tree()
+
+        if rng.random() < 0.3 and get_depth(current_task) < 6:
+            for i in range(rng.randint(2, 5)):
+                current_task.add_subtask(Task(f"Subtask {i}"))
+        else:
+            current_task.complete = True
+    return (time.perf_counter() - start_time) / num_iterations * 1e6
+
+
+def build_tree(num_tasks, depth=4):
+    """
+    Builds a tree with roughly num_tasks tasks, and completes the first half of the work in it, so there's a long completed prefix for a search to get through.
+    """
+    fanout = max(2, round(num_tasks ** (1 / depth)))
+    root = Task("Root task")
+    level = [root]
+    for _ in range(depth):
+        next_level = []
+        for task in level:
+            for i in range(fanout):
+                subtask = Task(f"Subtask {i}")
+                task.add_subtask(subtask)
+                next_level.append(subtask)
+        level = next_level
+
+    for _ in range(len(level) // 2):
+        root.find_next_task().complete = True
+    return root
+
+
+def count_tasks(task):
+    return 1 + sum(count_tasks(subtask) for subtask in task.subtasks)
+
+
+def main():
+    num_iterations = 200
+    print(f"{'tree size':>10} {'indexed (us/iter)':>18} {'full scan (us/iter)':>20}")
+    for num_tasks in [100, 1_000, 10_000, 100_000]:
+        # build two identical trees, one for each method
+        indexed_root = build_tree(num_tasks)
+        full_scan_root = build_tree(num_tasks)
+
+        indexed_time = run_iterations(indexed_root, lambda root: root.find_next_task(), num_iterations, random.Random(0))
+        full_scan_time = run_iterations(full_scan_root, full_scan_find_next_task, num_iterations, random.Random(0))
+        print(f"{count_tasks(indexed_root):>10} {indexed_time:>18.1f} {full_scan_time:>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
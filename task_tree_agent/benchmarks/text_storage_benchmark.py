@@ -0,0 +1,67 @@
+"""
+Benchmark for editing long elements.
+
+Grows a single element to book length one paragraph at a time, once by replacing the whole element each time (edit_element(index, content + paragraph), which copies all the existing text on every edit), and once with Section.append_text(), which adds a piece to the element's piece table instead. Also measures the memory used by keeping a snapshot of the element's text after every edit, which the piece table shares between versions.
+
+Usage: python benchmarks/text_storage_benchmark.py
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from action_sets.long_form_writing.SDF import Document
+
+PARAGRAPH = "\n\nThe quick brown fox jumps over the lazy dog while the committee deliberates on the budget. " * 5
+NUM_PARAGRAPHS = 400
+
+
+def build_section():
+    document = Document(title="Benchmark Document")
+    document.add_section(0, title="Chapter 1")
+    section = document.sections[0]
+    section.add_element(0, "Start.")
+    return section
+
+
+def grow(section, use_append, keep_snapshots, trace_memory):
+    """
+    Returns (time in seconds, peak memory in MB). Memory is only measured if trace_memory is set, since tracing slows everything down.
+    """
+    snapshots = []
+    if trace_memory:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    for _ in range(NUM_PARAGRAPHS):
+        if use_append:
+            section.append_text(0, PARAGRAPH)
+        else:
+            section.edit_element(0, section.elements[0].content + PARAGRAPH)
+        if keep_snapshots:
+            element = section.elements[0]
+            snapshots.append(element.get_piece_table() if use_append else element.content)
+    elapsed = time.perf_counter() - start_time
+    peak_memory = 0
+    if trace_memory:
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak_memory / 1e6
+
+
+def main():
+    print(f"Growing one element to {len(PARAGRAPH.split()) * NUM_PARAGRAPHS} words, {NUM_PARAGRAPHS} paragraphs at a time\n")
+    print(f"{'':<32} {'time (s)':>9} {'peak memory (MB)':>17}")
+    for use_append in [False, True]:
+        for keep_snapshots in [False, True]:
+            elapsed, _ = grow(build_section(), use_append, keep_snapshots, trace_memory=False)
+            _, peak_memory = grow(build_section(), use_append, keep_snapshots, trace_memory=True)
+            name = ("append_text" if use_append else "edit_element") + (", with snapshots" if keep_snapshots else "")
+            print(f"{name:<32} {elapsed:>9.3f} {peak_memory:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
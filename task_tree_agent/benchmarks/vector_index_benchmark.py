@@ -0,0 +1,78 @@
+"""
+Benchmark for the local vector index (action_sets/knowledge_retrieval/vector_index.py).
+
+Builds an index of a synthetic corpus, then searches it with queries made of a few words taken from a random chunk, and reports the time to build and open the index, the average search time with and without the BM25 prefilter, and how often the chunk the query was taken from is in the top 5 results.
+
+Usage: python benchmarks/vector_index_benchmark.py [number of documents]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from action_sets.knowledge_retrieval.vector_index import VectorIndex
+
+VOCABULARY_SIZE = 20000
+WORDS_PER_DOCUMENT = 2000
+NUM_QUERIES = 200
+WORDS_PER_QUERY = 6
+
+
+def build_corpus(num_documents):
+    random.seed(0)
+    vocabulary = [f"term{i}" for i in range(VOCABULARY_SIZE)]
+    weights = [1 / (i + 1) for i in range(VOCABULARY_SIZE)] # Zipf-like, as in natural language
+    for i in range(num_documents):
+        yield f"document_{i}.txt", " ".join(random.choices(vocabulary, weights=weights, k=WORDS_PER_DOCUMENT))
+
+
+def build_queries(index):
+    random.seed(1)
+    queries = []
+    for _ in range(NUM_QUERIES):
+        chunk_index = random.randrange(len(index))
+        words = index.chunks[chunk_index]["content"].split()
+        start = random.randrange(max(1, len(words) - WORDS_PER_QUERY))
+        queries.append((" ".join(words[start:start + WORDS_PER_QUERY]), index.chunks[chunk_index]["content"]))
+    return queries
+
+
+def run_queries(index, queries, prefilter_k):
+    """
+    Returns (average search time in ms, fraction of queries whose source chunk was in the top 5).
+    """
+    index.search(queries[0][0], prefilter_k=prefilter_k) # builds the BM25 index, if it's used
+    num_found = 0
+    start_time = time.perf_counter()
+    for query, source_content in queries:
+        results = index.search(query, retriever_top_k=100, reranker_top_k=5, prefilter_k=prefilter_k)
+        num_found += any(result["content"] == source_content for result in results)
+    return (time.perf_counter() - start_time) / len(queries) * 1e3, num_found / len(queries)
+
+
+def main():
+    num_documents = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as directory:
+        start_time = time.perf_counter()
+        VectorIndex.build(directory, build_corpus(num_documents))
+        build_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        index = VectorIndex(directory)
+        load_time = time.perf_counter() - start_time
+        print(f"{num_documents} documents, {len(index)} chunks: built in {build_time:.1f}s, opened in {load_time * 1e3:.0f}ms\n")
+
+        queries = build_queries(index)
+        print(f"{'':<24} {'search (ms)':>12} {'recall@5':>9}")
+        for name, prefilter_k in [("full vector scan", None), ("BM25 prefilter (2000)", 2000), ("BM25 prefilter (500)", 500)]:
+            search_time, recall = run_queries(index, queries, prefilter_k)
+            print(f"{name:<24} {search_time:>12.2f} {recall:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,6 @@ import sys
 # add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
 
-import pickle
 from agent.agent_class import Agent
 from action_sets.task_tree.task_tree_management import task_tree_management_action_set
 from action_sets.long_form_writing.SDF import Document
@@ -31,14 +30,16 @@ model_name = "gpt-4" # "gpt-3.5-turbo"
 # add necessary objects to the action sets
 writing_action_set.update_action_set_object(Document(title="Final Legal Analysis", human_notes=human_notes, section_type="Section", model_name=model_name))
 knowledge_retrieval_action_set.update_action_set_object(SuperpoweredKnowledgeBase(kb_title="Investment Advisers Act of 1940"))
+# to search a local copy of the act instead, build an index with `python action_sets/knowledge_retrieval/vector_index.py build investment_advisers_act_index investment_advisers_act.txt` and use (this needs NumPy):
+# from action_sets.knowledge_retrieval.vector_index import LocalVectorBackend
+# knowledge_retrieval_action_set.update_action_set_object(SuperpoweredKnowledgeBase(kb_title="Investment Advisers Act of 1940", backend=LocalVectorBackend("investment_advisers_act_index")))
 
 pick_up_where_we_left_off = True
 
 def main():
     if pick_up_where_we_left_off:
-        # Load the agent from a pickle file
-        with open(file_name, "rb") as f:
-            agent = pickle.load(f)
+        # Load the agent from its last checkpoint
+        agent = Agent.load(file_name)
     else:
         # Create an agent with a task description and action sets
         agent = Agent(
@@ -4,7 +4,6 @@ import sys
 # add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
 
-import pickle
 from agent.agent_class import Agent
 from action_sets.task_tree.task_tree_management import task_tree_management_action_set
 from action_sets.long_form_writing.SDF import Document
@@ -39,9 +38,8 @@ pick_up_where_we_left_off = False
 
 def main():
     if pick_up_where_we_left_off:
-        # Load the agent from a pickle file
-        with open(file_name, "rb") as f:
-            agent = pickle.load(f)
+        # Load the agent from its last checkpoint
+        agent = Agent.load(file_name)
     else:
         # Create an agent with a task description and action sets
         agent = Agent(
@@ -0,0 +1,131 @@
+"""
+Tests that consecutive requests for an action with a batch_function are performed together, and that the action log entries stay in the order the actions were requested, including when some of them fail.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import unittest
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.action_interface import Action, ActionInterface, ActionSet
+
+
+class Recorder:
+    # the action set object: records the batches it's called with
+    def __init__(self):
+        self.batches = []
+
+
+def lookup(action_set_object, query):
+    return lookup_batch([{"action_set_object": action_set_object, "query": query}])[0]
+
+def lookup_batch(parameters_list):
+    queries = [parameters["query"] for parameters in parameters_list]
+    parameters_list[0]["action_set_object"].batches.append(queries)
+    if "break the batch" in queries:
+        raise RuntimeError("the whole batch failed")
+    return [RuntimeError(f"no results for {query}") if query.startswith("fail") else f"results for {query}" for query in queries]
+
+def note(action_set_object, text):
+    return f"noted {text}"
+
+async def anote(action_set_object, text):
+    await asyncio.sleep(0.01)
+    return f"noted {text}"
+
+
+def make_action_interface():
+    actions = [
+        Action(name="lookup(query: str)", when_to_use="", arguments="", action_function=lookup, batch_function=lookup_batch),
+        Action(name="note(text: str)", when_to_use="", arguments="", action_function=note, async_action_function=anote, resource_function=lambda action_set_object, text: text),
+    ]
+    recorder = Recorder()
+    return ActionInterface([ActionSet(action_list=actions, action_set_name="test_action_set", action_set_object=recorder)]), recorder
+
+
+def format_response(actions):
+    return "Part 1) Temporary scratchpad\nThinking.\nPart 2) Action requests\n" + json.dumps(actions)
+
+
+def lookup_request(query):
+    return {"function": "lookup", "arguments": {"query": query}}
+
+
+def summarize_log(action_interface):
+    # one short string per action log entry
+    summaries = []
+    for record in action_interface.agent_action_log:
+        if record.kind == "error":
+            summaries.append(f"error: {record.error_message.split('. Error: ')[-1].replace('Warning: ', '')}")
+        else:
+            summaries.append(record.output)
+    return summaries
+
+
+def perform_all_ways(actions):
+    """
+    Performs actions with each of the four ways of parsing a response, and returns (action log summaries, batches) for each.
+    """
+    response = format_response(actions)
+    chunks = [response[i:i + 9] for i in range(0, len(response), 9)]
+
+    async def achunks():
+        for chunk in chunks:
+            yield chunk
+
+    runs = [
+        lambda action_interface: action_interface.parse_response_and_perform_actions(response),
+        lambda action_interface: asyncio.run(action_interface.aparse_response_and_perform_actions(response)),
+        lambda action_interface: action_interface.stream_response_and_perform_actions(chunks),
+        lambda action_interface: asyncio.run(action_interface.astream_response_and_perform_actions(achunks())),
+    ]
+    results = []
+    for run in runs:
+        action_interface, recorder = make_action_interface()
+        run(action_interface)
+        results.append((summarize_log(action_interface), recorder.batches))
+    return results
+
+
+class ActionBatcherTest(unittest.TestCase):
+    def test_consecutive_requests_are_batched(self):
+        actions = [lookup_request("a"), lookup_request("b"), {"function": "note", "arguments": {"text": "x"}}, lookup_request("c")]
+        for log, batches in perform_all_ways(actions):
+            self.assertEqual(batches, [["a", "b"], ["c"]])
+            self.assertEqual(log, ["results for a", "results for b", "noted x", "results for c"])
+
+    def test_invalid_request_is_logged_in_order(self):
+        # an invalid request for the action being batched, and an unknown action, are logged after the requests before them
+        actions = [lookup_request("a"), lookup_request("b"), {"function": "lookup", "arguments": {}}, lookup_request("c"), {"function": "unknown", "arguments": {}}, lookup_request("d")]
+        for log, batches in perform_all_ways(actions):
+            self.assertEqual(batches, [["a", "b"], ["c"], ["d"]])
+            self.assertEqual(len(log), 6)
+            self.assertEqual(log[:2], ["results for a", "results for b"])
+            self.assertIn("Invalid arguments for action lookup", log[2])
+            self.assertEqual(log[3], "results for c")
+            self.assertEqual(log[4], "error: Unknown action: unknown")
+            self.assertEqual(log[5], "results for d")
+
+    def test_invalid_request_after_concurrent_actions(self):
+        actions = [{"function": "note", "arguments": {"text": "x"}}, {"function": "note", "arguments": {"text": "y"}}, {"function": "unknown", "arguments": {}}]
+        for log, _ in perform_all_ways(actions):
+            self.assertEqual(log, ["noted x", "noted y", "error: Unknown action: unknown"])
+
+    def test_failed_request_in_batch(self):
+        actions = [lookup_request("a"), lookup_request("fail b"), lookup_request("c")]
+        for log, batches in perform_all_ways(actions):
+            self.assertEqual(batches, [["a", "fail b", "c"]])
+            self.assertEqual(log, ["results for a", "error: no results for fail b", "results for c"])
+
+    def test_failed_batch(self):
+        actions = [lookup_request("a"), lookup_request("break the batch")]
+        for log, _ in perform_all_ways(actions):
+            self.assertEqual(log, ["error: the whole batch failed"] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Tests for incremental checkpointing (see agent/checkpoint.py): replaying the journal on load, ignoring a half-written checkpoint, and loading agents pickled whole by older versions.
+"""
+
+import os
+import pickle
+import sys
+import tempfile
+import unittest
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.agent_class import Agent
+from agent.checkpoint import CHECKPOINT_FORMAT, Checkpointer, load_checkpoint
+from action_sets.long_form_writing.SDF import Document
+from action_sets.long_form_writing.writing_action_set import writing_action_set
+from action_sets.task_tree.task_tree_management import task_tree_management_action_set
+
+
+def get_document(agent):
+    return agent.action_interface.get_action_set("writing_action_set").action_set_object
+
+
+def get_contents(agent):
+    return [[element.content for element in section.elements] for section in get_document(agent).sections]
+
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.save_path = os.path.join(self.directory.name, "agent.pkl")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_agent(self):
+        document = Document(title="Checkpoint Document")
+        for i in range(3):
+            document.add_section(i, title=f"Chapter {i + 1}")
+            for j in range(20):
+                document.sections[i].add_element(j, f"Paragraph {j} of chapter {i + 1}.")
+        return Agent("Write a story.", [task_tree_management_action_set.copy(), writing_action_set.copy(document)], save_path=self.save_path)
+
+    def test_journal_replay(self):
+        agent = self.make_agent()
+        checkpointer = Checkpointer(self.save_path)
+        num_objects = checkpointer.checkpoint(agent) # the first checkpoint is a snapshot
+        self.assertGreater(num_objects, 60)
+
+        document = get_document(agent)
+        document.sections[1].edit_element(5, "An edited paragraph.")
+        self.assertLessEqual(checkpointer.checkpoint(agent), 3) # the element, its section and the document
+        document.sections[2].insert_text(0, 0, "Inserted. ")
+        document.add_section(3, title="Chapter 4")
+        agent.task_tree.description = "Write a longer story."
+        checkpointer.checkpoint(agent)
+        self.assertGreater(os.path.getsize(checkpointer.journal_path), 0)
+
+        loaded = load_checkpoint(self.save_path)
+        self.assertEqual(get_contents(loaded), get_contents(agent))
+        self.assertEqual(loaded.task_tree.description, "Write a longer story.")
+        self.assertEqual(get_document(loaded).get_stats(), document.get_stats())
+        # references between objects are restored, not copied
+        self.assertIs(loaded.action_interface.get_action("edit_section").action_set_object, get_document(loaded))
+
+    def test_half_written_checkpoint_is_ignored(self):
+        agent = self.make_agent()
+        agent.save()
+        get_document(agent).sections[0].edit_element(0, "Saved edit.")
+        agent.save()
+        journal_path = self.save_path + ".journal"
+        complete_size = os.path.getsize(journal_path)
+
+        get_document(agent).sections[0].edit_element(1, "Edit that was being saved during a crash.")
+        agent.save()
+        with open(journal_path, "rb+") as f:
+            f.truncate(complete_size + (os.path.getsize(journal_path) - complete_size) // 2)
+
+        self.assertEqual(get_contents(load_checkpoint(self.save_path, read_only=True))[0][:2], ["Saved edit.", "Paragraph 1 of chapter 1."])
+        self.assertGreater(os.path.getsize(journal_path), complete_size) # read_only leaves the file alone
+
+        loaded = Agent.load(self.save_path)
+        self.assertEqual(os.path.getsize(journal_path), complete_size)
+        # checkpointing continues after the last complete checkpoint
+        get_document(loaded).sections[0].edit_element(2, "Edit after loading.")
+        loaded.save()
+        self.assertEqual(get_contents(load_checkpoint(self.save_path))[0][:3], ["Saved edit.", "Paragraph 1 of chapter 1.", "Edit after loading."])
+
+    def test_snapshot_compacts_journal(self):
+        agent = self.make_agent()
+        checkpointer = Checkpointer(self.save_path, snapshot_every=2)
+        for i in range(5):
+            get_document(agent).sections[0].edit_element(0, f"Edit {i}.")
+            checkpointer.checkpoint(agent)
+        self.assertEqual(get_contents(load_checkpoint(self.save_path))[0][0], "Edit 4.")
+
+    def test_load_agent_pickled_whole(self):
+        agent = self.make_agent()
+        with open(self.save_path, "wb") as f:
+            pickle.dump(agent, f)
+
+        loaded = Agent.load(self.save_path)
+        self.assertEqual(get_contents(loaded), get_contents(agent))
+        get_document(loaded).sections[0].edit_element(0, "Edited after upgrading.")
+        loaded.save()
+        with open(self.save_path, "rb") as f:
+            self.assertEqual(pickle.load(f)["format"], CHECKPOINT_FORMAT)
+        self.assertEqual(get_contents(load_checkpoint(self.save_path))[0][0], "Edited after upgrading.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Tests that the search index of a Document, which is updated incrementally as the document changes, always matches an index built from scratch.
+"""
+
+import os
+import random
+import sys
+import unittest
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from action_sets.long_form_writing.document_index import DocumentIndex, find_best_window
+from action_sets.long_form_writing.SDF import Document
+
+WORDS = "alice bram castle river storm letter sword harbor forest king queen tower lantern the a of and".split()
+QUERIES = ["alice", "castle river", "storm letter sword", "queen of the harbor", "lantern", "nothing matches this"]
+
+
+def random_text(rng):
+    return " ".join(rng.choices(WORDS, k=rng.randint(3, 30))).capitalize() + "."
+
+
+def random_edit(document, rng):
+    sections = document.sections
+    section_index = rng.randrange(len(sections))
+    section = sections[section_index]
+    choice = rng.random()
+    if choice < 0.25 or not section.elements:
+        section.add_element(rng.randint(0, len(section.elements)), random_text(rng))
+    elif choice < 0.4:
+        section.edit_element(rng.randrange(len(section.elements)), random_text(rng))
+    elif choice < 0.55:
+        element_index = rng.randrange(len(section.elements))
+        section.insert_text(element_index, rng.randint(0, section.elements[element_index].get_length()), " " + random_text(rng))
+    elif choice < 0.65:
+        element_index = rng.randrange(len(section.elements))
+        length = section.elements[element_index].get_length()
+        start = rng.randint(0, length)
+        section.delete_text(element_index, start, rng.randint(start, length))
+    elif choice < 0.75:
+        section.delete_element(rng.randrange(len(section.elements)))
+    elif choice < 0.8:
+        section.reorder_elements(rng.sample(range(len(section.elements)), len(section.elements)))
+    elif choice < 0.85 and len(sections) > 1:
+        document.merge_sections(min(section_index, len(sections) - 2))
+    elif choice < 0.9:
+        document.split_section(section_index, rng.randint(0, len(section.elements)), "New Section")
+    elif choice < 0.95:
+        document.move_section(section_index, rng.choice([-1, 1]))
+    else:
+        document.add_section(rng.randint(0, len(sections)), title="Added Section")
+
+
+class DocumentIndexTest(unittest.TestCase):
+    def assert_matches_rebuild(self, document):
+        index = document.get_search_index()
+        index.update()
+        rebuilt = DocumentIndex(document)
+        rebuilt.update()
+        self.assertEqual(index.postings, rebuilt.postings)
+        self.assertEqual(index.total_length, rebuilt.total_length)
+        self.assertEqual({element: entry[3] for element, entry in index.element_entries.items()}, {element: entry[3] for element, entry in rebuilt.element_entries.items()})
+        for query in QUERIES:
+            # every match, in an order that doesn't depend on how ties were broken
+            results, rebuilt_results = [sorted((-round(score, 9), section_index, element_index) for score, section_index, element_index, _ in search_index.search(query, max_results=10000)) for search_index in (index, rebuilt)]
+            self.assertEqual(results, rebuilt_results)
+
+    def test_incremental_updates_match_rebuild(self):
+        rng = random.Random(0)
+        document = Document(title="Index Document")
+        for i in range(4):
+            document.add_section(i, title=f"Chapter {i + 1}")
+            for j in range(4):
+                document.sections[i].add_element(j, random_text(rng))
+        self.assert_matches_rebuild(document)
+        for step in range(400):
+            random_edit(document, rng)
+            if step % 10 == 0:
+                self.assert_matches_rebuild(document)
+        self.assert_matches_rebuild(document)
+
+    def test_only_changed_elements_are_tokenized(self):
+        rng = random.Random(1)
+        document = Document(title="Index Document")
+        for i in range(10):
+            document.add_section(i, title=f"Chapter {i + 1}")
+            for j in range(10):
+                document.sections[i].add_element(j, random_text(rng))
+        index = document.get_search_index()
+        index.search("alice")
+        self.assertEqual(index.elements_tokenized, 100)
+        document.sections[3].edit_element(2, "Zephyrine lit the lantern.")
+        document.merge_sections(5)
+        results = index.search("zephyrine")
+        self.assertEqual(index.elements_tokenized, 101)
+        self.assertEqual(results[0][1:3], (3, 2))
+
+    def test_find_best_window(self):
+        text = " ".join(["filler"] * 300 + ["castle", "river"] + ["filler"] * 300)
+        passage = find_best_window(text, {"castle", "river"}, max_words=10)
+        self.assertTrue(passage.startswith("...") and passage.endswith("..."))
+        self.assertIn("castle river", passage)
+        self.assertEqual(find_best_window("short text", {"text"}), "short text")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Tests that the word, character and token counts Documents and Sections keep up to date as they change always match a full recount.
+"""
+
+import os
+import pickle
+import random
+import sys
+import unittest
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from action_sets.long_form_writing.SDF import Document, Section, count_text_stats
+
+WORDS = "Alice walked to the castle by the river, and the storm broke over the tower.".split()
+FRAGMENTS = ["the", " ", "castle", "  ", "\n\n", "storm.", "Alice", "-", "it's", " river ", "x", "tower\n"]
+
+
+def random_text(rng):
+    return " ".join(rng.choices(WORDS, k=rng.randint(0, 40)))
+
+
+def random_fragment(rng):
+    # pieces of text that can join onto the words around where they're inserted, or split them
+    return "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 4)))
+
+
+def recount(document):
+    """
+    Returns (the totals for the document, the totals for each section), counted from the text of every element.
+    """
+    token_counter = document.sections[0].get_token_counter() if document.sections else None
+    section_totals = []
+    for section in document.sections:
+        totals = (0, 0, 0)
+        for element in section.elements:
+            totals = tuple(a + b for a, b in zip(totals, count_text_stats(element.content, token_counter)))
+        section_totals.append(totals)
+    return tuple(sum(totals[i] for totals in section_totals) for i in range(3)), section_totals
+
+
+class DocumentStatsTest(unittest.TestCase):
+    def assert_stats_match_recount(self, document):
+        document_totals, section_totals = recount(document)
+        self.assertEqual(document.get_stats(), document_totals)
+        self.assertEqual([stats[2:] for stats in document.get_stats_by_section()], section_totals)
+        self.assertEqual(document.get_word_count(), document_totals[0])
+
+    def test_random_changes(self):
+        rng = random.Random(0)
+        document = Document(title="Stats Document")
+        for i in range(3):
+            document.add_section(i, title=f"Chapter {i + 1}")
+        for step in range(500):
+            sections = document.sections
+            section_index = rng.randrange(len(sections))
+            section = sections[section_index]
+            choice = rng.random()
+            if choice < 0.35 or not section.elements:
+                section.add_element(rng.randint(0, len(section.elements)), random_text(rng))
+            elif choice < 0.55:
+                section.edit_element(rng.randrange(len(section.elements)), random_text(rng))
+            elif choice < 0.7:
+                section.delete_element(rng.randrange(len(section.elements)))
+            elif choice < 0.75:
+                section.reorder_elements(rng.sample(range(len(section.elements)), len(section.elements)))
+            elif choice < 0.82 and len(sections) > 1:
+                document.merge_sections(min(section_index, len(sections) - 2))
+            elif choice < 0.9:
+                document.split_section(section_index, rng.randint(0, len(section.elements)), "Split Section")
+            elif choice < 0.95:
+                document.move_section(section_index, rng.choice([-1, 1]))
+            else:
+                document.add_section(rng.randint(0, len(sections)), title="Added Section")
+            # checking only some of the time lets the running totals go through several changes in a row
+            if step % 7 == 0:
+                self.assert_stats_match_recount(document)
+        self.assert_stats_match_recount(document)
+
+    def test_insert_and_delete_text(self):
+        rng = random.Random(1)
+        document = Document(title="Stats Document")
+        for i in range(3):
+            document.add_section(i, title=f"Chapter {i + 1}")
+            for j in range(3):
+                document.sections[i].add_element(j, "The hero woke early and left the castle.")
+        document.get_stats() # so the totals are kept up to date from here on, rather than counted on demand
+        for step in range(300):
+            section = rng.choice(document.sections)
+            element_index = rng.randrange(len(section.elements))
+            length = section.elements[element_index].get_length()
+            if length and rng.random() < 0.4:
+                start = rng.randint(0, length)
+                section.delete_text(element_index, start, rng.randint(start, min(length, start + 20)))
+            else:
+                section.insert_text(element_index, rng.randint(0, length), random_fragment(rng))
+            if step % 25 == 0:
+                self.assert_stats_match_recount(document)
+        self.assert_stats_match_recount(document)
+
+    def test_sections_added_directly_and_loaded(self):
+        document = Document(title="Stats Document")
+        document.add_section(0, title="Chapter 1")
+        document.sections[0].add_element(0, "The hero woke early.")
+        self.assert_stats_match_recount(document)
+
+        # a section appended to the list, rather than added with add_section()
+        section = Section("Section 2", "Chapter 2")
+        section.add_element(0, "Then the hero left the castle.")
+        document.sections.append(section)
+        document.mark_changed()
+        self.assert_stats_match_recount(document)
+        section.add_element(1, "It rained.")
+        self.assert_stats_match_recount(document)
+
+        # the counts aren't saved, and are redone after loading
+        loaded = pickle.loads(pickle.dumps(document))
+        self.assert_stats_match_recount(loaded)
+        loaded.sections[1].edit_element(0, "The hero stayed.")
+        self.assert_stats_match_recount(loaded)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+Tests that the summaries made from the text of sections without one don't crowd the rest of the document context out of prompts.
+"""
+
+import os
+import random
+import sys
+import unittest
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from action_sets.long_form_writing.SDF import Document
+from action_sets.long_form_writing.summary_cache import GENERATED_SUMMARIES_MAX_TOKENS
+
+WORDS = "the a of and to in was her his she he it that with castle river night storm letter sword harbor forest king queen".split()
+
+
+def build_document(num_sections=40):
+    random.seed(0)
+    document = Document(title="Long Document")
+    for i in range(num_sections):
+        document.add_section(i, title=f"Chapter {i + 1}")
+        for j in range(10):
+            text = " ".join(" ".join(random.choices(WORDS, k=12)).capitalize() + "." for _ in range(8))
+            document.sections[i].add_element(j, text)
+    return document
+
+
+class GeneratedSummariesTest(unittest.TestCase):
+    def test_generated_summaries_are_capped(self):
+        document = build_document()
+        token_counter = document.get_summary_cache().token_counter
+        context = document.format_prompt_context()
+        heading = "Section Summaries Generated From The Text"
+        self.assertIn(heading, context)
+        generated = context[context.index(heading):]
+        self.assertLessEqual(token_counter.count(generated), GENERATED_SUMMARIES_MAX_TOKENS + 20)
+
+    def test_characters_kept_in_edit_prompt(self):
+        document = build_document()
+        document.add_character_description("Alice", "A lighthouse keeper with a secret.")
+        document.add_location("Harbor", "A cold northern harbor.")
+        document.sections[0].summary = "Alice finds the letter."
+        prompt = document.create_edit_section_prompt(0, "Continue the chapter.")
+        self.assertIn("A lighthouse keeper with a secret.", prompt)
+        self.assertIn("A cold northern harbor.", prompt)
+        self.assertIn("Alice finds the letter.", prompt)
+        # the written summary isn't generated again
+        context = document.format_prompt_context()
+        generated = context[context.index("Section Summaries Generated From The Text"):]
+        self.assertNotIn("Chapter 1:", generated)
+
+
+if __name__ == "__main__":
+    unittest.main()
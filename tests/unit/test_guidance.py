@@ -0,0 +1,50 @@
+"""
+Tests for reading human guidance from a file as it's written (see FileGuidanceSource).
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.guidance import FileGuidanceSource
+
+
+class FileGuidanceSourceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "guidance.txt")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def append(self, data: bytes):
+        with open(self.path, "ab") as f:
+            f.write(data)
+
+    def test_partly_written_character(self):
+        self.append(b"old message\n")
+        source = FileGuidanceSource(self.path)
+        self.assertEqual(source.poll(), [])
+        encoded = "Focus on the café scene\r\nthen the ending\n".encode("utf-8")
+        split = encoded.index("é".encode("utf-8")) + 1 # partway through the two bytes of "é"
+        self.append(encoded[:split])
+        self.assertEqual(source.poll(), [])
+        self.append(encoded[split:])
+        self.assertEqual(source.poll(), ["Focus on the café scene", "then the ending"])
+
+    def test_invalid_bytes_and_truncation(self):
+        source = FileGuidanceSource(self.path, read_existing=True)
+        self.assertEqual(source.poll(), []) # the file doesn't exist yet
+        self.append(b"bad \xff byte\n\nunfinished")
+        self.assertEqual(source.poll(), ["bad � byte"])
+        with open(self.path, "wb") as f:
+            f.write(b"new\n")
+        self.assertEqual(source.poll(), ["new"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Tests for batched knowledge base searches when some of the searches fail.
+"""
+
+import json
+import os
+import sys
+import unittest
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.action_interface import ActionInterface
+from action_sets.knowledge_retrieval.knowledge_base import SuperpoweredKnowledgeBase, LocalKnowledgeBackend
+from action_sets.knowledge_retrieval.knowledge_retrieval_action_set import knowledge_retrieval_action_set
+
+PASSAGES = ["custody of client funds", "fees for investment advice", "advertising rules"]
+
+
+class FlakyBackend(LocalKnowledgeBackend):
+    # fails every query that contains "fail"
+    def __init__(self, passages):
+        super().__init__(passages)
+        self.queries_sent = []
+
+    def query(self, query, retriever_top_k, reranker_top_k):
+        self.queries_sent.append(query)
+        if "fail" in query:
+            raise RuntimeError(f"search failed: {query}")
+        return super().query(query, retriever_top_k, reranker_top_k)
+
+
+def format_response(actions):
+    return "Part 1) Temporary scratchpad\nSearching.\nPart 2) Action requests\n" + json.dumps(actions)
+
+
+class KnowledgeBaseErrorTest(unittest.TestCase):
+    def test_search_many_returns_errors_per_query(self):
+        backend = FlakyBackend(PASSAGES)
+        knowledge_base = SuperpoweredKnowledgeBase("test", backend=backend)
+        all_results = knowledge_base.search_many(["custody", "please fail", "fees"])
+        self.assertEqual(all_results[0]["ranked_results"][0]["content"], "custody of client funds")
+        self.assertIsInstance(all_results[1], RuntimeError)
+        self.assertEqual(all_results[2]["ranked_results"][0]["content"], "fees for investment advice")
+
+        # the successes are cached, the failure isn't
+        backend.queries_sent.clear()
+        knowledge_base.search_many(["custody", "please fail", "fees"])
+        self.assertEqual(backend.queries_sent, ["please fail"])
+
+    def test_format_search_results_reports_failed_search(self):
+        knowledge_base = SuperpoweredKnowledgeBase("test", backend=FlakyBackend(PASSAGES))
+        output = knowledge_base.format_search_results(["custody", "please fail"])
+        self.assertIn("custody of client funds", output)
+        self.assertIn("Search 2: please fail\nError: search failed: please fail", output)
+        with self.assertRaises(RuntimeError):
+            knowledge_base.format_search_results(["please fail"])
+
+    def test_batched_action_logs_one_entry_per_search(self):
+        knowledge_base = SuperpoweredKnowledgeBase("test", backend=FlakyBackend(PASSAGES))
+        action_interface = ActionInterface([knowledge_retrieval_action_set.copy(knowledge_base)])
+        queries = ["custody", "please fail", "advertising"]
+        action_interface.parse_response_and_perform_actions(format_response([{"function": "superpowered_kb_search", "arguments": {"query": query}} for query in queries]))
+        records = list(action_interface.agent_action_log)
+        self.assertEqual(len(records), 3)
+        self.assertIn("custody of client funds", records[0].format())
+        self.assertIn("search failed: please fail", records[1].format())
+        self.assertIn("advertising rules", records[2].format())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+"""
+Tests that documents pickled whole by older versions, before Section and Element used __slots__, can still be loaded.
+"""
+
+import os
+import pickle
+import sys
+import tempfile
+import unittest
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.checkpoint import load_checkpoint
+from action_sets.long_form_writing import SDF
+
+
+class LegacyElement:
+    def __init__(self, content):
+        self.content = content
+
+
+class LegacySection:
+    # a Section as it was before __slots__, after update_section_summary() and update_section_outline() had been used
+    def __init__(self, title, contents):
+        self.section_identifier = "Section 1"
+        self.title = title
+        self.summary = ""
+        self.outline = ""
+        self.elements = [LegacyElement(content) for content in contents]
+        self.section_summary = "The hero leaves home."
+        self.section_outline = "1. The hero packs.\n2. The hero leaves."
+        self.some_removed_attribute = 1
+
+
+def dumps_as_legacy(document):
+    # pickles the legacy classes under the names of the current ones, which is what a pickle made by an older version contains
+    classes = (SDF.Section, SDF.Element)
+    LegacySection.__qualname__, LegacyElement.__qualname__ = "Section", "Element"
+    LegacySection.__module__ = LegacyElement.__module__ = SDF.__name__
+    SDF.Section, SDF.Element = LegacySection, LegacyElement
+    try:
+        return pickle.dumps(document)
+    finally:
+        SDF.Section, SDF.Element = classes
+
+
+class LegacyPickleTest(unittest.TestCase):
+    def test_load_document_with_legacy_sections(self):
+        document = SDF.Document("Legacy Document")
+        document.sections.append(LegacySection("Departure", ["The hero woke early.", "Then the hero left."]))
+        data = dumps_as_legacy(document)
+
+        with tempfile.TemporaryDirectory() as directory:
+            save_path = os.path.join(directory, "document.pkl")
+            with open(save_path, "wb") as f:
+                f.write(data)
+            loaded = load_checkpoint(save_path)
+
+        section = loaded.sections[0]
+        self.assertIsInstance(section, SDF.Section)
+        self.assertEqual(section.summary, "The hero leaves home.")
+        self.assertEqual(section.outline, "1. The hero packs.\n2. The hero leaves.")
+        self.assertFalse(hasattr(section, "some_removed_attribute"))
+        self.assertEqual([element.content for element in section.elements], ["The hero woke early.", "Then the hero left."])
+
+        # the loaded document works as usual
+        self.assertEqual(loaded.get_word_count(), 8)
+        section.add_element(2, "The end.")
+        self.assertEqual(loaded.get_word_count(), 10)
+        self.assertIn("The hero leaves home.", loaded.format_prompt_context())
+
+
+if __name__ == "__main__":
+    unittest.main()
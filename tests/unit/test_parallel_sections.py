@@ -0,0 +1,66 @@
+"""
+Tests that analyzing and editing several sections at once keeps the results of the LLM calls that succeeded when others fail.
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.llm_client import FakeLLMClient
+from action_sets.long_form_writing.SDF import Document
+from action_sets.long_form_writing.writing_action_set import format_section_analyses
+
+
+class FlakyLLMClient(FakeLLMClient):
+    # fails every prompt that asks for "FAIL", and otherwise answers with the instructions it was given
+    def get_response(self, prompt, model_name, temperature, max_tokens, system_message):
+        if "FAIL" in prompt:
+            raise RuntimeError("the LLM call failed")
+        if "Add a scene" in prompt:
+            return 'Part 1) Temporary scratchpad\nAdding it.\nPart 2) Action requests\n[{"function": "add_element", "arguments": {"element_index": 0, "content": "A new scene."}}]'
+        return "  An analysis.  "
+
+
+def make_document():
+    document = Document(title="Parallel Document", llm_client=FlakyLLMClient())
+    for i in range(3):
+        document.add_section(i, title=f"Chapter {i + 1}")
+        document.sections[i].add_element(0, f"The text of chapter {i + 1}.")
+    return document
+
+
+class ParallelSectionsTest(unittest.TestCase):
+    def test_read_and_analyze_sections_keeps_successes(self):
+        section_analyses = [(0, "Check the pacing."), (1, "FAIL"), (2, "Check the dialogue.")]
+        for analyze in (lambda document: document.read_and_analyze_sections(section_analyses), lambda document: asyncio.run(document.aread_and_analyze_sections(section_analyses))):
+            analyses = analyze(make_document())
+            self.assertEqual(analyses[0], "An analysis.")
+            self.assertIsInstance(analyses[1], RuntimeError)
+            self.assertEqual(analyses[2], "An analysis.")
+            output = format_section_analyses(section_analyses, analyses)
+            self.assertIn("Section 1:\nError: the LLM call failed", output)
+            self.assertIn("Section 2:\nAn analysis.", output)
+
+    def test_read_and_analyze_sections_all_failed(self):
+        document = make_document()
+        with self.assertRaises(RuntimeError):
+            document.read_and_analyze_sections([(0, "FAIL"), (1, "FAIL")])
+        with self.assertRaises(RuntimeError):
+            asyncio.run(document.aread_and_analyze_sections([(0, "FAIL")]))
+        self.assertEqual(document.read_and_analyze_sections([]), [])
+
+    def test_edit_sections_applies_successes(self):
+        section_edits = [(0, "Add a scene."), (1, "FAIL"), (2, "Add a scene.")]
+        for edit in (lambda document: document.edit_sections(section_edits), lambda document: asyncio.run(document.aedit_sections(section_edits))):
+            document = make_document()
+            with self.assertRaises(RuntimeError):
+                edit(document)
+            self.assertEqual([len(section.elements) for section in document.sections], [2, 1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
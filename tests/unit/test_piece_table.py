@@ -0,0 +1,58 @@
+"""
+Tests for the piece table that stores element text.
+"""
+
+import os
+import random
+import sys
+import unittest
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from action_sets.long_form_writing.piece_table import MAX_PIECES, PieceTable
+
+FRAGMENTS = ["the", " ", "castle", "  ", "\n\n", "storm.", "Alice", "-", "it's", " river ", "x", "tower\n"]
+
+
+def random_fragment(rng):
+    return "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 4)))
+
+
+class PieceTableTest(unittest.TestCase):
+    def test_edits_match_string_edits(self):
+        rng = random.Random(0)
+        text = "The hero woke early."
+        table = PieceTable.from_text(text)
+        versions = []
+        for _ in range(1000):
+            if text and rng.random() < 0.4:
+                start = rng.randint(0, len(text))
+                end = rng.randint(start, len(text))
+                self.assertEqual(table.get_text(start, end), text[start:end])
+                text, table = text[:start] + text[end:], table.delete(start, end)
+            else:
+                position = rng.randint(0, len(text))
+                fragment = random_fragment(rng)
+                text, table = text[:position] + fragment + text[position:], table.insert(position, fragment)
+            self.assertEqual(len(table), len(text))
+            self.assertLessEqual(len(table.pieces), MAX_PIECES)
+            versions.append((text, table))
+        self.assertEqual(str(table), text)
+        self.assertEqual("".join(table.iter_chunks()), text)
+        for position in [-1, 0, len(text) // 2, len(text) - 1, len(text)]:
+            self.assertEqual(table.get_char(position), text[position] if 0 <= position < len(text) else "")
+        # earlier versions aren't changed by later edits
+        for old_text, old_table in versions[::50]:
+            self.assertEqual(str(old_table), old_text)
+
+    def test_out_of_range(self):
+        table = PieceTable.from_text("abc")
+        with self.assertRaises(IndexError):
+            table.insert(4, "d")
+        with self.assertRaises(IndexError):
+            table.delete(2, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Tests for the on-disk cache of LLM responses (see agent/response_cache.py).
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.llm_client import FakeLLMClient
+from agent.response_cache import CachedLLMClient, ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache", "responses.sqlite")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_cached_calls(self):
+        fake = FakeLLMClient(responses=["first", "second", "third"])
+        cache = ResponseCache(self.path)
+        client = CachedLLMClient(fake, cache)
+        self.assertEqual(client.complete_cached("prompt"), "first")
+        self.assertEqual(client.complete_cached("prompt"), "first")
+        self.assertEqual(asyncio.run(client.acomplete_cached("prompt")), "first")
+        self.assertEqual(client.complete_cached("prompt", temperature=0.0), "second") # a different request
+        self.assertEqual(client.complete("prompt"), "third") # plain calls aren't cached
+        self.assertEqual(fake.num_calls, 3)
+        self.assertEqual(cache.get_stats()["hits"], 2)
+        cache.close()
+
+        # the cache is saved, so another client (e.g. after a restart) gets the same responses
+        fake = FakeLLMClient(default_response="new")
+        client = CachedLLMClient(fake, ResponseCache(self.path), cache_all_calls=True)
+        self.assertEqual(client.complete("prompt"), "first")
+        self.assertEqual(fake.num_calls, 0)
+        client.cache.close()
+
+    def test_least_recently_used_are_evicted(self):
+        cache = ResponseCache(self.path, max_entries=2)
+        cache.put("a", "response a")
+        time.sleep(0.01)
+        cache.put("b", "response b")
+        time.sleep(0.01)
+        self.assertEqual(cache.get("a"), "response a") # a is now more recently used than b
+        time.sleep(0.01)
+        cache.put("c", "response c")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "response a")
+        self.assertEqual(cache.get("c"), "response c")
+        self.assertEqual(cache.get_stats()["evictions"], 1)
+        cache.close()
+
+    def test_size_limit(self):
+        cache = ResponseCache(self.path, max_entries=None, max_bytes=25)
+        for key in "abc":
+            cache.put(key, "x" * 10)
+            time.sleep(0.01)
+        stats = cache.get_stats()
+        self.assertEqual((stats["entries"], stats["bytes"]), (2, 20))
+        self.assertIsNone(cache.get("a"))
+        cache.close()
+
+    def test_old_entries_expire(self):
+        cache = ResponseCache(self.path, max_age_seconds=0.05)
+        cache.put("a", "response a")
+        self.assertEqual(cache.get("a"), "response a")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get_stats()["entries"], 0)
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
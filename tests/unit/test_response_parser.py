@@ -0,0 +1,99 @@
+"""
+Tests for the lenient parsing of the action list in an LLM response (see agent/response_parser.py), whole and streamed.
+"""
+
+import os
+import sys
+import unittest
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.response_parser import StreamingResponseParser, parse_action_list
+
+SCRATCHPAD = "Part 1) Temporary scratchpad\nI should write [the next part] of the story {soon}.\n"
+
+
+def parse_streamed(response, chunk_size):
+    """
+    Returns (scratchpad text, action dictionaries, errors, found_action_list) from feeding response to a StreamingResponseParser in chunks of chunk_size characters.
+    """
+    parser = StreamingResponseParser()
+    scratchpad_text = ""
+    action_dicts = []
+    for i in range(0, len(response), chunk_size):
+        text, new_action_dicts = parser.feed(response[i:i + chunk_size])
+        scratchpad_text += text
+        action_dicts.extend(new_action_dicts)
+    scratchpad_text += parser.finish()
+    return scratchpad_text, action_dicts, parser.errors, parser.found_action_list
+
+
+class ParseActionListTest(unittest.TestCase):
+    def assert_parses(self, response, expected_action_dicts, num_errors=0):
+        action_dicts, errors = parse_action_list(response)
+        self.assertEqual(action_dicts, expected_action_dicts)
+        self.assertEqual(len(errors), num_errors, errors)
+        # the streaming parser finds the same actions, however the response is split up
+        for chunk_size in (1, 3, 7, 64, len(response)):
+            _, streamed_action_dicts, streamed_errors, found_action_list = parse_streamed(response, chunk_size)
+            if found_action_list:
+                self.assertEqual(streamed_action_dicts, expected_action_dicts)
+                self.assertEqual(len(streamed_errors), num_errors)
+        return errors
+
+    def test_well_formed(self):
+        response = SCRATCHPAD + 'Part 2) Action requests\n[{"function": "a", "arguments": {"x": 1}}, {"function": "b", "arguments": {}}]'
+        self.assert_parses(response, [{"function": "a", "arguments": {"x": 1}}, {"function": "b", "arguments": {}}])
+
+    def test_brackets_in_scratchpad_are_ignored(self):
+        response = SCRATCHPAD + 'Maybe [{"function": "not_this"}].\nPart 2) Action requests\n[{"function": "a"}]'
+        self.assert_parses(response, [{"function": "a"}])
+
+    def test_header_variations(self):
+        for header in ["Part 2) Action requests", "part 2: action request", "PART 2 - Action Requests", "Part 2. Action requests"]:
+            self.assert_parses(SCRATCHPAD + header + '\n[{"function": "a"}]', [{"function": "a"}])
+
+    def test_no_header(self):
+        self.assert_parses('Here you go:\n[{"function": "a"}]', [{"function": "a"}])
+
+    def test_python_literals_and_trailing_commas(self):
+        response = SCRATCHPAD + "Part 2) Action requests\n[{'function': 'a', 'arguments': {'flag': True, 'value': None}}, {\"function\": \"b\", \"arguments\": {\"x\": 1,},},]"
+        self.assert_parses(response, [{"function": "a", "arguments": {"flag": True, "value": None}}, {"function": "b", "arguments": {"x": 1}}])
+
+    def test_strings_with_brackets_quotes_and_escapes(self):
+        text = 'He said "stop" [twice] {loudly}, then left.\\n'
+        response = SCRATCHPAD + 'Part 2) Action requests\n[{"function": "a", "arguments": {"text": "He said \\"stop\\" [twice] {loudly}, then left.\\\\n"}}, {"function": "b", "arguments": {"text": "it\'s }"}}]'
+        self.assert_parses(response, [{"function": "a", "arguments": {"text": text}}, {"function": "b", "arguments": {"text": "it's }"}}])
+
+    def test_malformed_dictionary_is_skipped(self):
+        response = SCRATCHPAD + 'Part 2) Action requests\n[{"function": "a"}, {"function": "b", "arguments": {"x": oops}}, {"arguments": {}}, {"function": "c"}]'
+        errors = self.assert_parses(response, [{"function": "a"}, {"function": "c"}], num_errors=2)
+        self.assertIn("Invalid JSON", errors[0][0])
+        self.assertIn("missing the \"function\" key", errors[1][0])
+
+    def test_text_after_list_is_ignored(self):
+        response = SCRATCHPAD + 'Part 2) Action requests\n```\n[{"function": "a"}]\n```\nLet me know [if] {that} helps.'
+        self.assert_parses(response, [{"function": "a"}])
+
+    def test_cut_off_response(self):
+        response = SCRATCHPAD + 'Part 2) Action requests\n[{"function": "a"}, {"function": "b", "arguments": {"text": "The end wa'
+        errors = self.assert_parses(response, [{"function": "a"}], num_errors=1)
+        self.assertIn("incomplete", errors[0][0])
+
+    def test_no_action_list(self):
+        action_dicts, errors = parse_action_list(SCRATCHPAD + "Part 2) Action requests\nNothing to do.")
+        self.assertIsNone(action_dicts)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(parse_action_list(SCRATCHPAD + "Part 2) Action requests\n[]"), ([], []))
+
+    def test_streamed_scratchpad(self):
+        response = SCRATCHPAD + 'Part 2) Action requests\n[{"function": "a"}]'
+        for chunk_size in (1, 5, len(response)):
+            scratchpad_text, action_dicts, _, _ = parse_streamed(response, chunk_size)
+            self.assertEqual(scratchpad_text.strip(), "I should write [the next part] of the story {soon}.")
+            self.assertEqual(action_dicts, [{"function": "a"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Tests for running several agents in one process with AgentScheduler.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.agent_class import Agent
+from agent.llm_client import ConcurrencyLimitedLLMClient, FakeLLMClient
+from agent.scheduler import AgentScheduler
+from action_sets.task_tree.task_tree_management import task_tree_management_action_set
+
+RESPONSE = 'Part 1) Temporary scratchpad\nBreaking it down.\nPart 2) Action requests\n[{"function": "break_into_subtasks", "arguments": {"subtask_descriptions": ["a"]}}]'
+
+
+class AgentSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_agent(self, file_name):
+        return Agent("Write a story.", [task_tree_management_action_set.copy()], save_path=os.path.join(self.directory.name, file_name))
+
+    def test_duplicate_save_path(self):
+        scheduler = AgentScheduler(llm_client=FakeLLMClient(default_response=RESPONSE))
+        scheduler.add_agent(self.make_agent("agent.pkl"))
+        duplicate = self.make_agent("agent.pkl")
+        duplicate.save_path = os.path.join(self.directory.name, ".", "agent.pkl")
+        with self.assertRaises(ValueError):
+            scheduler.add_agent(duplicate)
+        scheduler.add_agent(self.make_agent("other_agent.pkl"))
+
+    def test_run_twice(self):
+        # the shared client's async semaphore can't carry over from one event loop to the next
+        llm_client = FakeLLMClient(default_response=RESPONSE, latency=0.01)
+        scheduler = AgentScheduler(llm_client=llm_client, max_concurrent_llm_calls=2)
+        for i in range(3):
+            scheduler.add_agent(self.make_agent(f"agent_{i}.pkl"), max_iterations=2)
+        scheduler.run()
+        for job in scheduler.jobs:
+            job.finished = False
+            job.max_iterations += 2
+        jobs = scheduler.run()
+        self.assertEqual([job.error for job in jobs], [None] * 3)
+        self.assertEqual([job.iterations_completed for job in jobs], [4] * 3)
+        self.assertEqual(llm_client.num_calls, 12)
+
+    def test_shared_client_not_saved(self):
+        llm_client = FakeLLMClient(default_response=RESPONSE)
+        scheduler = AgentScheduler(llm_client=llm_client)
+        agent = self.make_agent("agent.pkl")
+        scheduler.add_agent(agent, max_iterations=1)
+        scheduler.run()
+        self.assertEqual(llm_client.num_calls, 1)
+        self.assertNotIsInstance(agent.get_llm_client(), ConcurrencyLimitedLLMClient) # the shared client is removed after the run
+        loaded_agent = Agent.load(agent.save_path)
+        self.assertIsNone(loaded_agent.llm_client)
+        self.assertIsNone(getattr(loaded_agent, "_scheduler_llm_client", None))
+
+    def test_saves_off_the_event_loop(self):
+        save_threads = []
+        original_save = Agent.save
+
+        def save(agent):
+            save_threads.append(threading.current_thread())
+            original_save(agent)
+
+        scheduler = AgentScheduler(llm_client=FakeLLMClient(default_response=RESPONSE))
+        for i in range(2):
+            scheduler.add_agent(self.make_agent(f"agent_{i}.pkl"), max_iterations=2)
+        with mock.patch.object(Agent, "save", save):
+            jobs = scheduler.run()
+        self.assertEqual([job.error for job in jobs], [None] * 2)
+        self.assertEqual(len(save_threads), 4)
+        self.assertNotIn(threading.main_thread(), save_threads)
+        # the scheduler's thread pool is shut down at the end of the run
+        self.assertTrue(all(not thread.is_alive() for thread in save_threads))
+
+    def test_semaphore_per_event_loop(self):
+        llm_client = ConcurrencyLimitedLLMClient(FakeLLMClient(default_response="done", latency=0.01), max_concurrent_calls=1)
+
+        async def complete_concurrently():
+            return await asyncio.gather(llm_client.acomplete("a"), llm_client.acomplete("b"))
+
+        for _ in range(2):
+            self.assertEqual(asyncio.run(complete_concurrently()), ["done", "done"])
+
+
+if __name__ == "__main__":
+    unittest.main()
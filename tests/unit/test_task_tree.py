@@ -0,0 +1,74 @@
+"""
+Tests that the indexed task tree finds the same next task as a full depth-first search.
+"""
+
+import os
+import pickle
+import random
+import sys
+import unittest
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from action_sets.task_tree.task_class import Task
+
+
+def find_next_task_by_search(task):
+    # the search find_next_task() used before the tree was indexed
+    if not task.complete and all(subtask.complete for subtask in task.subtasks):
+        return task
+    for subtask in task.subtasks:
+        next_task = find_next_task_by_search(subtask)
+        if next_task:
+            return next_task
+    return None
+
+
+def get_all_tasks(root):
+    tasks = [root]
+    for task in tasks:
+        tasks.extend(task.subtasks)
+    return tasks
+
+
+class TaskTreeTest(unittest.TestCase):
+    def test_next_task_matches_search(self):
+        rng = random.Random(0)
+        root = Task("Write a novel.")
+        tasks = [root]
+        for step in range(2000):
+            if rng.random() < 0.5:
+                subtask = Task(f"Task {step}", complete=rng.random() < 0.1)
+                rng.choice(tasks).add_subtask(subtask)
+                tasks.append(subtask)
+            else:
+                # mostly complete the next task, as an agent would, but also complete or reopen other tasks
+                task = root.find_next_task() if rng.random() < 0.6 else rng.choice(tasks)
+                if task is not None:
+                    task.complete = not task.complete
+            self.assertIs(root.find_next_task(), find_next_task_by_search(root))
+            if step % 200 == 0:
+                subtree = rng.choice(tasks)
+                self.assertIs(subtree.find_next_task(), find_next_task_by_search(subtree))
+
+    def test_index_is_rebuilt_after_loading(self):
+        root = Task("Write a story.")
+        for i in range(3):
+            root.add_subtask(Task(f"Chapter {i + 1}"))
+            for j in range(3):
+                root.subtasks[i].add_subtask(Task(f"Scene {j + 1}"))
+        root.subtasks[0].subtasks[0].complete = True
+
+        loaded = pickle.loads(pickle.dumps(root))
+        next_task = loaded.find_next_task()
+        self.assertEqual(next_task.description, "Scene 2")
+        self.assertIs(next_task.parent, loaded.subtasks[0])
+        self.assertIn("Task 2: Scene 2 (CURRENT TASK)", next_task.get_local_task_tree())
+        for task in get_all_tasks(loaded)[1:4]:
+            task.complete = True
+        self.assertIs(loaded.find_next_task(), find_next_task_by_search(loaded))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Tests for counting the change in tokens from an edit without counting the whole text again (see TokenCounter.count_change()).
+"""
+
+import os
+import random
+import re
+import sys
+import unittest
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+from agent.token_counter import HeuristicTokenCounter, TiktokenCounter
+from action_sets.long_form_writing.piece_table import PieceTable
+
+# splits text the way tiktoken's encodings do before merging (for ASCII text), so a token never spans two of these pieces
+PRETOKENIZER_PATTERN = re.compile(r"""'s|'t|'re|'ve|'m|'ll|'d|[^\r\n\w]?[A-Za-z]+|[0-9]{1,3}| ?[^\sA-Za-z0-9]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+""")
+FRAGMENTS = ["the", " ", "castle", "   ", "\n\n", "storm.", " Alice", "-", "it's", " river ", "x", "tower\n", "1234", " ...", "\t"]
+
+
+class FakeEncoding:
+    # stands in for a tiktoken encoding: each piece becomes one token per 3 characters
+    def encode(self, text, disallowed_special=()):
+        return [None for piece in PRETOKENIZER_PATTERN.findall(text) for _ in range(-(-len(piece) // 3))]
+
+
+def make_fake_tiktoken_counter():
+    token_counter = TiktokenCounter.__new__(TiktokenCounter)
+    token_counter.encoding = FakeEncoding()
+    return token_counter
+
+
+def random_text(rng, num_fragments):
+    return "".join(rng.choice(FRAGMENTS) for _ in range(num_fragments))
+
+
+class CountChangeTest(unittest.TestCase):
+    def check_random_edits(self, token_counter):
+        rng = random.Random(0)
+        table = PieceTable.from_text(random_text(rng, 200))
+        for _ in range(500):
+            start = rng.randint(0, len(table))
+            if rng.random() < 0.4:
+                old_end = rng.randint(start, min(len(table), start + 30))
+                new_table, new_end = table.delete(start, old_end), start
+            else:
+                text = random_text(rng, rng.randint(1, 4))
+                old_end, new_end = start, start + len(text)
+                new_table = table.insert(start, text)
+            self.assertEqual(token_counter.count_change(table, new_table, start, old_end, new_end), token_counter.count(str(new_table)) - token_counter.count(str(table)))
+            table = new_table
+
+    def test_tiktoken_window_matches_full_count(self):
+        self.check_random_edits(make_fake_tiktoken_counter())
+
+    def test_heuristic_matches_full_count(self):
+        self.check_random_edits(HeuristicTokenCounter())
+
+    def test_window_is_bounded(self):
+        # an edit in the middle of a long text only reads the text around it
+        table = PieceTable.from_text("word " * 100000)
+        new_table = table.insert(250000, "new ")
+        reads = []
+
+        class RecordingTable:
+            def __init__(self, table):
+                self.table = table
+
+            def __len__(self):
+                return len(self.table)
+
+            def get_text(self, start, end):
+                reads.append(end - start)
+                return self.table.get_text(start, end)
+
+        token_counter = make_fake_tiktoken_counter()
+        self.assertEqual(token_counter.count_change(RecordingTable(table), RecordingTable(new_table), 250000, 250000, 250004), 2)
+        self.assertLess(max(reads), 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
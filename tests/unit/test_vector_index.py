@@ -0,0 +1,50 @@
+"""
+Tests for building and rebuilding a local vector index (see action_sets/knowledge_retrieval/vector_index.py).
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+# add task_tree_agent to the path. It's not installed as a package, so we need to add it to the path manually.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "task_tree_agent"))
+
+try:
+    import numpy as np
+    from action_sets.knowledge_retrieval.vector_index import VectorIndex
+except ImportError: # NumPy is only needed for the vector index
+    np = None
+
+DOCUMENTS = [("custody.txt", "An adviser that has custody of client funds must keep them with a qualified custodian."), ("fees.txt", "Performance fees are only allowed for qualified clients.")]
+NEW_DOCUMENTS = [("advertising.txt", "Advertisements may not include untrue statements of material fact."), ("books.txt", "Advisers must keep true and accurate books and records."), ("code.txt", "Advisers must adopt a code of ethics.")]
+
+
+@unittest.skipIf(np is None, "NumPy isn't installed")
+class VectorIndexTest(unittest.TestCase):
+    def test_rebuild_leaves_open_index_intact(self):
+        with tempfile.TemporaryDirectory() as directory:
+            index = VectorIndex.build(directory, DOCUMENTS, chunk_size=20, chunk_overlap=5)
+            embeddings = np.array(index.embeddings)
+            self.assertEqual(index.search("custody of client funds")[0]["source"], "custody.txt")
+
+            # the index that's already open (and memory-mapped) keeps reading the embeddings it was opened with
+            rebuilt = VectorIndex.build(directory, NEW_DOCUMENTS, chunk_size=20, chunk_overlap=5)
+            np.testing.assert_array_equal(np.array(index.embeddings), embeddings)
+            self.assertEqual(index.search("custody of client funds")[0]["source"], "custody.txt")
+
+            self.assertEqual(len(rebuilt), 3)
+            self.assertEqual(rebuilt.search("code of ethics")[0]["source"], "code.txt")
+            self.assertEqual(len(VectorIndex(directory)), 3)
+            self.assertEqual(sorted(os.listdir(directory)), ["chunks.jsonl", "embeddings.npy", "index.json"])
+            del index, rebuilt
+
+    def test_empty_index(self):
+        with tempfile.TemporaryDirectory() as directory:
+            index = VectorIndex.build(directory, [])
+            self.assertEqual(index.search("anything"), [])
+            self.assertEqual(sorted(os.listdir(directory)), ["chunks.jsonl", "embeddings.npy", "index.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()